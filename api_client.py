@@ -0,0 +1,275 @@
+import json
+import random
+import threading
+import time
+from email.utils import parsedate_to_datetime
+
+import requests
+from requests.adapters import HTTPAdapter
+
+
+class StreamAborted(Exception):
+    """流式输出被提前判定为无效时抛出"""
+
+
+class RequestCancelled(Exception):
+    """请求被取消（对冲请求中落后的一方）时抛出"""
+
+
+class CancelToken:
+    """取消一个进行中的请求：关闭已收到的响应，尚未收到响应头时在收到后立即丢弃"""
+
+    def __init__(self):
+        self._event = threading.Event()
+        self._lock = threading.Lock()
+        self._response = None
+
+    @property
+    def cancelled(self):
+        return self._event.is_set()
+
+    def cancel(self):
+        with self._lock:
+            self._event.set()
+            response, self._response = self._response, None
+        if response is not None:
+            response.close()
+
+    def attach(self, response):
+        """记录当前请求的响应，已取消时关闭响应并抛出 RequestCancelled"""
+        with self._lock:
+            if not self._event.is_set():
+                self._response = response
+                return
+        response.close()
+        raise RequestCancelled()
+
+    def check(self):
+        if self._event.is_set():
+            raise RequestCancelled()
+
+    def wait(self, seconds):
+        """等待重试间隔，期间被取消时抛出 RequestCancelled"""
+        if self._event.wait(seconds):
+            raise RequestCancelled()
+
+
+class DeepSeekClient:
+    """可复用的DeepSeek HTTP客户端：连接池保持长连接，对429/5xx/超时做指数退避重试"""
+
+    RETRY_STATUS_CODES = (429, 500, 502, 503, 504)
+
+    def __init__(self, api_config, api_key):
+        self.url = api_config['url']
+        self.api_key = api_key
+
+        # 连接和读取分别设置超时
+        self.timeout = (api_config.get('connect_timeout', 10),
+                        api_config.get('read_timeout', 60))
+
+        # 重试设置
+        self.max_retries = api_config.get('max_retries', 3)
+        self.backoff_base = api_config.get('backoff_base', 1.0)
+        self.backoff_max = api_config.get('backoff_max', 30.0)
+        self.pool_size = api_config.get('pool_size', 4)
+
+        self._session = None
+        self._lock = threading.Lock()
+        # 收到429时的回调（参数为建议等待的秒数），由API调度器设置
+        self.on_rate_limited = None
+
+        # 统计信息
+        self.request_count = 0
+        self.retry_count = 0
+
+    @property
+    def session(self):
+        """延迟创建会话，避免在未调用API的进程中建立连接池"""
+        if self._session is None:
+            with self._lock:
+                if self._session is None:
+                    session = requests.Session()
+                    adapter = HTTPAdapter(pool_connections=1, pool_maxsize=self.pool_size)
+                    session.mount('https://', adapter)
+                    session.mount('http://', adapter)
+                    session.headers.update({
+                        "Content-Type": "application/json",
+                        "Authorization": f"Bearer {self.api_key}"
+                    })
+                    self._session = session
+        return self._session
+
+    def send(self, data, stream=False, cancel=None):
+        """发送请求并返回响应对象，可重试的错误会自动退避重试，最终失败时抛出异常
+
+        cancel 为 CancelToken 时，请求被取消后抛出 RequestCancelled。
+        """
+        attempt = 0
+        while True:
+            if cancel is not None:
+                cancel.check()
+            self.count_request()
+            try:
+                response = self.session.post(self.url, json=data, timeout=self.timeout, stream=stream)
+                if cancel is not None:
+                    cancel.attach(response)
+                self.notify_rate_limited(response, attempt)
+                if response.status_code in self.RETRY_STATUS_CODES and attempt < self.max_retries:
+                    delay = self.get_retry_after(response)
+                    if delay is None:
+                        delay = self.get_backoff_delay(attempt)
+                    response.close()
+                    print(f"API返回 {response.status_code}，{delay:.1f} 秒后重试 ({attempt + 1}/{self.max_retries})")
+                else:
+                    response.raise_for_status()
+                    return response
+            except (requests.ConnectionError, requests.Timeout) as e:
+                if attempt >= self.max_retries:
+                    raise
+                delay = self.get_backoff_delay(attempt)
+                print(f"API连接异常: {e}，{delay:.1f} 秒后重试 ({attempt + 1}/{self.max_retries})")
+
+            self.count_retry()
+            attempt += 1
+            if cancel is not None:
+                cancel.wait(delay)
+            else:
+                time.sleep(delay)
+
+    def notify_rate_limited(self, response, attempt):
+        """响应为429时通知回调"""
+        status = getattr(response, 'status_code', None) or getattr(response, 'status', None)
+        if status != 429 or self.on_rate_limited is None:
+            return
+        delay = self.get_retry_after(response)
+        self.on_rate_limited(delay if delay is not None else self.get_backoff_delay(attempt))
+
+    def count_request(self):
+        """记录一次请求（包括重试）"""
+        with self._lock:
+            self.request_count += 1
+
+    def count_retry(self):
+        """记录一次重试"""
+        with self._lock:
+            self.retry_count += 1
+
+    def post(self, data, cancel=None):
+        """发送请求并返回JSON结果（可取消的请求逐块读取响应体，取消时关闭连接）"""
+        if cancel is None:
+            return self.send(data).json()
+        response = self.send(data, stream=True, cancel=cancel)
+        try:
+            return json.loads(self.read_body(response, cancel))
+        except Exception:
+            if cancel.cancelled:
+                raise RequestCancelled()
+            raise
+        finally:
+            response.close()
+
+    def read_body(self, response, cancel):
+        """逐块读取响应体，每块之间检查是否已取消（服务端生成期间会发送空行保持连接）"""
+        # urllib3 2.x 的 read1 返回已到达的数据，旧版本只能按固定大小读取
+        read = getattr(response.raw, 'read1', None) or response.raw.read
+        parts = []
+        while True:
+            cancel.check()
+            chunk = read(8192, decode_content=True)
+            if not chunk:
+                return b''.join(parts)
+            parts.append(chunk)
+
+    def post_stream(self, data, validator=None, cancel=None, on_first_token=None):
+        """以流式（SSE）方式发送请求，边接收边拼接内容
+
+        validator 接收当前已拼接的内容：返回错误描述时立即中止并抛出 StreamAborted，
+        返回True表示内容已确认有效、不再检查，返回None表示继续检查。
+        返回 (完整内容, 统计信息)，统计信息包含首个token耗时和生成速度。
+        on_first_token 在收到第一个内容块时调用；cancel 为 CancelToken 时可被取消。
+        """
+        data = dict(data, stream=True, stream_options={"include_usage": True})
+        start = time.monotonic()
+        response = self.send(data, stream=True, cancel=cancel)
+        # SSE固定使用UTF-8；响应头未声明charset时requests会按ISO-8859-1解码，导致中文被错误分行
+        response.encoding = 'utf-8'
+
+        parts = []
+        usage = None
+        chunk_count = 0
+        first_token_time = None
+        try:
+            for line in response.iter_lines(decode_unicode=True):
+                if cancel is not None:
+                    cancel.check()
+                if not line or not line.startswith('data:'):
+                    continue
+                payload = line[len('data:'):].strip()
+                if payload == '[DONE]':
+                    break
+
+                event = json.loads(payload)
+                if event.get('usage'):
+                    usage = event['usage']
+                choices = event.get('choices') or []
+                delta = choices[0].get('delta', {}).get('content') if choices else None
+                if not delta:
+                    continue
+
+                if first_token_time is None:
+                    first_token_time = time.monotonic()
+                    if on_first_token is not None:
+                        on_first_token()
+                parts.append(delta)
+                chunk_count += 1
+
+                if validator:
+                    verdict = validator(''.join(parts))
+                    if verdict is True:
+                        validator = None
+                    elif verdict:
+                        raise StreamAborted(verdict)
+        except (requests.RequestException, ValueError, AttributeError):
+            # 被取消时连接在读取过程中关闭
+            if cancel is not None and cancel.cancelled:
+                raise RequestCancelled()
+            raise
+        finally:
+            response.close()
+
+        end = time.monotonic()
+        # 优先使用服务端返回的用量，否则以数据块数近似token数
+        completion_tokens = usage.get('completion_tokens', chunk_count) if usage else chunk_count
+        generation_time = end - (first_token_time or end)
+        stats = {
+            'time_to_first_token': (first_token_time - start) if first_token_time else None,
+            'total_time': end - start,
+            'completion_tokens': completion_tokens,
+            'tokens_per_second': completion_tokens / generation_time if generation_time > 0 else None,
+            'usage': usage
+        }
+        return ''.join(parts), stats
+
+    def get_backoff_delay(self, attempt):
+        """计算带随机抖动的指数退避时间（full jitter）"""
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * (2 ** attempt)))
+
+    def get_retry_after(self, response):
+        """解析Retry-After响应头（秒数或HTTP日期），无法解析时返回None"""
+        value = response.headers.get('Retry-After')
+        if not value:
+            return None
+        try:
+            delay = float(value)
+        except ValueError:
+            try:
+                delay = parsedate_to_datetime(value).timestamp() - time.time()
+            except (TypeError, ValueError):
+                return None
+        return min(max(delay, 0.0), self.backoff_max)
+
+    def close(self):
+        """关闭连接池"""
+        if self._session is not None:
+            self._session.close()
+            self._session = None
@@ -0,0 +1,191 @@
+import heapq
+import itertools
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+
+# 请求数和token预算的统计窗口（秒）
+WINDOW_SECONDS = 60.0
+
+
+def estimate_prompt_tokens(text):
+    """按字符粗略估算提示词的token数：ASCII约4个字符1个token，中文等约1个字符0.6个token"""
+    ascii_chars = sum(1 for char in text if ord(char) < 128)
+    return int(ascii_chars / 4 + (len(text) - ascii_chars) * 0.6) + 1
+
+
+def is_rate_limit_error(error):
+    """异常是否为最终仍返回429的请求（requests 和 aiohttp 的HTTP错误）"""
+    response = getattr(error, 'response', None)
+    status = getattr(response, 'status_code', None) or getattr(error, 'status', None)
+    return status == 429
+
+
+class ApiScheduler:
+    """API调用调度器：按优先级（日期越新越先）排队，受每分钟请求数、每分钟token数和并发上限限制
+
+    并发上限按AIMD调整：请求正常完成时缓慢增加（每轮约+1），收到429时减半并暂停新请求，
+    每个输出token的延迟明显高于最低观测值时缓慢减少。token预算按提示词长度估算，响应返回后按实际用量修正。
+    """
+
+    def __init__(self, config, max_concurrency=1, max_tokens=4000):
+        self.enabled = config.get('enabled', True)
+        self.requests_per_minute = config.get('requests_per_minute', 0) or 0
+        self.tokens_per_minute = config.get('tokens_per_minute', 0) or 0
+        self.min_concurrency = max(1, int(config.get('min_concurrency', 1)))
+        self.latency_factor = config.get('latency_factor', 2.0) or 0
+        self.rate_limit_retries = config.get('rate_limit_retries', 3)
+        self.log_interval = config.get('log_interval_seconds', 10)
+        self.set_max_concurrency(max_concurrency)
+
+        self._cond = threading.Condition()
+        # 等待中的请求：(-优先级, 序号)，堆顶最先获得调用机会
+        self._waiting = []
+        self._sequence = itertools.count()
+        # 最近一个窗口内开始的请求：[开始时间, token数]
+        self._window = deque()
+        self._in_flight = 0
+        self._paused_until = 0.0
+        self._last_log = 0.0
+
+        # 延迟的指数移动平均和最低值，用于判断服务端是否过载
+        self._latency = None
+        self._baseline = None
+        # 输出token数的平均值，用于估算尚未返回的请求
+        self._completion_tokens = max_tokens / 2
+        self._started = time.monotonic()
+        self.completed = 0
+        self.rate_limited = 0
+        self.total_tokens = 0
+
+    def set_max_concurrency(self, max_concurrency):
+        """设置并发上限（命令行 --api-jobs 覆盖配置后调用）"""
+        self.max_concurrency = max(self.min_concurrency, int(max_concurrency))
+        self.limit = float(self.max_concurrency)
+
+    def estimate(self, prompt):
+        """估算一次调用的token数：提示词 + 平均输出"""
+        return estimate_prompt_tokens(prompt) + int(self._completion_tokens)
+
+    def _trim(self, now):
+        while self._window and self._window[0][0] <= now - WINDOW_SECONDS:
+            self._window.popleft()
+
+    def _wait_time(self, now, tokens, extra=False):
+        """距离可以开始请求还需等待的秒数，0表示可以开始，None表示等待其他请求完成
+
+        附加请求（对冲请求、分块生成中的其余学科）不受并发上限限制（同一文件的第一个请求仍占用一个并发），
+        但仍受限流暂停和预算限制。
+        """
+        if now < self._paused_until:
+            return self._paused_until - now
+        if not extra and self._in_flight >= int(self.limit):
+            return None
+        if self.requests_per_minute and len(self._window) >= self.requests_per_minute:
+            return self._window[0][0] + WINDOW_SECONDS - now
+        if self.tokens_per_minute and self._window:
+            excess = sum(entry[1] for entry in self._window) + tokens - self.tokens_per_minute
+            if excess > 0:
+                # 等最早的若干请求移出窗口、腾出足够的预算（单个请求超过预算时等窗口清空）
+                for started, entry_tokens in self._window:
+                    excess -= entry_tokens
+                    if excess <= 0:
+                        break
+                return max(started + WINDOW_SECONDS - now, 0.01)
+        return 0
+
+    def acquire(self, tokens, priority=0, extra=False):
+        """等待调用机会，返回调用凭据（交给 release）；附加请求排在队首"""
+        if not self.enabled:
+            return None
+        with self._cond:
+            entry = (float('-inf') if extra else -priority, next(self._sequence))
+            heapq.heappush(self._waiting, entry)
+            try:
+                while True:
+                    now = time.monotonic()
+                    self._trim(now)
+                    wait = self._wait_time(now, tokens, extra) if self._waiting[0] == entry else None
+                    if wait == 0:
+                        break
+                    self._cond.wait(wait)
+            finally:
+                self._waiting.remove(entry)
+                heapq.heapify(self._waiting)
+                self._cond.notify_all()
+
+            ticket = [now, tokens]
+            self._window.append(ticket)
+            self._in_flight += 1
+            if now - self._last_log >= self.log_interval:
+                self._last_log = now
+                print(self.status_text())
+            return ticket
+
+    def release(self, ticket, usage=None, succeeded=True):
+        """调用结束：按实际用量修正token预算，并根据延迟调整并发上限"""
+        if ticket is None:
+            return
+        with self._cond:
+            now = time.monotonic()
+            self._in_flight -= 1
+            completion_tokens = None
+            if usage:
+                tokens = (usage.get('prompt_tokens') or 0) + (usage.get('completion_tokens') or 0)
+                if tokens:
+                    ticket[1] = tokens
+                completion_tokens = usage.get('completion_tokens')
+                if completion_tokens:
+                    self._completion_tokens = 0.8 * self._completion_tokens + 0.2 * completion_tokens
+            if succeeded:
+                self.completed += 1
+                self.total_tokens += ticket[1]
+                # 输出长度差别很大（整篇文档和单个学科），按每个输出token的耗时比较
+                self._adapt((now - ticket[0]) / completion_tokens if completion_tokens else None)
+            self._cond.notify_all()
+
+    def _adapt(self, latency):
+        """根据一次成功调用的延迟（每个输出token的秒数，未知时为None）调整并发上限"""
+        if latency is not None:
+            self._latency = latency if self._latency is None else 0.8 * self._latency + 0.2 * latency
+            self._baseline = self._latency if self._baseline is None else min(self._baseline, self._latency)
+        if self.latency_factor and self._latency is not None and \
+                self._latency > self._baseline * self.latency_factor:
+            self.limit = max(self.min_concurrency, self.limit - 1 / self.limit)
+        else:
+            self.limit = min(self.max_concurrency, self.limit + 1 / self.limit)
+
+    def report_rate_limit(self, delay):
+        """收到429：并发上限减半，并在等待时间内暂停开始新请求（同一暂停期内只减半一次）"""
+        if not self.enabled:
+            return
+        with self._cond:
+            now = time.monotonic()
+            self.rate_limited += 1
+            if now >= self._paused_until:
+                self.limit = max(self.min_concurrency, self.limit / 2)
+                print(f"API限流，并发上限降为 {int(self.limit)}，暂停 {delay:.1f} 秒")
+            self._paused_until = max(self._paused_until, now + delay)
+
+    @contextmanager
+    def slot(self, prompt, priority=0, extra=False):
+        """调用上下文：with scheduler.slot(prompt, priority) as slot: ...; slot['usage'] = 用量"""
+        slot = {'usage': None}
+        ticket = self.acquire(self.estimate(prompt), priority, extra)
+        succeeded = False
+        try:
+            yield slot
+            succeeded = True
+        finally:
+            self.release(ticket, slot['usage'], succeeded)
+
+    def status_text(self):
+        """队列深度、并发和最近一分钟的吞吐"""
+        with self._cond:
+            self._trim(time.monotonic())
+            elapsed = max(time.monotonic() - self._started, 1e-6)
+            return (f"API调度: 排队 {len(self._waiting)}，进行中 {self._in_flight}/{int(self.limit)}，"
+                    f"最近1分钟 {len(self._window)} 次请求、{sum(entry[1] for entry in self._window)} tokens，"
+                    f"累计完成 {self.completed} 次（{self.completed / elapsed * 60:.1f} 次/分钟），"
+                    f"限流 {self.rate_limited} 次")
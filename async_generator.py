@@ -0,0 +1,288 @@
+import asyncio
+import os
+import subprocess
+from contextlib import asynccontextmanager
+from datetime import datetime
+
+try:
+    import aiohttp
+except ImportError:  # 未安装aiohttp时在线程中调用同步客户端
+    aiohttp = None
+
+from api_scheduler import estimate_prompt_tokens, is_rate_limit_error
+from latex_generator import LatexGenerator
+from manifest import ProcessingManifest
+
+
+class AsyncLatexGenerator(LatexGenerator):
+    """基于asyncio的生成引擎
+
+    复用 LatexGenerator 的提示词、缓存、提取、检查和文件路径逻辑；API调用使用aiohttp
+    （未安装或流式模式时在线程中调用同步客户端），xelatex 使用asyncio子进程，
+    两者分别由信号量限制并发。监控模式下新文件可以在之前的文件仍在编译时开始处理。
+    """
+
+    def __init__(self, config_file="config.yaml"):
+        super().__init__(config_file)
+        self._http = None
+        self._api_semaphore = None
+        self._compile_semaphore = None
+        # 正在处理中的输入文件，监控检查时跳过
+        self._in_flight = set()
+
+    @asynccontextmanager
+    async def running(self):
+        """创建信号量和HTTP会话，退出时关闭会话"""
+        self._api_semaphore = asyncio.Semaphore(max(1, int(self.api_jobs)))
+        self._compile_semaphore = asyncio.Semaphore(max(1, int(self.compile_jobs)))
+        if aiohttp is not None:
+            connect_timeout, read_timeout = self.api_client.timeout
+            self._http = aiohttp.ClientSession(
+                headers={"Content-Type": "application/json",
+                         "Authorization": f"Bearer {self.api_key}"},
+                timeout=aiohttp.ClientTimeout(sock_connect=connect_timeout, sock_read=read_timeout),
+                connector=aiohttp.TCPConnector(limit=max(1, int(self.api_jobs)))
+            )
+        print(f"异步引擎: API并发 {self.api_jobs}，编译并发 {self.compile_jobs}，"
+              f"HTTP客户端 {'aiohttp' if self._http else 'requests（线程）'}")
+
+        # 预先生成格式文件，避免多个编译任务同时生成
+        await asyncio.to_thread(self.latex_format.ensure_format)
+        try:
+            yield
+        finally:
+            if self._http is not None:
+                await self._http.close()
+                self._http = None
+
+    async def post_async(self, data):
+        """发送请求并返回JSON结果，重试策略与 DeepSeekClient.send 相同"""
+        client = self.api_client
+        attempt = 0
+        while True:
+            client.count_request()
+            try:
+                async with self._http.post(client.url, json=data) as response:
+                    client.notify_rate_limited(response, attempt)
+                    if response.status in client.RETRY_STATUS_CODES and attempt < client.max_retries:
+                        delay = client.get_retry_after(response)
+                        if delay is None:
+                            delay = client.get_backoff_delay(attempt)
+                        print(f"API返回 {response.status}，{delay:.1f} 秒后重试 ({attempt + 1}/{client.max_retries})")
+                    else:
+                        response.raise_for_status()
+                        return await response.json(content_type=None)
+            except (aiohttp.ClientConnectionError, asyncio.TimeoutError) as e:
+                if attempt >= client.max_retries:
+                    raise
+                delay = client.get_backoff_delay(attempt)
+                print(f"API连接异常: {e!r}，{delay:.1f} 秒后重试 ({attempt + 1}/{client.max_retries})")
+
+            client.count_retry()
+            attempt += 1
+            await asyncio.sleep(delay)
+
+    async def call_deepseek_api_async(self, prompt):
+        """异步调用DeepSeek API"""
+        # 流式模式和未安装aiohttp时复用同步实现
+        if self._http is None or self.api_config.get('stream', False):
+            return await asyncio.to_thread(self.call_deepseek_api, prompt)
+
+        if not self.api_key:
+            print("错误: 未设置DEEPSEEK_API_KEY环境变量")
+            return None
+
+        try:
+            print("正在调用DeepSeek API（异步）...")
+            data = self.build_api_request(prompt)
+            with self.metrics.stage('api'):
+                result, hedge = await self.api_hedger.run_async(
+                    lambda hedge: self.post_scheduled_async(prompt, data, hedge),
+                    self.get_request_kind(), estimate_prompt_tokens(prompt),
+                    accept=lambda result: self.is_complete_response(self.get_response_content(result)))
+            self.record_usage(result.get('usage'))
+            self.metrics.add_hedge(hedge)
+            return result['choices'][0]['message']['content']
+        except Exception as e:
+            print(f"API调用失败: {e}")
+            return None
+
+    async def post_scheduled_async(self, prompt, data, extra=False):
+        """经API调度器发送请求（排队在线程中等待），重试后仍返回429时重新排队"""
+        scheduler = self.api_scheduler
+        attempt = 0
+        while True:
+            acquiring = asyncio.ensure_future(asyncio.to_thread(
+                scheduler.acquire, scheduler.estimate(prompt), self.get_api_priority(), extra))
+            try:
+                ticket = await asyncio.shield(acquiring)
+            except asyncio.CancelledError:
+                # 对冲中落后的请求被取消时，排队线程拿到的调用机会立即归还
+                acquiring.add_done_callback(
+                    lambda future: future.cancelled() or future.exception() or
+                    scheduler.release(future.result(), None, False))
+                raise
+            result = None
+            try:
+                result = await self.post_async(data)
+                return result
+            except Exception as e:
+                if not (scheduler.enabled and is_rate_limit_error(e) and attempt < scheduler.rate_limit_retries):
+                    raise
+                attempt += 1
+                print(f"API仍返回429，重新排队 ({attempt}/{scheduler.rate_limit_retries})")
+            finally:
+                scheduler.release(ticket, result.get('usage') if result else None, result is not None)
+
+    async def prepare_latex_async(self, input_file_path):
+        """异步版本的 prepare_latex_for_file：文件读写在线程中执行，API调用异步等待"""
+        date_key = self.get_date_key(input_file_path)
+        self.metrics.begin(date_key)
+        latex_output_path = await asyncio.to_thread(self.find_resumable_latex, input_file_path)
+        if latex_output_path:
+            return latex_output_path
+        try:
+            job = await asyncio.to_thread(self.start_latex_job, input_file_path)
+            if job is not None and job['latex'] is None:
+                api_response = await self.call_deepseek_api_async(job['prompt'])
+                if not await asyncio.to_thread(self.accept_api_response, job, api_response):
+                    job = None
+            if job is not None:
+                latex_output_path = await asyncio.to_thread(self.save_latex, input_file_path, job)
+        finally:
+            if not latex_output_path:
+                await asyncio.to_thread(self.manifest.mark_failed, date_key, ProcessingManifest.STAGE_GENERATE)
+                self.metrics.finish(date_key, 'generate_failed')
+        return latex_output_path
+
+    async def run_xelatex_async(self, latex_file_path, output_dir, format_base=None):
+        """以asyncio子进程执行一次xelatex编译，返回与 subprocess.run 相同形式的结果"""
+        command = self.build_xelatex_command(latex_file_path, output_dir, format_base)
+        print(command)
+        process = await asyncio.create_subprocess_exec(
+            *command,
+            stdout=asyncio.subprocess.PIPE,
+            stderr=asyncio.subprocess.PIPE,
+            cwd=output_dir
+        )
+        try:
+            stdout, stderr = await asyncio.wait_for(process.communicate(), self.compile_timeout or None)
+        except asyncio.TimeoutError:
+            process.kill()
+            await process.wait()
+            raise subprocess.TimeoutExpired(command, self.compile_timeout)
+        return subprocess.CompletedProcess(command, process.returncode,
+                                           stdout.decode('utf-8', errors='replace'),
+                                           stderr.decode('utf-8', errors='replace'))
+
+    async def compile_latex_file_async(self, latex_file_path):
+        """异步编译LaTeX文件，返回 (是否成功, 编译信息)"""
+        try:
+            job = await asyncio.to_thread(self.start_compile, latex_file_path)
+            if job['info']:
+                return True, job['info']
+
+            result = await self.run_xelatex_async(job['path'], job['output_dir'], job['format_base'])
+
+            if result.returncode != 0 and job['format_base']:
+                print("使用预编译格式编译失败，改用普通编译")
+                result = await self.run_xelatex_async(job['path'], job['output_dir'])
+                if result.returncode == 0:
+                    # 普通编译成功说明格式本身有问题
+                    self.latex_format.mark_failed()
+
+            compiled = await asyncio.to_thread(self.finish_compile, job, result)
+            return compiled, job['info']
+
+        except FileNotFoundError:
+            print("错误: 未找到xelatex命令，请确保LaTeX环境已安装")
+            return False, None
+        except subprocess.TimeoutExpired:
+            print(f"xelatex 超过 {self.compile_timeout} 秒未结束，已终止")
+            return False, None
+        except Exception as e:
+            print(f"编译LaTeX文件时出错: {e}")
+            return False, None
+
+    async def process_file_async(self, input_file_path):
+        """处理单个文件：生成和编译分别受信号量限制，返回是否成功"""
+        try:
+            async with self._api_semaphore:
+                latex_output_path = await self.prepare_latex_async(input_file_path)
+            if not latex_output_path:
+                return False
+            if self.defer_compile:
+                return await asyncio.to_thread(self.defer_latex_for_file, input_file_path)
+
+            async with self._compile_semaphore:
+                compiled, compile_info = await self.compile_latex_file_async(latex_output_path)
+
+            return await asyncio.to_thread(self.complete_latex_for_file, input_file_path,
+                                           latex_output_path, compiled, compile_info)
+        except Exception as e:
+            print(f"处理文件时出错 ({os.path.basename(input_file_path)}): {e}")
+            return False
+
+    async def process_files_async(self, input_files, mode='batch'):
+        """并发处理一组输入文件，返回成功数量"""
+        self.begin_batch(mode)
+        await asyncio.to_thread(self.enqueue_files, input_files)
+        async with self.running():
+            results = await asyncio.gather(*(self.process_file_async(path) for path in input_files))
+        return sum(1 for success in results if success)
+
+    def process_files(self, input_files, mode='batch'):
+        """批量模式和实时监控都通过事件循环处理"""
+        return asyncio.run(self.process_files_async(input_files, mode))
+
+    async def process_tracked(self, input_file_path):
+        """监控模式中处理一个文件，完成后从处理中集合移除"""
+        try:
+            success = await self.process_file_async(input_file_path)
+            print(f"{os.path.basename(input_file_path)}: {'处理成功' if success else '处理失败'}")
+        finally:
+            self._in_flight.discard(input_file_path)
+            if not self._in_flight:
+                self.print_run_stats()
+
+    async def monitor_async(self, interval_seconds):
+        """定时检查输入目录，新文件立即开始处理，不等待之前的文件编译完成"""
+        tasks = set()
+        async with self.running():
+            while True:
+                print(f"{datetime.now().strftime('%Y-%m-%d %H:%M:%S')} - 执行定时检查...")
+                modified_files = await asyncio.to_thread(self.check_files_modification)
+                new_files = [path for path in modified_files if path not in self._in_flight]
+
+                if new_files:
+                    print(f"检测到 {len(new_files)} 个文件需要处理"
+                          f"（另有 {len(self._in_flight)} 个文件仍在处理中）")
+                    if not self._in_flight:
+                        self.begin_batch('monitor')
+                    await asyncio.to_thread(self.enqueue_files, new_files)
+                    for path in new_files:
+                        self._in_flight.add(path)
+                        task = asyncio.create_task(self.process_tracked(path))
+                        tasks.add(task)
+                        task.add_done_callback(tasks.discard)
+                elif self._in_flight:
+                    print(f"没有新文件，{len(self._in_flight)} 个文件仍在处理中")
+                else:
+                    print("没有文件需要处理")
+
+                await asyncio.sleep(interval_seconds)
+
+    def start_monitoring(self, interval_minutes=None):
+        """启动定时监控（异步）"""
+        if interval_minutes is None:
+            interval_minutes = self.check_interval_minutes
+
+        print(f"启动定时监控（异步引擎），每{interval_minutes}分钟检查一次...")
+        print(f"监控目录: {self.input_dir}")
+        print(f"输出目录: {self.output_dir}")
+        print("按Ctrl+C停止监控")
+
+        try:
+            asyncio.run(self.monitor_async(interval_minutes * 60))
+        except KeyboardInterrupt:
+            print("\n监控已停止")
@@ -0,0 +1,361 @@
+#!/usr/bin/env python3
+"""离线性能测试：本地模拟DeepSeek接口和xelatex，在合成的日期文件上测量吞吐量
+
+用法:
+  python benchmark.py                                  # 默认 10/100 个文件，batch/single/monitor 三种模式
+  python benchmark.py --sizes 10,100,1000 --jobs 4     # 指定文件数和流水线并发数
+  python benchmark.py --latency 0.5 --error-rate 0.05 --rate-429 0.05 --stream
+  python benchmark.py --real-xelatex                   # 使用真实的xelatex
+  python benchmark.py --async --jobs 4                 # 使用异步引擎（AsyncLatexGenerator）
+  python benchmark.py --output bench.jsonl             # 结果追加保存，便于前后对比
+
+每个场景在独立的子进程和临时目录中运行（缓存和处理清单都是空的），峰值内存取子进程及其编译进程的最大RSS。
+"""
+import json
+import os
+import random
+import resource
+import shutil
+import stat
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime, timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import yaml
+
+from latex_generator import pop_option, pop_flag
+
+PROJECT_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# 模拟xelatex：生成PDF并输出与真实xelatex相同格式的页数信息；-ini 时生成空的格式文件
+FAKE_XELATEX = """#!/bin/sh
+for arg in "$@"; do
+  last="$arg"
+  case "$arg" in -jobname=*) job="${arg#-jobname=}";; esac
+done
+if [ "$1" = "-ini" ]; then
+  : > "$job.fmt"
+  exit 0
+fi
+sleep %(delay)s
+printf '%%%%PDF-1.4\\n%%%%%%%%EOF\\n' > "${last%%.tex}.pdf"
+echo "Output written on ${last%%.tex}.pdf (1 page)."
+"""
+
+
+class FakeDeepSeekServer(ThreadingHTTPServer):
+    """模拟chat completions接口：可配置延迟、错误率、429比例，支持流式（SSE）响应"""
+
+    daemon_threads = True
+
+    def __init__(self, latex_template, latency=0.2, jitter=0.1, error_rate=0.0, rate_429=0.0,
+                 chunk_delay=0.0, seed=0):
+        super().__init__(('127.0.0.1', 0), FakeDeepSeekHandler)
+        self.latex_template = latex_template
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.rate_429 = rate_429
+        self.chunk_delay = chunk_delay
+        self.random = random.Random(seed)
+        self.lock = threading.Lock()
+        self.reset_counts()
+
+    @property
+    def url(self):
+        return f"http://127.0.0.1:{self.server_address[1]}/v1/chat/completions"
+
+    def reset_counts(self):
+        with self.lock:
+            self.request_count = 0
+            self.error_count = 0
+            self.throttled_count = 0
+
+    def counts(self):
+        with self.lock:
+            return {'requests': self.request_count, 'errors': self.error_count,
+                    'throttled': self.throttled_count}
+
+    def roll(self):
+        """决定本次请求的结果和延迟：返回 (结果, 延迟秒数)"""
+        with self.lock:
+            self.request_count += 1
+            value = self.random.random()
+            delay = max(0.0, self.latency + self.random.uniform(-self.jitter, self.jitter))
+            if value < self.rate_429:
+                self.throttled_count += 1
+                return 429, delay
+            if value < self.rate_429 + self.error_rate:
+                self.error_count += 1
+                return 500, delay
+            return 200, delay
+
+    def make_answer(self, prompt):
+        """根据提示词中的日期生成LaTeX文档（修复请求直接返回其中的文档）"""
+        if '\\documentclass' in prompt and '========== 今日内容' not in prompt:
+            return prompt[prompt.index('\\documentclass'):]
+        date_str = '2025年1月1日'
+        for line in prompt.splitlines():
+            if line.startswith('日期：'):
+                date_str = line[len('日期：'):].strip()
+        return "```latex\n" + self.latex_template.replace('DATE', date_str) + "\n```"
+
+
+class FakeDeepSeekHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def do_POST(self):
+        length = int(self.headers.get('Content-Length', 0))
+        data = json.loads(self.rfile.read(length) or b'{}')
+        status, delay = self.server.roll()
+        time.sleep(delay)
+
+        if status != 200:
+            body = json.dumps({'error': {'message': 'simulated'}}).encode('utf-8')
+            self.send_response(status)
+            if status == 429:
+                self.send_header('Retry-After', '1')
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+            return
+
+        prompt = data['messages'][-1]['content']
+        answer = self.server.make_answer(prompt)
+        usage = {'prompt_tokens': len(prompt) // 2, 'completion_tokens': len(answer) // 2,
+                 'total_tokens': (len(prompt) + len(answer)) // 2}
+
+        if data.get('stream'):
+            self.send_response(200)
+            self.send_header('Content-Type', 'text/event-stream')
+            self.send_header('Connection', 'close')
+            self.end_headers()
+            self.close_connection = True
+            for start in range(0, len(answer), 40):
+                event = {'choices': [{'delta': {'content': answer[start:start + 40]}}]}
+                self.wfile.write(f"data: {json.dumps(event, ensure_ascii=False)}\n\n".encode('utf-8'))
+                if self.server.chunk_delay:
+                    time.sleep(self.server.chunk_delay)
+            self.wfile.write(f"data: {json.dumps({'choices': [], 'usage': usage})}\n\n".encode('utf-8'))
+            self.wfile.write(b"data: [DONE]\n\n")
+            return
+
+        body = json.dumps({'choices': [{'message': {'content': answer}}], 'usage': usage},
+                          ensure_ascii=False).encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def make_latex_template():
+    """以示例文件为模板，日期替换为占位符"""
+    with open(os.path.join(PROJECT_DIR, 'resource', '20250924.tex'), 'r', encoding='utf-8') as f:
+        example = f.read()
+    return example.replace('2025年9月24日', 'DATE')
+
+
+def write_corpus(input_dir, count, structured=0.0, seed=0):
+    """生成 count 个连续日期的输入文件，structured 比例的文件使用可本地渲染的规整结构"""
+    rng = random.Random(seed)
+    start = datetime(2025, 1, 1)
+    for index in range(count):
+        day = start + timedelta(days=index)
+        if rng.random() < structured:
+            text = (f"拼音\n一、学习内容\n1. 声母：b p m f 第{index}课\n"
+                    f"二、今日小任务\n1. 熟读声母并组词\n三、温馨提示：每天练习十分钟\n")
+        else:
+            text = (f"今天拼音课学习了声母b p m f，第{index}次课。孩子们跟读儿歌“爸爸带我爬山坡”，"
+                    f"课后请熟读声母并组词。数学课练习了10以内的加法，{rng.randint(3, 9)}道口算题。\n")
+        with open(os.path.join(input_dir, day.strftime('%Y%m%d') + '.txt'), 'w', encoding='utf-8') as f:
+            f.write(text)
+
+
+def write_config(work_dir, api_url, options):
+    """基于项目配置生成测试用配置文件，所有目录都指向临时目录"""
+    with open(os.path.join(PROJECT_DIR, 'config.yaml'), 'r', encoding='utf-8') as f:
+        config = yaml.safe_load(f)
+
+    config['api'].update({'url': api_url, 'stream': options['stream'],
+                          'backoff_base': 0.2, 'backoff_max': 2.0})
+    config['paths'].update({
+        'resource': os.path.join(PROJECT_DIR, 'resource'),
+        'input_dir': os.path.join(work_dir, 'input'),
+        'output_dir': os.path.join(work_dir, 'output'),
+        'target_dir': os.path.join(work_dir, 'target'),
+        'state_dir': os.path.join(work_dir, 'state'),
+    })
+    config.setdefault('cache', {})['dir'] = os.path.join(work_dir, 'cache')
+    config.setdefault('pipeline', {}).update({'api_jobs': options['jobs'], 'compile_jobs': options['jobs']})
+
+    config_path = os.path.join(work_dir, 'config.yaml')
+    with open(config_path, 'w', encoding='utf-8') as f:
+        yaml.safe_dump(config, f, allow_unicode=True)
+    return config_path
+
+
+def run_scenario(scenario):
+    """在子进程中运行一个场景（batch / single / monitor），把结果写入结果文件"""
+    if scenario['async']:
+        from async_generator import AsyncLatexGenerator as generator_class
+    else:
+        from latex_generator import LatexGenerator as generator_class
+
+    os.chdir(scenario['work_dir'])
+    generator = generator_class(scenario['config'])
+    input_files = generator.find_input_files()
+
+    start = time.monotonic()
+    if scenario['mode'] == 'batch':
+        generator.run_once()
+    elif scenario['mode'] == 'single':
+        for file_path in input_files:
+            generator.run_single(generator.get_date_key(file_path))
+    else:
+        generator.scheduled_task()
+    elapsed = time.monotonic() - start
+
+    # 监控模式再执行一次没有任何变化的检查，测量空闲检查的开销
+    idle_tick = None
+    if scenario['mode'] == 'monitor':
+        tick_start = time.monotonic()
+        generator.scheduled_task()
+        idle_tick = time.monotonic() - tick_start
+
+    records = generator.manifest.get_all()
+    done = sum(1 for record in records.values() if record['status'] == 'done')
+    peak_kb = max(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+                  resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss)
+    result = {
+        'seconds': elapsed,
+        'done': done,
+        'client_requests': generator.api_client.request_count,
+        'client_retries': generator.api_client.retry_count,
+        'peak_rss_mb': peak_kb / 1024,
+        'idle_tick_seconds': idle_tick,
+    }
+    with open(scenario['result_file'], 'w', encoding='utf-8') as f:
+        json.dump(result, f)
+
+
+def install_fake_xelatex(bin_dir, delay):
+    path = os.path.join(bin_dir, 'xelatex')
+    with open(path, 'w') as f:
+        f.write(FAKE_XELATEX % {'delay': delay})
+    os.chmod(path, os.stat(path).st_mode | stat.S_IEXEC)
+
+
+def benchmark(server, mode, size, options):
+    """准备临时目录并在子进程中运行一个场景，返回结果字典"""
+    work_dir = tempfile.mkdtemp(prefix=f'xybench-{mode}-{size}-')
+    try:
+        for name in ('input', 'output', 'target', 'state', 'bin'):
+            os.makedirs(os.path.join(work_dir, name))
+        write_corpus(os.path.join(work_dir, 'input'), size, options['structured'], options['seed'])
+        scenario = {
+            'mode': mode,
+            'work_dir': work_dir,
+            'config': write_config(work_dir, server.url, options),
+            'result_file': os.path.join(work_dir, 'result.json'),
+            'async': options['async'],
+        }
+
+        env = dict(os.environ, DEEPSEEK_API_KEY='benchmark')
+        if not options['real_xelatex']:
+            install_fake_xelatex(os.path.join(work_dir, 'bin'), options['compile_delay'])
+            env['PATH'] = os.path.join(work_dir, 'bin') + os.pathsep + env.get('PATH', '')
+
+        server.reset_counts()
+        output = None if options['verbose'] else subprocess.DEVNULL
+        subprocess.run([sys.executable, os.path.abspath(__file__), '--run-scenario', json.dumps(scenario)],
+                       env=env, stdout=output, stderr=output, check=True)
+        with open(scenario['result_file'], 'r', encoding='utf-8') as f:
+            result = json.load(f)
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+    result.update({'mode': mode, 'files': size, 'server': server.counts()})
+    result['files_per_minute'] = result['done'] / result['seconds'] * 60 if result['seconds'] > 0 else None
+    return result
+
+
+def print_result(result):
+    line = (f"{result['mode']:<8}{result['files']:>6}{result['done']:>6}{result['seconds']:>10.1f}"
+            f"{result['files_per_minute'] or 0:>12.1f}{result['server']['requests']:>8}"
+            f"{result['client_retries']:>8}{result['peak_rss_mb']:>10.1f}")
+    if result['idle_tick_seconds'] is not None:
+        line += f"   空闲检查 {result['idle_tick_seconds']:.2f} 秒"
+    print(line)
+
+
+def main():
+    args = list(sys.argv)
+    if len(args) > 2 and args[1] == '--run-scenario':
+        run_scenario(json.loads(args[2]))
+        return
+
+    try:
+        sizes = [int(size) for size in (pop_option(args, '--sizes') or '10,100').split(',')]
+        modes = (pop_option(args, '--modes') or 'batch,single,monitor').split(',')
+        options = {
+            'jobs': pop_option(args, '--jobs', int) or 1,
+            'stream': pop_flag(args, '--stream'),
+            'structured': pop_option(args, '--structured', float) or 0.0,
+            'compile_delay': pop_option(args, '--compile-delay', float) or 0.1,
+            'real_xelatex': pop_flag(args, '--real-xelatex'),
+            'verbose': pop_flag(args, '--verbose'),
+            'seed': pop_option(args, '--seed', int) or 0,
+            'async': pop_flag(args, '--async'),
+        }
+        latency = pop_option(args, '--latency', float)
+        jitter = pop_option(args, '--jitter', float)
+        error_rate = pop_option(args, '--error-rate', float) or 0.0
+        rate_429 = pop_option(args, '--rate-429', float) or 0.0
+        chunk_delay = pop_option(args, '--chunk-delay', float) or 0.0
+        output_file = pop_option(args, '--output')
+    except ValueError as e:
+        print(e)
+        return
+    if len(args) > 1:
+        print(__doc__)
+        return
+
+    server = FakeDeepSeekServer(make_latex_template(),
+                                latency=0.2 if latency is None else latency,
+                                jitter=0.1 if jitter is None else jitter,
+                                error_rate=error_rate, rate_429=rate_429,
+                                chunk_delay=chunk_delay, seed=options['seed'])
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+
+    print(f"模拟API: {server.url}（延迟 {server.latency}±{server.jitter} 秒，错误率 {error_rate}，429比例 {rate_429}，"
+          f"{'流式' if options['stream'] else '非流式'}）")
+    compiler = '真实xelatex' if options['real_xelatex'] else f"模拟xelatex（{options['compile_delay']} 秒）"
+    print(f"编译: {compiler}，并发 {options['jobs']}，{'异步引擎' if options['async'] else '线程/进程流水线'}")
+    print(f"\n{'模式':<6}{'文件数':>6}{'成功':>5}{'耗时(秒)':>8}{'文件/分钟':>9}{'API请求':>6}{'重试':>6}{'峰值内存(MB)':>9}")
+
+    try:
+        for size in sizes:
+            for mode in modes:
+                result = benchmark(server, mode, size, options)
+                print_result(result)
+                if output_file:
+                    record = dict(result, time=datetime.now().isoformat(timespec='seconds'),
+                                  options=options, latency=server.latency, jitter=server.jitter,
+                                  error_rate=error_rate, rate_429=rate_429)
+                    with open(output_file, 'a', encoding='utf-8') as f:
+                        f.write(json.dumps(record, ensure_ascii=False) + '\n')
+    finally:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
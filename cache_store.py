@@ -0,0 +1,198 @@
+import hashlib
+import json
+import os
+import shutil
+import threading
+import time
+
+
+def hash_text(*parts):
+    """计算若干文本片段的SHA-256摘要"""
+    digest = hashlib.sha256()
+    for part in parts:
+        digest.update(part.encode('utf-8') if isinstance(part, str) else part)
+        digest.update(b'\0')
+    return digest.hexdigest()
+
+
+class _DiskCache:
+    """按内容哈希寻址的磁盘缓存基类，支持按总大小和存活时间淘汰"""
+
+    suffix = '.json'
+
+    # 每写入多少条目执行一次淘汰检查
+    EVICT_EVERY = 50
+
+    def __init__(self, cache_dir, max_size_mb=200, max_age_days=90):
+        self.cache_dir = cache_dir
+        self.max_bytes = int(max_size_mb * 1024 * 1024) if max_size_mb else None
+        self.max_age = max_age_days * 86400 if max_age_days else None
+
+        self._lock = threading.Lock()
+        self._puts_since_evict = None
+
+        # 统计信息
+        self.hits = 0
+        self.misses = 0
+        self.stores = 0
+        self.evictions = 0
+
+    def entry_path(self, key):
+        """缓存条目路径，按哈希前两位分目录"""
+        return os.path.join(self.cache_dir, key[:2], key + self.suffix)
+
+    def is_expired(self, path):
+        """判断缓存条目是否超过最长存活时间"""
+        if self.max_age is None:
+            return False
+        try:
+            return time.time() - os.path.getmtime(path) > self.max_age
+        except OSError:
+            return True
+
+    def count(self, hit):
+        """记录一次命中或未命中"""
+        with self._lock:
+            if hit:
+                self.hits += 1
+            else:
+                self.misses += 1
+
+    def count_store(self):
+        """记录一次写入"""
+        with self._lock:
+            self.stores += 1
+
+    def write_atomic(self, path, data):
+        """先写临时文件再替换，避免并发读到半写入的条目"""
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        temp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(temp_path, 'wb') as f:
+            f.write(data)
+        os.replace(temp_path, path)
+
+        self.count_store()
+        with self._lock:
+            # 进程内首次写入时以及之后每隔若干次写入执行淘汰
+            if self._puts_since_evict is None or self._puts_since_evict >= self.EVICT_EVERY:
+                self._puts_since_evict = 0
+                need_evict = True
+            else:
+                self._puts_since_evict += 1
+                need_evict = False
+        if need_evict:
+            self.evict()
+
+    def evict(self):
+        """删除过期条目，并在总大小超限时从最旧的条目开始删除"""
+        entries = []
+        for root, _, files in os.walk(self.cache_dir):
+            for name in files:
+                if not name.endswith(self.suffix):
+                    continue
+                path = os.path.join(root, name)
+                try:
+                    stat = os.stat(path)
+                except OSError:
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, path))
+
+        now = time.time()
+        removed = 0
+        total_size = 0
+        kept = []
+        for mtime, size, path in entries:
+            if self.max_age is not None and now - mtime > self.max_age:
+                removed += self._remove(path)
+            else:
+                kept.append((mtime, size, path))
+                total_size += size
+
+        if self.max_bytes is not None and total_size > self.max_bytes:
+            for mtime, size, path in sorted(kept):
+                if total_size <= self.max_bytes:
+                    break
+                removed += self._remove(path)
+                total_size -= size
+
+        if removed:
+            with self._lock:
+                self.evictions += removed
+            print(f"缓存淘汰 {removed} 个条目: {self.cache_dir}")
+
+    def _remove(self, path):
+        try:
+            os.remove(path)
+            return 1
+        except OSError:
+            return 0
+
+    def stats_text(self):
+        """命中统计的文字描述"""
+        return f"命中 {self.hits} 次，未命中 {self.misses} 次，写入 {self.stores} 次"
+
+
+class ResponseCache(_DiskCache):
+    """API响应缓存：以完整请求（提示词、模型、温度、max_tokens）的哈希为键"""
+
+    def make_key(self, request_data):
+        """根据API请求数据计算缓存键"""
+        return hash_text(json.dumps(request_data, ensure_ascii=False, sort_keys=True))
+
+    def get(self, key):
+        """读取缓存条目，返回包含 raw_response 和 latex 的字典，未命中返回None"""
+        path = self.entry_path(key)
+        entry = None
+        if os.path.exists(path) and not self.is_expired(path):
+            try:
+                with open(path, 'r', encoding='utf-8') as f:
+                    entry = json.load(f)
+            except (OSError, ValueError) as e:
+                print(f"读取缓存条目时出错: {e}")
+        self.count(entry is not None)
+        return entry
+
+    def put(self, key, raw_response, latex_content):
+        """写入缓存条目"""
+        entry = {
+            'key': key,
+            'created': time.strftime('%Y-%m-%d %H:%M:%S'),
+            'raw_response': raw_response,
+            'latex': latex_content
+        }
+        try:
+            self.write_atomic(self.entry_path(key),
+                              json.dumps(entry, ensure_ascii=False).encode('utf-8'))
+        except OSError as e:
+            print(f"写入缓存时出错: {e}")
+
+
+class CompileCache(_DiskCache):
+    """编译结果缓存：以LaTeX源文件、样式文件和编译设置的哈希为键保存PDF"""
+
+    suffix = '.pdf'
+
+    def make_key(self, latex_content, style_hash, compiler_settings):
+        """根据LaTeX源文件、样式文件哈希和编译设置计算缓存键"""
+        return hash_text(latex_content, style_hash or '', compiler_settings)
+
+    def restore(self, key, pdf_path):
+        """命中时把缓存的PDF复制到目标路径，返回是否命中"""
+        path = self.entry_path(key)
+        hit = False
+        if os.path.exists(path) and not self.is_expired(path):
+            try:
+                shutil.copyfile(path, pdf_path)
+                hit = True
+            except OSError as e:
+                print(f"读取编译缓存时出错: {e}")
+        self.count(hit)
+        return hit
+
+    def store(self, key, pdf_path):
+        """保存编译生成的PDF"""
+        try:
+            with open(pdf_path, 'rb') as f:
+                self.write_atomic(self.entry_path(key), f.read())
+        except OSError as e:
+            print(f"写入编译缓存时出错: {e}")
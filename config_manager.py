@@ -35,24 +35,108 @@ class ConfigManager:
                 'url': 'https://api.deepseek.com/v1/chat/completions',
                 'model': 'deepseek-chat',
                 'temperature': 0.3,
-                'max_tokens': 4000
+                'max_tokens': 4000,
+                'connect_timeout': 10,
+                'read_timeout': 60,
+                'max_retries': 3,
+                'backoff_base': 1.0,
+                'backoff_max': 30.0,
+                'pool_size': 4,
+                'stream': False,
+                'stream_check_chars': 300,
+                'stream_bad_output_retries': 1
             },
             'paths': {
                 'resource': './resource',
                 'input_dir': os.path.expanduser('~/NustoreFiles/6-XY/2025年8月幼小衔接/'),
-                'output_dir': './output'
+                'output_dir': './output',
+                'target_dir': os.path.expanduser('~/NutstoreFiles/6-XY/2025年8月幼小衔接'),
+                'state_dir': './state'
             },
             'monitor': {
-                'check_interval_minutes': 60
+                'check_interval_minutes': 60,
+                'watch_debounce_seconds': 3,
+                'watch_poll_seconds': 2,
+                'watch_backend': 'auto'
             },
             'file_patterns': {
                 'input': '*.txt',
-                'output': '*.tex'
+                'output': '*.tex',
+                'recursive': True,
+                'exclude_dirs': []
             },
             'latex': {
                 'document_class': 'article',
                 'font_size': '14pt',
-                'style_file': 'xydailystudy.sty'
+                'style_file': 'xydailystudy.sty',
+                'example_file': '20250924.tex',
+                'precompiled_format': True,
+                'compile_timeout_seconds': 300
+            },
+            'queue': {
+                'max_retries': 3
+            },
+            'local_render': {
+                'enabled': True
+            },
+            'normalize': {
+                'enabled': True,
+                'escape_latex': True
+            },
+            'validator': {
+                'enabled': True,
+                'api_repair': True,
+                'max_api_repairs': 1,
+                'extra_macros': []
+            },
+            'metrics': {
+                'enabled': True,
+                'file': ''
+            },
+            'incremental': {
+                'enabled': True
+            },
+            'chunking': {
+                'enabled': True,
+                'min_subjects': 2,
+                'min_input_chars': 1500
+            },
+            'preview': {
+                'enabled': True
+            },
+            'daemon': {
+                'socket': ''
+            },
+            'pipeline': {
+                'api_jobs': 1,
+                'compile_jobs': 1
+            },
+            'scheduler': {
+                'enabled': True,
+                'requests_per_minute': 0,
+                'tokens_per_minute': 0,
+                'min_concurrency': 1,
+                'latency_factor': 2.0,
+                'rate_limit_retries': 3,
+                'log_interval_seconds': 10
+            },
+            'hedging': {
+                'enabled': False,
+                'percentile': 0.9,
+                'min_samples': 5,
+                'window': 50,
+                'initial_delay_seconds': 40,
+                'min_delay_seconds': 5
+            },
+            'prompt': {
+                'style_mode': 'full'
+            },
+            'cache': {
+                'enabled': True,
+                'dir': './cache',
+                'max_size_mb': 200,
+                'max_age_days': 90,
+                'compile': True
             }
         }
     
@@ -76,6 +160,62 @@ class ConfigManager:
         """获取LaTeX配置"""
         return self.config.get('latex', {})
     
+    def get_queue_config(self):
+        """获取任务队列配置"""
+        return self.config.get('queue', {})
+    
+    def get_local_render_config(self):
+        """获取本地渲染配置"""
+        return self.config.get('local_render', {})
+    
+    def get_normalize_config(self):
+        """获取输入整理配置"""
+        return self.config.get('normalize', {})
+    
+    def get_validator_config(self):
+        """获取编译前检查配置"""
+        return self.config.get('validator', {})
+    
+    def get_metrics_config(self):
+        """获取指标记录配置"""
+        return self.config.get('metrics', {})
+    
+    def get_incremental_config(self):
+        """获取按学科增量更新配置"""
+        return self.config.get('incremental', {})
+    
+    def get_chunking_config(self):
+        """获取按学科分块生成配置"""
+        return self.config.get('chunking', {})
+    
+    def get_preview_config(self):
+        """获取HTML预览配置"""
+        return self.config.get('preview', {})
+    
+    def get_daemon_config(self):
+        """获取常驻进程配置"""
+        return self.config.get('daemon', {})
+    
+    def get_pipeline_config(self):
+        """获取流水线并行配置"""
+        return self.config.get('pipeline', {})
+    
+    def get_scheduler_config(self):
+        """获取API调度配置"""
+        return self.config.get('scheduler', {})
+    
+    def get_hedging_config(self):
+        """获取对冲请求配置"""
+        return self.config.get('hedging', {})
+    
+    def get_prompt_config(self):
+        """获取提示词配置"""
+        return self.config.get('prompt', {})
+    
+    def get_cache_config(self):
+        """获取缓存配置"""
+        return self.config.get('cache', {})
+    
     def save_config(self, config=None):
         """保存配置到文件"""
         if config is None:
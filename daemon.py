@@ -0,0 +1,308 @@
+"""常驻进程和客户端
+
+守护进程（python latex_generator.py --daemon）保持已加载的配置、资源、HTTP连接池和预编译格式，
+在Unix域套接字上接收请求；客户端（python daemon.py 20250924）不加载生成器，只读取配置文件中的
+套接字路径，提交日期后逐行显示处理进度。
+"""
+import io
+import json
+import os
+import socket
+import socketserver
+import sys
+import threading
+import time
+from contextlib import redirect_stdout
+
+from input_index import check_date_key
+
+
+def resolve_socket_path(config_manager):
+    """守护进程的套接字路径：daemon.socket，未设置时为 state_dir/daemon.sock（服务端和客户端共用）"""
+    socket_path = config_manager.get_daemon_config().get('socket')
+    if not socket_path:
+        state_dir = config_manager.get_paths_config().get('state_dir', 'state')
+        socket_path = os.path.join(os.path.expanduser(state_dir), 'daemon.sock')
+    return os.path.expanduser(socket_path)
+
+
+def send_message(stream, message):
+    """以JSON行发送一条消息"""
+    stream.write((json.dumps(message, ensure_ascii=False) + '\n').encode('utf-8'))
+    stream.flush()
+
+
+class _ProgressWriter(io.TextIOBase):
+    """把处理过程中的输出按行转发给客户端，同时保留在守护进程的输出中"""
+
+    def __init__(self, send, echo):
+        super().__init__()
+        self.send = send
+        self.echo = echo
+        self._buffer = ''
+        self._lock = threading.Lock()
+
+    def writable(self):
+        return True
+
+    def write(self, text):
+        self.echo.write(text)
+        with self._lock:
+            self._buffer += text
+            *lines, self._buffer = self._buffer.split('\n')
+        for line in lines:
+            self.send({'type': 'log', 'text': line})
+        return len(text)
+
+    def flush(self):
+        self.echo.flush()
+        with self._lock:
+            line, self._buffer = self._buffer, ''
+        if line:
+            self.send({'type': 'log', 'text': line})
+
+
+class _RequestHandler(socketserver.StreamRequestHandler):
+    """每个连接一个请求：读取一行JSON，处理过程中持续返回日志，最后返回结果"""
+
+    def handle(self):
+        self.connected = True
+        try:
+            request = json.loads(self.rfile.readline().decode('utf-8'))
+        except ValueError:
+            self.send({'type': 'result', 'ok': False, 'error': '请求格式无效'})
+            return
+        self.server.daemon.handle(request, self.send)
+
+    def send(self, message):
+        # 客户端断开后继续完成当前任务，只是不再发送进度
+        if not self.connected:
+            return
+        try:
+            send_message(self.wfile, message)
+        except OSError:
+            self.connected = False
+
+
+class _DaemonServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+
+class GeneratorDaemon:
+    """持有预热的 LatexGenerator，依次执行客户端提交的任务"""
+
+    def __init__(self, generator, socket_path):
+        self.generator = generator
+        self.socket_path = socket_path
+        # 同一时间只执行一个任务（生成器的统计和输出重定向不支持并行任务）
+        self._job_lock = threading.Lock()
+        self._server = None
+        self.started = None
+        self.jobs_done = 0
+
+    def warm_up(self):
+        """预先加载资源、提示词前缀、检查器和预编译格式，并创建HTTP连接池"""
+        start = time.monotonic()
+        self.generator.build_prompt('', '')
+        if self.generator.validator_enabled:
+            self.generator.get_latex_validator()
+        self.generator.latex_format.ensure_format()
+        self.generator.api_client.session
+        print(f"预热完成，耗时 {time.monotonic() - start:.2f} 秒")
+
+    def check_socket(self):
+        """套接字文件已存在时：有守护进程在运行则报错，否则删除残留的文件"""
+        if not os.path.exists(self.socket_path):
+            return
+        probe = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        try:
+            probe.connect(self.socket_path)
+        except OSError:
+            os.remove(self.socket_path)
+            return
+        finally:
+            probe.close()
+        raise RuntimeError(f"守护进程已在运行: {self.socket_path}")
+
+    def serve(self):
+        """启动守护进程，直到收到 stop 请求或Ctrl+C"""
+        self.check_socket()
+        self.warm_up()
+        os.makedirs(os.path.dirname(self.socket_path) or '.', exist_ok=True)
+
+        # 套接字只允许当前用户访问
+        old_umask = os.umask(0o077)
+        try:
+            self._server = _DaemonServer(self.socket_path, _RequestHandler)
+        finally:
+            os.umask(old_umask)
+        self._server.daemon = self
+        self.started = time.time()
+        print(f"守护进程已启动，监听: {self.socket_path}")
+        print("按Ctrl+C停止")
+        try:
+            self._server.serve_forever()
+        except KeyboardInterrupt:
+            print("\n守护进程已停止")
+        finally:
+            self._server.server_close()
+            if os.path.exists(self.socket_path):
+                os.remove(self.socket_path)
+
+    def status(self):
+        return {
+            'pid': os.getpid(),
+            'uptime': time.time() - self.started,
+            'jobs_done': self.jobs_done,
+            'busy': self._job_lock.locked(),
+        }
+
+    def handle(self, request, send):
+        command = request.get('command')
+        if command == 'status':
+            send({'type': 'result', 'ok': True, **self.status()})
+            return
+        if command == 'stop':
+            send({'type': 'result', 'ok': True})
+            # shutdown 会等待 serve_forever 退出，不能在请求线程中直接调用
+            threading.Thread(target=self._server.shutdown).start()
+            return
+        if command not in ('single', 'batch', 'monthly'):
+            send({'type': 'result', 'ok': False, 'error': f"未知命令: {command}"})
+            return
+
+        if not self._job_lock.acquire(blocking=False):
+            send({'type': 'log', 'text': '等待前一个任务完成...'})
+            self._job_lock.acquire()
+        try:
+            writer = _ProgressWriter(send, sys.__stdout__)
+            with redirect_stdout(writer):
+                try:
+                    result = self.run_job(command, request)
+                except Exception as e:
+                    print(f"任务执行出错: {e}")
+                    result = {'ok': False, 'error': str(e)}
+                writer.flush()
+            self.jobs_done += 1
+        finally:
+            self._job_lock.release()
+        send({'type': 'result', **result})
+
+    def run_job(self, command, request):
+        """在预热的生成器上执行一个任务，返回结果字段"""
+        generator = self.generator
+        saved = (generator.cache_read, generator.date_from, generator.date_to, generator.defer_compile)
+        if request.get('refresh'):
+            generator.cache_read = False
+        if request.get('no_compile'):
+            generator.defer_compile = True
+        generator.date_from = request.get('date_from')
+        generator.date_to = request.get('date_to')
+        try:
+            if command == 'single':
+                dates = request.get('dates') or []
+                input_files = [path for path in map(generator.find_input_file, dates) if path]
+                success_count = generator.process_files(input_files, mode='daemon') if input_files else 0
+                generator.print_run_stats()
+                return {'ok': success_count == len(dates), 'success': success_count, 'total': len(dates)}
+            if command == 'batch':
+                return {'ok': bool(generator.run_once())}
+            return {'ok': bool(generator.run_monthly(request.get('month')))}
+        finally:
+            generator.cache_read, generator.date_from, generator.date_to, generator.defer_compile = saved
+
+
+def submit(socket_path, request):
+    """向守护进程提交请求并逐行输出进度，返回结果消息"""
+    client = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        client.connect(socket_path)
+    except OSError as e:
+        client.close()
+        raise ConnectionError(f"无法连接守护进程（{socket_path}）: {e}") from e
+
+    result = None
+    with client, client.makefile('rwb') as stream:
+        send_message(stream, request)
+        for line in stream:
+            message = json.loads(line.decode('utf-8'))
+            if message.get('type') == 'log':
+                print(message['text'], flush=True)
+            else:
+                result = message
+                break
+    return result
+
+
+def main():
+    args = sys.argv[1:]
+    socket_path = None
+    config_file = "config.yaml"
+    request = {'command': 'single', 'dates': []}
+    while args:
+        arg = args.pop(0)
+        if arg == '--socket' and args:
+            socket_path = args.pop(0)
+        elif arg == '--config' and args:
+            config_file = args.pop(0)
+        elif arg in ('--status', '--stop', '--batch'):
+            request['command'] = arg[2:]
+        elif arg == '--monthly' and args:
+            request.update(command='monthly', month=args.pop(0))
+        elif arg in ('--from', '--to') and args:
+            try:
+                request['date_' + arg[2:]] = check_date_key(args.pop(0))
+            except ValueError as e:
+                print(e)
+                return 2
+        elif arg == '--refresh':
+            request['refresh'] = True
+        elif arg == '--no-compile':
+            request['no_compile'] = True
+        elif arg.isdigit():
+            try:
+                request['dates'].append(check_date_key(arg))
+            except ValueError as e:
+                print(e)
+                return 2
+        else:
+            print("用法:")
+            print("  python daemon.py YYYYMMDD [YYYYMMDD ...] # 提交日期，显示处理进度")
+            print("  python daemon.py 20250924 --refresh      # 忽略已缓存的API响应")
+            print("  python daemon.py 20250924 --no-compile   # 只生成LaTeX和HTML预览，不编译PDF")
+            print("  python daemon.py --batch [--from YYYYMMDD] [--to YYYYMMDD] # 批量处理")
+            print("  python daemon.py --monthly YYYYMM        # 生成月度汇总")
+            print("  python daemon.py --status                # 查看守护进程状态")
+            print("  python daemon.py --stop                  # 停止守护进程")
+            print("  python daemon.py --config file ...       # 从指定的配置文件读取套接字路径（默认 config.yaml）")
+            print("  python daemon.py --socket path ...       # 指定套接字路径（默认 daemon.socket 或 state_dir/daemon.sock）")
+            return 2
+
+    if request['command'] == 'single' and not request['dates']:
+        print("请指定日期，使用 --help 查看用法")
+        return 2
+
+    if socket_path is None:
+        from config_manager import ConfigManager
+        socket_path = resolve_socket_path(ConfigManager(config_file))
+
+    try:
+        result = submit(socket_path, request)
+    except ConnectionError as e:
+        print(e)
+        print("请先启动守护进程: python latex_generator.py --daemon")
+        return 1
+
+    if result is None:
+        print("守护进程连接已断开")
+        return 1
+    if request['command'] == 'status':
+        print(f"守护进程 PID {result['pid']}，已运行 {result['uptime']:.0f} 秒，"
+              f"完成 {result['jobs_done']} 个任务，{'正在处理' if result['busy'] else '空闲'}")
+    elif result.get('error'):
+        print(f"错误: {result['error']}")
+    return 0 if result.get('ok') else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,136 @@
+import os
+import threading
+import time
+from datetime import datetime
+
+try:
+    from watchdog.events import FileSystemEventHandler
+    from watchdog.observers import Observer
+except ImportError:  # 未安装watchdog时使用轮询
+    FileSystemEventHandler = object
+    Observer = None
+
+
+class _ChangeHandler(FileSystemEventHandler):
+    """把watchdog事件转交给InputWatcher"""
+
+    def __init__(self, watcher):
+        super().__init__()
+        self.watcher = watcher
+
+    def on_any_event(self, event):
+        if event.is_directory:
+            return
+        self.watcher.notify(event.src_path)
+        dest_path = getattr(event, 'dest_path', None)
+        if dest_path:
+            self.watcher.notify(dest_path)
+
+
+class InputWatcher:
+    """事件驱动的输入目录监控：优先使用inotify（watchdog），否则轮询目录；对连续写入做防抖"""
+
+    def __init__(self, generator, debounce_seconds=3.0, poll_seconds=2.0, backend='auto'):
+        self.generator = generator
+        self.input_dir = generator.input_dir
+        self.debounce_seconds = debounce_seconds
+        self.poll_seconds = poll_seconds
+        self.backend = backend
+
+        self._lock = threading.Lock()
+        # 文件路径 -> (最后一次事件时间, 当时的 (mtime_ns, size))
+        self._pending = {}
+        self._snapshot = {}
+
+    def notify(self, file_path):
+        """记录一次文件变更事件，防抖计时从最后一次事件开始"""
+        if not self.generator.input_index.accepts(file_path, self.generator.date_from, self.generator.date_to):
+            return
+        with self._lock:
+            self._pending[file_path] = (time.monotonic(), self._stat(file_path))
+
+    def _stat(self, file_path):
+        try:
+            stat = os.stat(file_path)
+            return (stat.st_mtime_ns, stat.st_size)
+        except OSError:
+            return None
+
+    def _scan(self):
+        """轮询模式：对比目录快照，找出新增或变化的文件（目录列表由输入索引缓存）"""
+        snapshot = {}
+        for file_path in self.generator.input_index.find(self.generator.date_from, self.generator.date_to):
+            signature = self._stat(file_path)
+            if signature is not None:
+                snapshot[file_path] = signature
+
+        for file_path, signature in snapshot.items():
+            if self._snapshot.get(file_path) != signature:
+                self.notify(file_path)
+        self._snapshot = snapshot
+
+    def take_ready_files(self):
+        """取出已经稳定（防抖时间内无新事件且大小/mtime不再变化）的文件"""
+        now = time.monotonic()
+        ready = []
+        with self._lock:
+            for file_path, (last_event, signature) in list(self._pending.items()):
+                if now - last_event < self.debounce_seconds:
+                    continue
+                current = self._stat(file_path)
+                if current is None:
+                    # 文件已被删除或移走
+                    del self._pending[file_path]
+                elif current != signature:
+                    # 防抖期间文件仍在变化，重新计时
+                    self._pending[file_path] = (now, current)
+                else:
+                    del self._pending[file_path]
+                    ready.append(file_path)
+        return sorted(ready)
+
+    def start_observer(self):
+        """启动inotify监控，不可用时返回None"""
+        if self.backend == 'poll' or Observer is None:
+            return None
+        try:
+            observer = Observer()
+            observer.schedule(_ChangeHandler(self), self.input_dir,
+                             recursive=self.generator.input_index.recursive)
+            observer.start()
+            return observer
+        except Exception as e:
+            print(f"无法启动文件系统事件监控，改用轮询: {e}")
+            return None
+
+    def run(self):
+        """运行监控循环，直到Ctrl+C"""
+        observer = self.start_observer()
+        if observer:
+            print(f"使用文件系统事件监控目录: {self.input_dir}")
+        else:
+            print(f"使用轮询监控目录（每{self.poll_seconds}秒）: {self.input_dir}")
+
+        # 首次扫描把启动前已有的文件加入待检查列表，未变化的会被处理清单过滤掉
+        self._scan()
+
+        try:
+            while True:
+                # 事件模式只需定期检查防抖是否到期
+                time.sleep(0.5 if observer else self.poll_seconds)
+                if not observer:
+                    self._scan()
+
+                ready_files = [file_path for file_path in self.take_ready_files()
+                               if self.generator.needs_processing(file_path)]
+                if ready_files:
+                    print(f"{datetime.now().strftime('%Y-%m-%d %H:%M:%S')} - 检测到 {len(ready_files)} 个文件变更")
+                    success_count = self.generator.process_files(ready_files, mode='watch')
+                    print(f"处理完成: 成功 {success_count}/{len(ready_files)} 个文件")
+                    self.generator.print_run_stats()
+        except KeyboardInterrupt:
+            print("\n监控已停止")
+        finally:
+            if observer:
+                observer.stop()
+                observer.join()
@@ -0,0 +1,216 @@
+import asyncio
+import contextvars
+import queue
+import threading
+import time
+from collections import deque
+
+from api_client import CancelToken
+from metrics import percentile
+
+
+class RequestHedger:
+    """对冲请求：一次API调用超过最近延迟的某个分位数仍未返回（流式时为仍未收到首个token）时，
+    再发出一个相同的请求，先返回且通过检查的结果胜出，另一个被取消
+
+    延迟按请求类型（整篇文档、单个学科）和是否流式分别统计。被取消的请求按提示词token数计入额外成本；
+    对冲请求胜出时，按此前观测到的慢请求（发出对冲后原请求仍先返回）的平均延迟估算原请求的完成时间，
+    没有观测时按读取超时估算，以此计算节省的时间。
+    """
+
+    def __init__(self, config, read_timeout=60):
+        self.enabled = config.get('enabled', False)
+        self.percentile = config.get('percentile', 0.9)
+        self.min_samples = max(1, int(config.get('min_samples', 5)))
+        self.window = max(self.min_samples, int(config.get('window', 50)))
+        # 样本不足时的对冲等待时间（秒，0 表示样本足够前不对冲）
+        self.initial_delay = config.get('initial_delay_seconds', 40) or 0
+        self.min_delay = config.get('min_delay_seconds', 5) or 0
+        self.read_timeout = read_timeout
+
+        self._lock = threading.Lock()
+        self._latencies = {}
+        # 发出对冲后原请求仍先返回时观测到的慢请求延迟
+        self._stragglers = {}
+        # 运行统计
+        self.hedged = 0
+        self.hedge_wins = 0
+        self.extra_tokens = 0
+        self.saved_seconds = 0.0
+
+    def hedge_delay(self, kind, streaming=False):
+        """请求发出后多久仍未返回时发出对冲请求，返回None表示不对冲"""
+        if not self.enabled:
+            return None
+        with self._lock:
+            samples = list(self._latencies.get((kind, streaming), ()))
+        if len(samples) >= self.min_samples:
+            delay = percentile(samples, self.percentile)
+        elif self.initial_delay:
+            delay = self.initial_delay
+        else:
+            return None
+        return max(delay, self.min_delay)
+
+    def record_latency(self, kind, seconds, streaming=False):
+        """记录一次成功请求的延迟（流式时为首个token的延迟）"""
+        with self._lock:
+            samples = self._latencies.setdefault((kind, streaming), deque(maxlen=self.window))
+            samples.append(seconds)
+
+    def estimate_saved(self, kind, elapsed, streaming=False):
+        """对冲请求胜出时估算节省的时间：原请求按观测到的慢请求平均延迟（不超过读取超时）完成"""
+        with self._lock:
+            samples = self._stragglers.get((kind, streaming))
+            expected = sum(samples) / len(samples) if samples else self.read_timeout
+        return max(0.0, min(expected, self.read_timeout) - elapsed)
+
+    def finish(self, kind, winner, starts, first_tokens, end, prompt_tokens, streaming):
+        """记录胜出请求的延迟和对冲统计，返回本次调用的对冲信息（未发出对冲请求时为None）"""
+        first_token = first_tokens.get(winner)
+        if streaming and first_token is not None:
+            self.record_latency(kind, first_token - starts[winner], streaming)
+        elif not streaming:
+            self.record_latency(kind, end - starts[winner], streaming)
+        if len(starts) == 1:
+            return None
+
+        # 流式时比较首个token的时间
+        elapsed = (first_token if streaming and first_token is not None else end) - starts[0]
+        if winner == 0:
+            with self._lock:
+                self._stragglers.setdefault((kind, streaming), deque(maxlen=self.window)).append(elapsed)
+        info = {
+            'won': winner == 1,
+            # 被取消的请求已发送提示词，按提示词token数计入额外成本
+            'extra_tokens': prompt_tokens,
+            'saved_seconds': self.estimate_saved(kind, elapsed, streaming) if winner == 1 else 0.0,
+        }
+        with self._lock:
+            self.hedged += 1
+            self.hedge_wins += info['won']
+            self.extra_tokens += info['extra_tokens']
+            self.saved_seconds += info['saved_seconds']
+        print(f"对冲请求{'胜出' if info['won'] else '落后'}，已取消另一个请求")
+        return info
+
+    def run(self, attempt, kind, prompt_tokens, accept=None, streaming=False):
+        """在线程中执行请求，必要时发出对冲请求，返回 (结果, 对冲信息)
+
+        attempt(cancel, on_first_token, hedge) 发出一次请求并返回结果；accept(结果) 为False时
+        该结果不采用（都不通过时返回最后一个结果）。两个请求都失败时抛出最后的异常。
+        """
+        if not self.enabled:
+            return attempt(None, None, False), None
+        # 样本不足时不对冲，但仍记录延迟
+        delay = self.hedge_delay(kind, streaming)
+
+        results = queue.Queue()
+        starts = []
+        first_tokens = {}
+        cancels = []
+
+        def launch():
+            index = len(starts)
+            cancel = CancelToken()
+            cancels.append(cancel)
+            starts.append(time.monotonic())
+
+            def on_first_token():
+                first_tokens.setdefault(index, time.monotonic())
+
+            def target():
+                try:
+                    results.put((index, context.run(attempt, cancel, on_first_token, index > 0), None))
+                except Exception as e:
+                    results.put((index, None, e))
+            # 在新线程中保留当前的指标记录等上下文
+            context = contextvars.copy_context()
+            threading.Thread(target=target, daemon=True).start()
+
+        launch()
+        hedge_at = None if delay is None else starts[0] + delay
+        pending = 1
+        winner = fallback = error = None
+        while pending:
+            if hedge_at is not None and streaming and 0 in first_tokens:
+                # 原请求已开始输出，不再对冲
+                hedge_at = None
+            timeout = None if hedge_at is None else max(0.0, hedge_at - time.monotonic())
+            try:
+                index, result, exc = results.get(timeout=timeout)
+            except queue.Empty:
+                if not (streaming and 0 in first_tokens):
+                    print(f"请求 {delay:.1f} 秒未{'开始输出' if streaming else '返回'}，发出对冲请求")
+                    launch()
+                    pending += 1
+                hedge_at = None
+                continue
+            pending -= 1
+            if exc is not None:
+                error = exc
+                if index == 0:
+                    # 原请求已失败，不再对冲
+                    hedge_at = None
+                continue
+            if accept is None or accept(result):
+                winner = (index, result)
+                break
+            fallback = (index, result)
+            hedge_at = None
+
+        for cancel in cancels:
+            cancel.cancel()
+        if winner is None:
+            winner = fallback
+        if winner is None:
+            raise error
+        info = self.finish(kind, winner[0], starts, first_tokens, time.monotonic(), prompt_tokens, streaming)
+        return winner[1], info
+
+    async def run_async(self, attempt, kind, prompt_tokens, accept=None):
+        """异步版本的 run：attempt(hedge) 为协程函数，落后的请求通过任务取消中止"""
+        if not self.enabled:
+            return await attempt(False), None
+        delay = self.hedge_delay(kind)
+
+        starts = [time.monotonic()]
+        tasks = {asyncio.ensure_future(attempt(False)): 0}
+        hedge_at = None if delay is None else starts[0] + delay
+        winner = fallback = error = None
+        try:
+            while tasks and winner is None:
+                timeout = None if hedge_at is None else max(0.0, hedge_at - time.monotonic())
+                done, _ = await asyncio.wait(tasks, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+                if not done:
+                    print(f"请求 {delay:.1f} 秒未返回，发出对冲请求")
+                    starts.append(time.monotonic())
+                    tasks[asyncio.ensure_future(attempt(True))] = 1
+                    hedge_at = None
+                    continue
+                for task in done:
+                    index = tasks.pop(task)
+                    if task.exception() is not None:
+                        error = task.exception()
+                        if index == 0:
+                            hedge_at = None
+                    elif accept is None or accept(task.result()):
+                        winner = (index, task.result())
+                        break
+                    else:
+                        fallback = (index, task.result())
+                        hedge_at = None
+        finally:
+            for task in tasks:
+                task.cancel()
+        if winner is None:
+            winner = fallback
+        if winner is None:
+            raise error
+        info = self.finish(kind, winner[0], starts, {}, time.monotonic(), prompt_tokens, False)
+        return winner[1], info
+
+    def stats_text(self):
+        with self._lock:
+            return (f"请求对冲: {self.hedged} 次，对冲请求胜出 {self.hedge_wins} 次，"
+                    f"额外约 {self.extra_tokens} tokens，估计节省 {self.saved_seconds:.1f} 秒")
@@ -0,0 +1,305 @@
+import html
+import re
+
+from incremental import read_braced
+from latex_validator import mask_comments
+from local_renderer import SUBJECTS, SUBJECT_ENVIRONMENTS
+
+# 样式文件中的颜色定义，如 \definecolor{pinyinbg}{RGB}{255, 230, 200}
+_COLOR_PATTERN = re.compile(r'\\definecolor\{(\w+)\}\{RGB\}\{\s*(\d+)\s*,\s*(\d+)\s*,\s*(\d+)\s*\}')
+# 学科框标题，如 \color{pinyintitle}拼音学习情况\\
+_BOX_TITLE_PATTERN = re.compile(r'\\newenvironment\{(\w+)\}.*?\\color\{\w+\}([^\\\s{}]+)\\\\', re.DOTALL)
+_COMMAND_PATTERN = re.compile(r'\\([A-Za-z]+)\*?|\\(.)', re.DOTALL)
+_DAILYTITLE_PATTERN = re.compile(r'\\dailytitle\s*(?=\{)')
+_PARAGRAPH_BREAK = '\x00'
+
+# 直接替换为文字的命令
+_SYMBOLS = {
+    'good': '\U0001F60A', 'average': '\U0001F642', 'poor': '\U0001F610', 'book': '\U0001F4DA',
+    'textbackslash': '\\', 'textasciitilde': '~', 'textasciicircum': '^', 'ldots': '…', 'dots': '…',
+    'quad': '\u2003', 'qquad': '\u2003\u2003', 'hrulefill': '<span class="rule"></span>',
+}
+# 带一个参数、转为HTML标签的命令
+_TAGS = {'textbf': 'strong', 'textit': 'em', 'emph': 'em', 'uline': 'u', 'underline': 'u', 'texttt': 'code'}
+# 忽略参数的命令（排版设置）
+_SKIP_ARGUMENT = {'vspace', 'hspace', 'color', 'label', 'setlength', 'includegraphics'}
+_LIST_TAGS = {'enumerate': 'ol', 'itemize': 'ul'}
+
+PAGE_TEMPLATE = """<!DOCTYPE html>
+<html lang="zh-CN">
+<head>
+<meta charset="utf-8">
+<title>%(title)s</title>
+<style>
+body { font-family: "Noto Serif CJK SC", "Songti SC", serif; max-width: 46em; margin: 2em auto; padding: 0 1em; line-height: 1.7; }
+header { text-align: center; margin-bottom: 1.5em; }
+header h1 { font-size: 2em; margin: 0; }
+header p { font-size: 1.2em; margin: 0.3em 0 0; }
+.box { border: 2px solid; border-radius: 10px; padding: 0.6em 1em; margin: 1.2em 0; }
+.box h2 { text-align: center; font-size: 1.2em; margin: 0 0 0.4em; }
+.box p { margin: 0.4em 0; text-indent: 2em; }
+.box li p, .homework p { text-indent: 0; }
+ol, ul { margin: 0.2em 0; padding-left: 2em; }
+.homework { border: 2px solid black; border-radius: 10px; padding: 0.6em 1em; margin: 2em 0; }
+.homework h2 { text-align: center; font-size: 1.2em; margin: 0 0 0.4em; }
+.rule { display: inline-block; min-width: 8em; border-bottom: 1px solid black; }
+%(box_styles)s
+</style>
+</head>
+<body>
+%(body)s
+</body>
+</html>
+"""
+
+
+class HtmlPreviewRenderer:
+    """把生成的LaTeX（本项目使用的子集）转换为HTML预览，无需TeX环境，毫秒级完成
+
+    支持 \\dailytitle、四个学科框、enumerate/itemize、\\textbf 等字体命令、\\homeworkrecord 和常用转义；
+    其余命令只保留参数中的文字。颜色和学科框标题从样式文件中读取。
+    """
+
+    def __init__(self, style_content=''):
+        colors = {name: f"rgb({r}, {g}, {b})" for name, r, g, b in _COLOR_PATTERN.findall(style_content)}
+        titles = dict(_BOX_TITLE_PATTERN.findall(style_content))
+        self.boxes = {}
+        for subject, environment in SUBJECT_ENVIRONMENTS.items():
+            prefix = environment[:-3]
+            self.boxes[environment] = {
+                'class': prefix,
+                'title': titles.get(environment, f"{subject}学习情况"),
+                'background': colors.get(f"{prefix}bg", '#f5f5f5'),
+                'border': colors.get(f"{prefix}title", '#333333'),
+            }
+
+    def box_styles(self):
+        return "\n".join(f".box.{box['class']} {{ background: {box['background']}; border-color: {box['border']}; }}\n"
+                         f".box.{box['class']} h2 {{ color: {box['border']}; }}"
+                         for box in self.boxes.values())
+
+    def render(self, latex_content):
+        """转换完整的LaTeX文档，返回HTML页面"""
+        latex_content = mask_comments(latex_content)
+        begin = latex_content.find('\\begin{document}')
+        end = latex_content.rfind('\\end{document}')
+        if begin >= 0:
+            latex_content = latex_content[begin + len('\\begin{document}'):end if end > begin else None]
+
+        # 渲染器按样式缓存并在多个线程间共享，每次调用的状态只保存在局部变量中
+        title = self.render_title(latex_content)
+        body = self.render_blocks(latex_content)
+        return PAGE_TEMPLATE % {'title': html.escape(title or '学习反馈'),
+                                'box_styles': self.box_styles(), 'body': body}
+
+    def render_title(self, text):
+        """页面标题：最后一处 \\dailytitle 的日期，没有时返回空字符串"""
+        title = ''
+        for match in _DAILYTITLE_PATTERN.finditer(text):
+            parsed = read_braced(text, match.end())
+            if parsed is not None:
+                title = f"幼小衔接学习反馈 {re.sub('<[^>]+>', '', self.convert(parsed[0]))}"
+        return title
+
+    def render_blocks(self, text):
+        """转换一段内容，空行分隔的文字段落包装为 <p>"""
+        blocks = []
+        for part in self.convert(text).split(_PARAGRAPH_BREAK):
+            part = part.strip()
+            if not part:
+                continue
+            if part.startswith(('<section', '<header', '<ol', '<ul', '<div')):
+                blocks.append(part)
+            else:
+                blocks.append(f"<p>{part}</p>")
+        return "\n".join(blocks)
+
+    def convert(self, text):
+        """逐个处理命令、环境、分组和普通文字"""
+        out = []
+        position = 0
+        while position < len(text):
+            char = text[position]
+            if char == '\\':
+                position = self.convert_command(text, position, out)
+            elif char == '{':
+                parsed = read_braced(text, position)
+                if parsed is None:
+                    position += 1
+                    continue
+                out.append(self.convert(parsed[0]))
+                position = parsed[1]
+            elif char == '}':
+                position += 1
+            elif char == '\n' and re.match(r'\n[ \t]*\n', text[position:]):
+                out.append(_PARAGRAPH_BREAK)
+                position = re.match(r'(?:\n[ \t]*)+', text[position:]).end() + position
+            elif char == '~':
+                out.append('&nbsp;')
+                position += 1
+            elif char == '$':
+                stop = text.find('$', position + 1)
+                stop = len(text) if stop < 0 else stop
+                out.append(f'<span class="math">{html.escape(text[position + 1:stop])}</span>')
+                position = stop + 1
+            else:
+                stop = position
+                while stop < len(text) and text[stop] not in '\\{}~$\n':
+                    stop += 1
+                if stop == position:
+                    # 单个换行
+                    stop += 1
+                out.append(html.escape(text[position:stop]))
+                position = stop
+        return ''.join(out)
+
+    def read_arguments(self, text, position, count):
+        """读取命令后的若干 {参数}（跳过 [可选参数]），返回 (参数列表, 结束位置)"""
+        args = []
+        while len(args) < count:
+            while position < len(text) and text[position] in ' \t\n':
+                position += 1
+            if text.startswith('[', position):
+                stop = text.find(']', position)
+                position = stop + 1 if stop >= 0 else len(text)
+                continue
+            parsed = read_braced(text, position)
+            if parsed is None:
+                break
+            args.append(parsed[0])
+            position = parsed[1]
+        return args, position
+
+    def convert_command(self, text, position, out):
+        """处理 position 处的命令，返回命令结束的位置"""
+        match = _COMMAND_PATTERN.match(text, position)
+        if match is None:
+            return position + 1
+        name, symbol = match.groups()
+        position = match.end()
+
+        if symbol is not None:
+            if symbol == '\\':
+                # 换行，跳过行距参数 \\[0.2cm]
+                if text.startswith('[', position):
+                    stop = text.find(']', position)
+                    position = stop + 1 if stop >= 0 else position
+                out.append('<br>')
+            elif symbol in '&%$#_{}':
+                out.append(html.escape(symbol))
+            elif symbol == ' ':
+                out.append(' ')
+            return position
+
+        # 命令名后的空格不输出
+        if name not in _SYMBOLS:
+            while position < len(text) and text[position] in ' \t':
+                position += 1
+
+        if name == 'begin':
+            return self.convert_environment(text, position, out)
+        if name == 'dailytitle':
+            args, position = self.read_arguments(text, position, 1)
+            date = self.convert(args[0]) if args else ''
+            out.append(f"{_PARAGRAPH_BREAK}<header><h1>幼小衔接学习反馈</h1><p>{date}</p></header>{_PARAGRAPH_BREAK}")
+        elif name in ('homeworkrecord', 'homeworkrecordall'):
+            args, position = self.read_arguments(text, position, len(SUBJECTS))
+            out.append(_PARAGRAPH_BREAK + self.render_homework(args, name == 'homeworkrecordall') + _PARAGRAPH_BREAK)
+        elif name in _TAGS:
+            args, position = self.read_arguments(text, position, 1)
+            if args:
+                tag = _TAGS[name]
+                out.append(f"<{tag}>{self.convert(args[0])}</{tag}>")
+        elif name == 'texttwemoji':
+            args, position = self.read_arguments(text, position, 1)
+            try:
+                out.append(chr(int(args[0], 16)))
+            except (IndexError, ValueError):
+                pass
+        elif name in _SYMBOLS:
+            out.append(_SYMBOLS[name])
+        elif name in _SKIP_ARGUMENT:
+            _, position = self.read_arguments(text, position, 1)
+        elif name == 'par':
+            out.append(_PARAGRAPH_BREAK)
+        return position
+
+    def find_environment_end(self, text, position, environment):
+        """查找与 position 处开始的环境配对的 \\end，返回 (内容结束位置, \\end 之后的位置)"""
+        begin = f"\\begin{{{environment}}}"
+        end = f"\\end{{{environment}}}"
+        depth = 1
+        while True:
+            next_end = text.find(end, position)
+            if next_end < 0:
+                return len(text), len(text)
+            next_begin = text.find(begin, position)
+            if 0 <= next_begin < next_end:
+                depth += 1
+                position = next_begin + len(begin)
+                continue
+            depth -= 1
+            if depth == 0:
+                return next_end, next_end + len(end)
+            position = next_end + len(end)
+
+    def split_items(self, text):
+        """按最外层的 \\item 拆分列表内容"""
+        items = []
+        depth = 0
+        start = None
+        for match in re.finditer(r'\\begin\{|\\end\{|\\item\b', text):
+            token = match.group(0)
+            if token == '\\begin{':
+                depth += 1
+            elif token == '\\end{':
+                depth -= 1
+            elif depth == 0:
+                if start is not None:
+                    items.append(text[start:match.start()])
+                start = match.end()
+        if start is not None:
+            items.append(text[start:])
+        return items
+
+    def convert_environment(self, text, position, out):
+        """处理 \\begin{环境}，返回 \\end{环境} 之后的位置"""
+        parsed = read_braced(text, position)
+        if parsed is None:
+            return position
+        environment, content_start = parsed
+        content_end, position = self.find_environment_end(text, content_start, environment)
+        content = text[content_start:content_end]
+
+        if environment in self.boxes:
+            box = self.boxes[environment]
+            out.append(f'{_PARAGRAPH_BREAK}<section class="box {box["class"]}"><h2>{html.escape(box["title"])}</h2>\n'
+                       f'{self.render_blocks(content)}</section>{_PARAGRAPH_BREAK}')
+        elif environment in _LIST_TAGS:
+            tag = _LIST_TAGS[environment]
+            items = "\n".join(f"<li>{self.render_item(item)}</li>" for item in self.split_items(content))
+            out.append(f"{_PARAGRAPH_BREAK}<{tag}>\n{items}\n</{tag}>{_PARAGRAPH_BREAK}")
+        elif environment == 'center':
+            out.append(f'{_PARAGRAPH_BREAK}<div style="text-align: center">{self.render_blocks(content)}</div>{_PARAGRAPH_BREAK}')
+        else:
+            out.append(self.convert(content))
+        return position
+
+    def render_item(self, text):
+        """列表项：只有一段文字时不包装 <p>"""
+        rendered = self.render_blocks(text)
+        if rendered.startswith('<p>') and rendered.count('<p>') == 1 and rendered.endswith('</p>'):
+            return rendered[3:-4]
+        return rendered
+
+    def render_homework(self, args, show_all=False):
+        """作业记录框：只显示有内容的学科（\\homeworkrecordall 显示全部）"""
+        rows = []
+        for subject, arg in zip(SUBJECTS, args):
+            content = self.convert(arg).strip()
+            if content or show_all:
+                rows.append(f"<p><strong>{subject}作业：</strong><u>{content}</u></p>")
+        rows.append("<p><strong>完成情况：</strong>\u2003\u2705 已完成\u2003\U0001F7E8 部分完成\u2003\u274C 未完成</p>")
+        rows.append('<p><strong>家长签字：</strong><span class="rule"></span></p>')
+        rows.append('<p><strong>日期：</strong><span class="rule"></span></p>')
+        return '<div class="homework"><h2>作业完成情况记录</h2>\n' + "\n".join(rows) + "</div>"
@@ -0,0 +1,122 @@
+import json
+import os
+
+from local_renderer import SUBJECTS, SUBJECT_ENVIRONMENTS, split_subjects
+
+
+def read_braced(text, start):
+    """读取 text[start] 处 { 开始的参数，返回 (参数内容, 右括号之后的位置)，括号不匹配时返回None"""
+    if start >= len(text) or text[start] != '{':
+        return None
+    depth = 0
+    index = start
+    while index < len(text):
+        char = text[index]
+        if char == '\\':
+            index += 2
+            continue
+        if char == '{':
+            depth += 1
+        elif char == '}':
+            depth -= 1
+            if depth == 0:
+                return text[start + 1:index], index + 1
+        index += 1
+    return None
+
+
+def find_command(text, name, arg_count):
+    """查找唯一一处 \\name{...}...，返回 (起始位置, 结束位置, [参数...])，不存在或不唯一时返回None"""
+    marker = f"\\{name}"
+    start = text.find(marker + '{')
+    if start < 0 or text.find(marker + '{', start + 1) >= 0:
+        return None
+    args = []
+    position = start + len(marker)
+    for _ in range(arg_count):
+        parsed = read_braced(text, position)
+        if parsed is None:
+            return None
+        args.append(parsed[0])
+        position = parsed[1]
+    return start, position, args
+
+
+def find_environment(latex_content, environment):
+    """查找唯一一个 \\begin{环境}...\\end{环境}，返回 (起始位置, 结束位置)，不存在或不唯一时返回None"""
+    begin = f"\\begin{{{environment}}}"
+    end = f"\\end{{{environment}}}"
+    start = latex_content.find(begin)
+    if start < 0 or latex_content.find(begin, start + 1) >= 0:
+        return None
+    stop = latex_content.find(end, start)
+    if stop < 0:
+        return None
+    return start, stop + len(end)
+
+
+def diff_sections(old_input, new_input):
+    """按学科比较新旧输入，返回内容变化的学科列表
+
+    学科标题之前的行变化、学科增删或顺序变化、学科重复时返回None（只能整篇重新生成）。
+    """
+    old_leading, old_sections = split_subjects(old_input)
+    new_leading, new_sections = split_subjects(new_input)
+    if [line.strip() for line in old_leading if line.strip()] != \
+            [line.strip() for line in new_leading if line.strip()]:
+        return None
+    old_subjects = [subject for subject, _ in old_sections]
+    if old_subjects != [subject for subject, _ in new_sections] or len(set(old_subjects)) != len(old_subjects):
+        return None
+    return [subject for (subject, old_text), (_, new_text) in zip(old_sections, new_sections)
+            if old_text != new_text]
+
+
+def splice_sections(latex_content, boxes, homework):
+    """把重新生成的学科框和作业参数替换进原文档，原文档结构无法识别时返回None
+
+    boxes: {学科: 新的 \\begin{环境}...\\end{环境}}；homework: {学科: 新的 \\homeworkrecord 参数}
+    """
+    for subject, box in boxes.items():
+        span = find_environment(latex_content, SUBJECT_ENVIRONMENTS[subject])
+        if span is None:
+            return None
+        latex_content = latex_content[:span[0]] + box + latex_content[span[1]:]
+
+    found = find_command(latex_content, 'homeworkrecord', len(SUBJECTS))
+    if found is None:
+        return None
+    start, stop, args = found
+    args = [homework.get(subject, arg) for subject, arg in zip(SUBJECTS, args)]
+    return latex_content[:start] + "\\homeworkrecord" + ''.join(f"{{{arg}}}" for arg in args) + latex_content[stop:]
+
+
+class SectionSnapshots:
+    """保存每个日期最近一次生成时的输入和LaTeX，用于按学科增量更新
+
+    同时保存生成设置的哈希（提示词前缀即规则、样式和示例，以及模型参数），设置变化后的快照不再沿用。
+    """
+
+    def __init__(self, directory):
+        self.directory = directory
+
+    def path(self, date_key):
+        return os.path.join(self.directory, f"{date_key}.json")
+
+    def load(self, date_key):
+        try:
+            with open(self.path(date_key), 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def save(self, date_key, input_text, latex_content, generation_key=None):
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            temp_path = self.path(date_key) + '.tmp'
+            with open(temp_path, 'w', encoding='utf-8') as f:
+                json.dump({'input': input_text, 'latex': latex_content, 'generation': generation_key},
+                          f, ensure_ascii=False)
+            os.replace(temp_path, self.path(date_key))
+        except OSError as e:
+            print(f"保存生成快照时出错: {e}")
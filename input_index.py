@@ -0,0 +1,145 @@
+import calendar
+import fnmatch
+import os
+import re
+
+# 日期输入文件名：YYYYMMDD.txt（月、日范围在正则中校验，月末天数另行检查）
+_DATE_FILE_PATTERN = re.compile(r'^((?:19|20)\d{2})(0[1-9]|1[0-2])(0[1-9]|[12]\d|3[01])\.txt$')
+# 按年份归档的目录，如 "2025" 或 "2025年"，日期范围之外时整个跳过
+_YEAR_DIR_PATTERN = re.compile(r'^((?:19|20)\d{2})年?$')
+
+
+def parse_date_filename(filename):
+    """文件名为有效的 YYYYMMDD.txt 时返回日期键 YYYYMMDD，否则返回None"""
+    match = _DATE_FILE_PATTERN.match(filename)
+    if not match:
+        return None
+    year, month, day = (int(part) for part in match.groups())
+    if day > calendar.monthrange(year, month)[1]:
+        return None
+    return filename[:8]
+
+
+def check_date_key(value):
+    """校验命令行中的日期参数（YYYYMMDD），无效时抛出ValueError"""
+    if parse_date_filename(f"{value}.txt") is None:
+        raise ValueError(f"日期格式应为YYYYMMDD: {value}")
+    return value
+
+
+class InputIndex:
+    """输入目录的日期文件索引
+
+    用 os.scandir 递归遍历输入目录，每个目录的列表按目录mtime缓存：目录中没有新增、删除或
+    重命名时只需一次 stat。排除目录（文件移动的目标目录、输出目录等）不会被遍历。
+
+    同一日期在多个子目录中都有输入文件时只返回一个（层级最浅的，同层按路径排序），其余的报告后跳过：
+    输出文件和处理清单都按日期区分，同时处理会互相覆盖。
+    """
+
+    def __init__(self, input_dir, file_pattern='*.txt', recursive=True, exclude_dirs=()):
+        self.input_dir = os.path.abspath(input_dir)
+        self.file_pattern = file_pattern
+        self.recursive = recursive
+        self.exclude_dirs = {os.path.abspath(path) for path in exclude_dirs if path}
+        # 目录路径 -> (mtime_ns, [(日期, 文件路径)], [子目录路径])
+        self._listings = {}
+
+        # 最近一次扫描的统计
+        self.dirs_listed = 0
+        self.dirs_cached = 0
+        # 已报告过的重复日期：日期 -> 该日期的全部文件路径（内容变化时再次报告）
+        self._reported_duplicates = {}
+
+    def _list(self, dir_path):
+        """返回目录中的日期文件和子目录，目录mtime未变化时使用缓存"""
+        try:
+            mtime_ns = os.stat(dir_path).st_mtime_ns
+        except OSError:
+            self._listings.pop(dir_path, None)
+            return [], []
+
+        cached = self._listings.get(dir_path)
+        if cached and cached[0] == mtime_ns:
+            self.dirs_cached += 1
+            return cached[1], cached[2]
+
+        files = []
+        subdirs = []
+        try:
+            with os.scandir(dir_path) as entries:
+                for entry in entries:
+                    if entry.name.startswith('.'):
+                        continue
+                    if entry.is_dir(follow_symlinks=False):
+                        if self.recursive and entry.path not in self.exclude_dirs:
+                            subdirs.append(entry.path)
+                    elif fnmatch.fnmatch(entry.name, self.file_pattern):
+                        date_key = parse_date_filename(entry.name)
+                        if date_key:
+                            files.append((date_key, entry.path))
+        except OSError as e:
+            print(f"读取目录时出错: {dir_path}: {e}")
+            return [], []
+
+        self.dirs_listed += 1
+        self._listings[dir_path] = (mtime_ns, files, subdirs)
+        return files, subdirs
+
+    def find(self, date_from=None, date_to=None):
+        """查找日期在 [date_from, date_to] 范围内的输入文件，按日期排序返回路径列表"""
+        self.dirs_listed = 0
+        self.dirs_cached = 0
+        found = []
+        stack = [self.input_dir]
+        while stack:
+            files, subdirs = self._list(stack.pop())
+            found.extend((date_key, path) for date_key, path in files
+                         if (not date_from or date_key >= date_from) and (not date_to or date_key <= date_to))
+            for subdir in subdirs:
+                year = _YEAR_DIR_PATTERN.match(os.path.basename(subdir))
+                if year and ((date_from and year.group(1) < date_from[:4]) or
+                             (date_to and year.group(1) > date_to[:4])):
+                    continue
+                stack.append(subdir)
+        return self._select_unique(found)
+
+    def _rank(self, path):
+        """同一日期有多个文件时的选择顺序：层级浅的优先，其次按路径"""
+        return os.path.relpath(path, self.input_dir).count(os.sep), path
+
+    def _select_unique(self, found):
+        """每个日期只保留一个文件，报告被跳过的重复文件，按日期排序返回路径列表"""
+        by_date = {}
+        for date_key, path in found:
+            by_date.setdefault(date_key, []).append(path)
+
+        selected = []
+        for date_key in sorted(by_date):
+            paths = sorted(by_date[date_key], key=self._rank)
+            selected.append(paths[0])
+            if len(paths) > 1 and self._reported_duplicates.get(date_key) != paths:
+                self._reported_duplicates[date_key] = paths
+                print(f"警告: 日期 {date_key} 有 {len(paths)} 个输入文件，只处理 {paths[0]}，"
+                      f"跳过: {', '.join(paths[1:])}")
+        return selected
+
+    def accepts(self, file_path, date_from=None, date_to=None):
+        """判断单个文件是否属于索引范围（用于文件系统事件过滤）"""
+        date_key = parse_date_filename(os.path.basename(file_path))
+        if not date_key or (date_from and date_key < date_from) or (date_to and date_key > date_to):
+            return False
+        if not fnmatch.fnmatch(os.path.basename(file_path), self.file_pattern):
+            return False
+        dir_path = os.path.dirname(os.path.abspath(file_path))
+        if not self.recursive:
+            return dir_path == self.input_dir
+        while dir_path.startswith(self.input_dir):
+            if dir_path in self.exclude_dirs:
+                return False
+            if dir_path == self.input_dir:
+                # 同一日期的其他文件优先时跳过（目录列表已缓存，只需少量 stat）
+                selected = self.find(date_key, date_key)
+                return not selected or selected[0] == os.path.abspath(file_path)
+            dir_path = os.path.dirname(dir_path)
+        return False
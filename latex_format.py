@@ -0,0 +1,147 @@
+import os
+import re
+import subprocess
+import threading
+
+from cache_store import hash_text
+
+_REQUIRE_PACKAGE_PATTERN = re.compile(r'\\RequirePackage(\[[^\]]*\])?\{([^}]+)\}')
+# 加载或设置系统字体的宏包：XeTeX 无法 \dump 含原生字体的格式，这些宏包在格式之后加载
+FONT_PACKAGES = {'ctex', 'fontspec', 'xeCJK', 'xunicode', 'xltxtra', 'unicode-math', 'realscripts'}
+# mylatexformat 的转储结束标记：格式只包含此前的内容，使用格式编译时跳过文档中此前的部分
+END_OF_DUMP = '\\csname endofdump\\endcsname'
+
+
+class PreambleFormat:
+    """xydailystudy 标准导言区的预编译格式（mylatexformat）
+
+    格式中只转储 \\documentclass 和样式文件加载的不涉及字体的宏包（geometry、tikz、xcolor 等）；
+    样式文件本身要用 ctex/fontspec 设置系统字体，XeTeX 无法转储原生字体，因此在格式之后照常加载。
+    使用格式编译时在 \\documentclass 之后插入 \\csname endofdump\\endcsname 生成编译用的副本。
+    样式文件内容变化时格式文件名随哈希变化，自动重新生成；生成失败时记录标记，不再重复尝试。
+    """
+
+    def __init__(self, resources, latex_config, format_dir):
+        self.resources = resources
+        self.latex_config = latex_config
+        self.format_dir = format_dir
+        self.style_file = latex_config['style_file']
+        self.enabled = latex_config.get('precompiled_format', True)
+        self._lock = threading.Lock()
+
+    def standard_preamble(self):
+        """与示例文件一致的标准导言区"""
+        package = os.path.splitext(self.style_file)[0]
+        return (f"\\documentclass[a4paper, {self.latex_config['font_size']}]"
+                f"{{{self.latex_config['document_class']}}}\n"
+                f"\\usepackage{{{package}}}\n")
+
+    def dump_preamble(self):
+        """转储到格式中的导言区：文档类 + 样式文件中不涉及字体的宏包，以转储结束标记结尾"""
+        style_content = self.resources.get(self.style_file) or ''
+        packages = [f"\\usepackage{options or ''}{{{name.strip()}}}"
+                    for options, names in _REQUIRE_PACKAGE_PATTERN.findall(style_content)
+                    for name in names.split(',') if name.strip() and name.strip() not in FONT_PACKAGES]
+        document_class = self.standard_preamble().splitlines()[0]
+        return "\n".join([document_class] + packages + [END_OF_DUMP, ""])
+
+    def format_source(self, latex_content):
+        """使用格式编译时的源文件：\\documentclass 之后插入转储结束标记，
+        格式中已有的文档类被跳过，样式文件（字体设置）照常加载"""
+        match = re.search(r'\\documentclass(\[[^\]]*\])?\{[^}]*\}[^\n]*\n', latex_content)
+        if match is None:
+            return None
+        return latex_content[:match.end()] + END_OF_DUMP + "\n" + latex_content[match.end():]
+
+    @staticmethod
+    def normalize_preamble(text):
+        """去掉注释和空白后的导言区，用于比较"""
+        text = re.sub(r'(?<!\\)%.*', '', text)
+        return re.sub(r'\s+', '', text)
+
+    def matches(self, latex_content):
+        """判断文档导言区是否与标准导言区一致"""
+        index = latex_content.find('\\begin{document}')
+        if index < 0:
+            return False
+        return self.normalize_preamble(latex_content[:index]) == \
+            self.normalize_preamble(self.standard_preamble())
+
+    def format_name(self):
+        """格式文件名（不含扩展名），随样式文件和导言区内容变化"""
+        style_hash = self.resources.get_hash(self.style_file)
+        if not style_hash:
+            return None
+        digest = hash_text(style_hash, self.dump_preamble())[:12]
+        return f"{os.path.splitext(self.style_file)[0]}-{digest}"
+
+    def ensure_format(self):
+        """返回可用格式文件的路径（不含.fmt扩展名），不可用时返回None"""
+        if not self.enabled:
+            return None
+        name = self.format_name()
+        if not name:
+            return None
+
+        format_base = os.path.abspath(os.path.join(self.format_dir, name))
+        if os.path.exists(format_base + '.fmt'):
+            return format_base
+        if os.path.exists(format_base + '.failed'):
+            return None
+
+        with self._lock:
+            if os.path.exists(format_base + '.fmt'):
+                return format_base
+            return format_base if self.build_format(name) else None
+
+    def build_format(self, name):
+        """用 xelatex -ini 生成格式文件"""
+        os.makedirs(self.format_dir, exist_ok=True)
+        format_dir = os.path.abspath(self.format_dir)
+        # 以进程号区分临时作业名，避免多个编译进程同时生成时互相覆盖
+        job_name = f"{name}-{os.getpid()}"
+        preamble_path = os.path.join(format_dir, f"{job_name}.tex")
+        with open(preamble_path, 'w', encoding='utf-8') as f:
+            f.write(self.dump_preamble())
+
+        # 样式文件从资源目录读取
+        env = dict(os.environ)
+        env['TEXINPUTS'] = os.pathsep.join([os.path.abspath(self.resources.resource_path), env.get('TEXINPUTS', '')])
+
+        command = [
+            'xelatex', '-ini', '-interaction=nonstopmode',
+            f'-jobname={job_name}',
+            '&xelatex', 'mylatexformat.ltx', preamble_path
+        ]
+        print(f"正在生成预编译格式: {name}.fmt")
+        try:
+            result = subprocess.run(command, capture_output=True, text=True, cwd=format_dir, env=env)
+        except FileNotFoundError:
+            print("错误: 未找到xelatex命令，请确保LaTeX环境已安装")
+            return False
+
+        built_path = os.path.join(format_dir, f"{job_name}.fmt")
+        if result.returncode == 0 and os.path.exists(built_path):
+            os.replace(built_path, os.path.join(format_dir, f"{name}.fmt"))
+            self._clean(format_dir, job_name)
+            print(f"预编译格式已生成: {name}.fmt")
+            return True
+
+        print(f"预编译格式生成失败（返回码 {result.returncode}），改用普通编译")
+        self.mark_failed(name)
+        return False
+
+    def mark_failed(self, name=None):
+        """记录当前格式不可用，样式文件变化前不再尝试"""
+        name = name or self.format_name()
+        if not name:
+            return
+        os.makedirs(self.format_dir, exist_ok=True)
+        with open(os.path.join(self.format_dir, f"{name}.failed"), 'w', encoding='utf-8') as f:
+            f.write("xelatex -ini 或使用该格式编译失败，详见同目录下的日志\n")
+
+    def _clean(self, format_dir, job_name):
+        for ext in ('.tex', '.log', '.aux'):
+            path = os.path.join(format_dir, job_name + ext)
+            if os.path.exists(path):
+                os.remove(path)
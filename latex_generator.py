@@ -2,13 +2,33 @@ import os
 import re
 import schedule
 import time
-import requests
 from datetime import datetime
 from pathlib import Path
-import glob
 import subprocess
+import threading
+import contextvars
+from concurrent.futures import ThreadPoolExecutor
 
 from config_manager import ConfigManager
+from api_client import DeepSeekClient, StreamAborted
+from cache_store import ResponseCache, CompileCache, hash_text
+from resource_manager import ResourceManager
+from manifest import ProcessingManifest
+from prompt_builder import PromptBuilder
+from latex_format import PreambleFormat
+from local_renderer import LocalRenderer
+from latex_validator import LatexValidator
+from html_preview import HtmlPreviewRenderer
+from text_normalizer import InputNormalizer, format_report
+from metrics import MetricsRecorder, load_metrics, print_stats_report
+from api_scheduler import ApiScheduler, estimate_prompt_tokens, is_rate_limit_error
+from hedging import RequestHedger
+from pipeline import BatchPipeline
+from monthly import MonthlyCompendium
+from input_index import InputIndex, parse_date_filename, check_date_key
+from incremental import SectionSnapshots, diff_sections, find_command, find_environment, splice_sections
+from local_renderer import SUBJECT_ENVIRONMENTS, SUBJECTS, is_preamble_line, split_subjects
+from file_watcher import InputWatcher
 
 class LatexGenerator:
     def __init__(self, config_file="config.yaml"):
@@ -19,47 +39,158 @@ class LatexGenerator:
         # API设置
         self.api_key = os.getenv('DEEPSEEK_API_KEY')
         self.api_config = self.config_manager.get_api_config()
+        self.api_client = DeepSeekClient(self.api_config, self.api_key)
         
         # 文件路径设置
         self.paths_config = self.config_manager.get_paths_config()
         self.resource_path = self.paths_config['resource']
         self.input_dir = self.paths_config['input_dir']
         self.output_dir = self.paths_config['output_dir']
+        self.resources = ResourceManager(self.resource_path)
+        # 编译完成后文件移动到的目标主目录
+        self.target_dir = os.path.expanduser(
+            self.paths_config.get('target_dir', '/home/song/NutstoreFiles/6-XY/2025年8月幼小衔接'))
+        # 处理清单等运行状态保存目录
+        self.state_dir = os.path.expanduser(self.paths_config.get('state_dir', 'state'))
+        self.manifest = ProcessingManifest(os.path.join(self.state_dir, 'manifest.sqlite3'))
         
         # 监控设置
         self.monitor_config = self.config_manager.get_monitor_config()
         self.check_interval_minutes = self.monitor_config['check_interval_minutes']
         
+        # 任务队列设置：自动重试（监控模式）的失败次数上限
+        self.queue_config = self.config_manager.get_queue_config()
+        self.max_retries = self.queue_config.get('max_retries', 3)
+        
         # 文件模式设置
         self.file_patterns_config = self.config_manager.get_file_patterns_config()
+        # 只处理该日期范围内的输入文件（YYYYMMDD，含两端；None表示不限）
+        self.date_from = None
+        self.date_to = None
         
         # LaTeX设置
         self.latex_config = self.config_manager.get_latex_config()
+        self.example_file = self.latex_config.get('example_file', '20250924.tex')
+        # xelatex 超过该时间未结束时终止（秒，0 表示不限制）
+        self.compile_timeout = self.latex_config.get('compile_timeout_seconds', 300)
+        
+        # 输入整理：引号配对、标点和空白规范化，发送给API的输入转义LaTeX特殊字符
+        self.normalize_config = self.config_manager.get_normalize_config()
+        self.input_normalizer = InputNormalizer(self.normalize_config)
+        
+        # 提示词设置
+        self.prompt_config = self.config_manager.get_prompt_config()
+        self.prompt_builder = PromptBuilder(self.latex_config, self.prompt_config, self.input_normalizer)
+        # 预渲染的提示词前缀，按(样式哈希, 示例哈希, 样式模式)缓存
+        self._prompt_prefixes = {}
+        
+        # 本地渲染快速路径（结构规整的笔记不调用API）
+        self.local_render_config = self.config_manager.get_local_render_config()
+        self.local_render_enabled = self.local_render_config.get('enabled', True)
+        self.local_renderer = LocalRenderer(self.latex_config)
+        self._stats_lock = threading.Lock()
+        self.local_render_hits = 0
+        self.local_render_attempts = 0
+        
+        # 按学科增量更新：保存每个日期上次的输入和LaTeX，只重新生成有修改的学科框
+        self.incremental_config = self.config_manager.get_incremental_config()
+        self.incremental_enabled = self.incremental_config.get('enabled', True)
+        self.section_snapshots = SectionSnapshots(os.path.join(self.state_dir, 'snapshots'))
+        
+        # 按学科分块生成：较长的多学科笔记各学科框并行生成，再拼接成一篇文档
+        self.chunking_config = self.config_manager.get_chunking_config()
+        self.chunking_enabled = self.chunking_config.get('enabled', True)
+        
+        # 编译前静态检查与修复
+        self.validator_config = self.config_manager.get_validator_config()
+        self.validator_enabled = self.validator_config.get('enabled', True)
+        # 检查器依赖样式文件中定义的命令，按样式哈希缓存
+        self._validators = {}
+        
+        # HTML预览：保存LaTeX时同时生成可直接在浏览器中打开的HTML，不依赖xelatex
+        self.preview_config = self.config_manager.get_preview_config()
+        self.preview_enabled = self.preview_config.get('enabled', True)
+        # 预览渲染器从样式文件读取颜色和标题，按样式哈希缓存
+        self._preview_renderers = {}
+        # 只生成LaTeX和预览、推迟编译（--no-compile），之后的批量运行从编译阶段继续
+        self.defer_compile = False
+        
+        # 流水线并发设置
+        self.pipeline_config = self.config_manager.get_pipeline_config()
+        self.api_jobs = self.pipeline_config.get('api_jobs', 1)
+        self.compile_jobs = self.pipeline_config.get('compile_jobs', 1)
+        
+        # API调度：优先级队列、每分钟请求数/token预算和自适应并发
+        self.scheduler_config = self.config_manager.get_scheduler_config()
+        self.api_scheduler = ApiScheduler(self.scheduler_config, self.api_jobs, self.api_config['max_tokens'])
+        self.api_client.on_rate_limited = self.api_scheduler.report_rate_limit
+        
+        # 对冲请求：超过最近延迟分位数仍未返回时再发一个相同请求，先完成的胜出
+        self.hedging_config = self.config_manager.get_hedging_config()
+        self.api_hedger = RequestHedger(self.hedging_config, self.api_client.timeout[1])
+        
+        # 缓存设置
+        self.cache_config = self.config_manager.get_cache_config()
+        self.cache_dir = os.path.expanduser(self.cache_config.get('dir', 'cache'))
+        self.response_cache = ResponseCache(
+            os.path.join(self.cache_dir, 'responses'),
+            max_size_mb=self.cache_config.get('max_size_mb', 200),
+            max_age_days=self.cache_config.get('max_age_days', 90)
+        )
+        # 编译结果缓存（源文件未变化时跳过xelatex）
+        self.compile_cache = CompileCache(
+            os.path.join(self.cache_dir, 'compiled'),
+            max_size_mb=self.cache_config.get('max_size_mb', 200),
+            max_age_days=self.cache_config.get('max_age_days', 90)
+        )
+        self.compile_cache_enabled = self.cache_config.get('enabled', True) and \
+            self.cache_config.get('compile', True)
+        # 最近一次编译的信息（是否命中缓存、耗时）
+        self.last_compile_info = None
+        # 标准导言区的预编译格式
+        self.latex_format = PreambleFormat(self.resources, self.latex_config,
+                                           os.path.join(self.cache_dir, 'fmt'))
+        # 是否读取/写入缓存（--no-cache 两者都关闭，--refresh 只写不读）
+        self.cache_read = self.cache_config.get('enabled', True)
+        self.cache_write = self.cache_config.get('enabled', True)
+        
+        # 每个文件各阶段耗时和token用量的指标记录（JSON行）
+        self.metrics_config = self.config_manager.get_metrics_config()
+        self.metrics = MetricsRecorder(
+            os.path.expanduser(self.metrics_config.get('file') or os.path.join(self.state_dir, 'metrics.jsonl')),
+            enabled=self.metrics_config.get('enabled', True)
+        )
+        
+        # 常驻进程设置
+        self.daemon_config = self.config_manager.get_daemon_config()
+        
+        # 输入文件索引（递归扫描，目录列表按mtime缓存）
+        self.input_index = InputIndex(
+            self.input_dir,
+            file_pattern=self.file_patterns_config.get('input', '*.txt'),
+            recursive=self.file_patterns_config.get('recursive', True),
+            exclude_dirs=self.get_index_exclude_dirs()
+        )
+    
+    def get_index_exclude_dirs(self):
+        """递归扫描时跳过的目录：文件移动的目标目录、输出、缓存和状态目录"""
+        exclude_dirs = [os.path.dirname(path) for path in self.get_target_paths('00000000.txt').values()]
+        exclude_dirs.append(os.path.join(self.target_dir, "4-月度汇总"))
+        exclude_dirs.extend([self.output_dir, self.cache_dir, self.state_dir])
+        exclude_dirs.extend(os.path.join(self.input_dir, os.path.expanduser(path))
+                            for path in self.file_patterns_config.get('exclude_dirs') or [])
+        return exclude_dirs
     
-    def find_input_files(self):
-        """查找所有符合日期规则的文件"""
-        # 匹配格式: YYYYMMDD.txt (如20250924.txt)
-        pattern = os.path.join(self.input_dir, self.file_patterns_config['input'])
-        all_files = glob.glob(pattern)
-        
-        # 过滤出符合日期格式的文件
-        date_files = []
-        date_pattern = re.compile(r'(\d{8})\.txt$')  # 匹配8位数字.txt
-        
-        for file_path in all_files:
-            filename = os.path.basename(file_path)
-            match = date_pattern.search(filename)
-            if match:
-                date_str = match.group(1)
-                # 验证日期是否有效
-                try:
-                    datetime.strptime(date_str, "%Y%m%d")
-                    date_files.append(file_path)
-                except ValueError:
-                    continue
+    def find_input_files(self, date_from=None, date_to=None):
+        """查找所有符合日期规则的文件（包括子目录），可按日期范围过滤"""
+        date_files = self.input_index.find(date_from or self.date_from, date_to or self.date_to)
         
         print(f"找到 {len(date_files)} 个符合日期规则的文件")
-        return sorted(date_files)  # 按文件名排序
+        return date_files  # 按日期排序
+    
+    def is_date_input_file(self, file_path):
+        """判断文件名是否符合日期规则（YYYYMMDD.txt 且日期有效）"""
+        return parse_date_filename(os.path.basename(file_path)) is not None
     
     def read_input_file(self, file_path):
         """读取输入文本文件"""
@@ -74,17 +205,8 @@ class LatexGenerator:
             return None
     
     def read_resource_file(self, filename):
-        """读取资源文件"""
-        file_path = os.path.join(self.resource_path, filename)
-        try:
-            with open(file_path, 'r', encoding='utf-8') as f:
-                return f.read()
-        except FileNotFoundError:
-            print(f"资源文件未找到: {file_path}")
-            return None
-        except Exception as e:
-            print(f"读取资源文件时出错: {e}")
-            return None
+        """读取资源文件（进程内缓存，文件修改后自动重新加载）"""
+        return self.resources.get(filename)
     
     def extract_date_from_filename(self, filename):
         """从文件名中提取日期并格式化为中文"""
@@ -98,23 +220,14 @@ class LatexGenerator:
             return f"{year}年{month}月{day}日"
         return None
     
-    def call_deepseek_api(self, prompt):
-        """调用DeepSeek API"""
-        if not self.api_key:
-            print("错误: 未设置DEEPSEEK_API_KEY环境变量")
-            return None
-        
-        headers = {
-            "Content-Type": "application/json",
-            "Authorization": f"Bearer {self.api_key}"
-        }
-        
-        data = {
+    def build_api_request(self, prompt):
+        """构建API请求数据"""
+        return {
             "model": self.api_config['model'],
             "messages": [
                 {
                     "role": "system",
-                    "content": "你是一个专业的LaTeX文档生成助手，擅长将学习反馈内容转换为结构化的LaTeX文档。请确保生成的LaTeX代码可以直接编译。"
+                    "content": PromptBuilder.SYSTEM_MESSAGE
                 },
                 {
                     "role": "user", 
@@ -124,17 +237,138 @@ class LatexGenerator:
             "temperature": self.api_config['temperature'],
             "max_tokens": self.api_config['max_tokens']
         }
+    
+    def call_deepseek_api(self, prompt, full_document=True, extra=False):
+        """调用DeepSeek API（full_document 为False时表示只请求文档片段，流式模式下不检查\\documentclass）
+        
+        extra 为True时表示同一文件的附加请求（分块生成中的其余学科），不受调度器的并发上限限制。
+        """
+        if not self.api_key:
+            print("错误: 未设置DEEPSEEK_API_KEY环境变量")
+            return None
+        
+        data = self.build_api_request(prompt)
+        
+        if self.api_config.get('stream', False):
+            return self.call_deepseek_api_stream(data, self.validate_stream_prefix if full_document else None,
+                                                 full_document, extra)
         
         try:
             print("正在调用DeepSeek API...")
-            response = requests.post(self.api_config['url'], headers=headers, json=data, timeout=60)
-            response.raise_for_status()
-            result = response.json()
+            with self.metrics.stage('api'):
+                result, hedge = self.api_hedger.run(
+                    lambda cancel, on_first_token, hedge: self.send_scheduled(
+                        prompt, lambda: self.api_client.post(data, cancel),
+                        lambda result: result.get('usage'), hedge or extra),
+                    self.get_request_kind(full_document), estimate_prompt_tokens(prompt),
+                    accept=lambda result: self.is_complete_response(self.get_response_content(result),
+                                                                    full_document))
+            self.record_usage(result.get('usage'))
+            self.metrics.add_hedge(hedge)
             return result['choices'][0]['message']['content']
         except Exception as e:
             print(f"API调用失败: {e}")
             return None
     
+    def record_usage(self, usage):
+        """输出本次调用的提示词token数和命中前缀缓存的token数，并计入当前文件的指标"""
+        self.metrics.add_usage(usage)
+        prompt_tokens = (usage or {}).get('prompt_tokens')
+        if prompt_tokens is None:
+            return
+        cached = usage.get('prompt_cache_hit_tokens')
+        if cached is None:
+            # OpenAI 兼容格式
+            cached = (usage.get('prompt_tokens_details') or {}).get('cached_tokens')
+        message = f"提示词: {prompt_tokens} tokens"
+        if cached is not None:
+            message += f"，命中前缀缓存 {cached} tokens"
+            if prompt_tokens:
+                message += f" ({cached / prompt_tokens:.0%})"
+        print(message)
+    
+    def get_api_priority(self):
+        """API调度优先级：当前处理的日期越新越优先"""
+        record = self.metrics.current()
+        date_key = record['date'] if record else ''
+        return int(date_key) if date_key.isdigit() else 0
+    
+    def get_request_kind(self, full_document=True):
+        """对冲请求按请求类型分别统计延迟"""
+        return 'document' if full_document else 'section'
+    
+    def get_response_content(self, result):
+        """非流式响应中的文本，格式不符时返回None"""
+        try:
+            return result['choices'][0]['message']['content']
+        except (KeyError, IndexError, TypeError):
+            return None
+    
+    def is_complete_response(self, content, full_document=True):
+        """对冲请求中响应能否采用：整篇文档需包含\\end{document}，文档片段需包含完整的环境"""
+        if not content:
+            return False
+        return '\\end{document}' in content if full_document else '\\end{' in content
+    
+    def send_scheduled(self, prompt, send, get_usage, extra=False):
+        """经API调度器发送请求：按优先级排队，受预算和并发上限限制（附加请求不受并发上限限制）；
+        重试后仍返回429时重新排队"""
+        attempt = 0
+        while True:
+            try:
+                with self.api_scheduler.slot(prompt, self.get_api_priority(), extra) as slot:
+                    result = send()
+                    slot['usage'] = get_usage(result)
+                return result
+            except Exception as e:
+                if not (self.api_scheduler.enabled and is_rate_limit_error(e)
+                        and attempt < self.api_scheduler.rate_limit_retries):
+                    raise
+                attempt += 1
+                print(f"API仍返回429，重新排队 ({attempt}/{self.api_scheduler.rate_limit_retries})")
+    
+    def call_deepseek_api_stream(self, data, validator=None, full_document=True, extra=False):
+        """以流式方式调用DeepSeek API，输出明显无效时提前中止并重试"""
+        attempts = 1 + self.api_config.get('stream_bad_output_retries', 1)
+        for attempt in range(1, attempts + 1):
+            try:
+                print("正在调用DeepSeek API（流式）...")
+                prompt = data['messages'][-1]['content']
+                with self.metrics.stage('api'):
+                    (content, stats), hedge = self.api_hedger.run(
+                        lambda cancel, on_first_token, hedge: self.send_scheduled(
+                            prompt, lambda: self.api_client.post_stream(data, validator, cancel, on_first_token),
+                            lambda result: result[1]['usage'] or {'completion_tokens': result[1]['completion_tokens']},
+                            hedge or extra),
+                        self.get_request_kind(full_document), estimate_prompt_tokens(prompt),
+                        accept=lambda result: self.is_complete_response(result[0], full_document),
+                        streaming=True)
+                self.record_usage(stats['usage'] or {'completion_tokens': stats['completion_tokens']})
+                self.metrics.add_hedge(hedge)
+                self.metrics.set(time_to_first_token=stats['time_to_first_token'])
+                message = f"流式响应完成: 共 {stats['completion_tokens']} tokens"
+                if stats['time_to_first_token'] is not None:
+                    message += f"，首个token {stats['time_to_first_token']:.2f} 秒"
+                if stats['tokens_per_second'] is not None:
+                    message += f"，{stats['tokens_per_second']:.1f} tokens/s"
+                print(message)
+                return content
+            except StreamAborted as e:
+                print(f"输出无效，提前中止 ({attempt}/{attempts}): {e}")
+            except Exception as e:
+                print(f"API调用失败: {e}")
+                return None
+        return None
+    
+    def validate_stream_prefix(self, content):
+        """流式输出的早期检查：开头若干字符内必须出现\\documentclass"""
+        if '\\documentclass' in content:
+            return True
+        check_chars = self.api_config.get('stream_check_chars', 300)
+        if len(content.strip()) >= check_chars:
+            return f"前 {check_chars} 个字符内未出现\\documentclass"
+        return None
+    
     def extract_latex_content(self, text):
         """从API响应中提取LaTeX内容"""
         # 尝试提取```latex ... ```之间的内容
@@ -146,7 +380,7 @@ class LatexGenerator:
             return matches[0]
         
         # 如果没有代码块标记，尝试提取\begin{document} ... \end{document}之间的内容
-        doc_pattern = r'\begin\{document\}.*?\end\{document\}'
+        doc_pattern = r'(?:\\documentclass.*?)?\\begin\{document\}.*?\\end\{document\}'
         matches = re.findall(doc_pattern, text, re.DOTALL)
         
         if matches:
@@ -158,87 +392,220 @@ class LatexGenerator:
         return text
     
     def generate_latex_prompt(self, input_text, style_content, example_content, date_str):
-        """生成API提示词"""
-        prompt = f"""
-请基于以下输入内容生成一个完整的LaTeX文档：
-
-输入内容：
-{input_text}
-
-样式文件内容 ({self.latex_config['style_file']})：
-{style_content}
-
-示例文件内容 (20250924.tex)：
-{example_content}
-
-要求：
-0. 首先对输入内容整理，确保通顺、没有错别字，并注意区分汉字和英文引号格式，并确保是引号一对，而不是””(全部左引号) 或““（全部右引号）
-1. 根据整理后的内容生成完整的LaTeX文档，使用{self.latex_config['document_class']}文档类
-2. 使用提供的样式文件格式和命令
-3. 将"今日小任务"等课后作业要求内容复制一份，放到作业记录部分
-4. 保持与示例相同的结构和格式
-5. 日期格式使用"{date_str}"
-6. 只显示有内容的作业项目，使用\\homeworkrecord命令
-7. 确保生成的LaTeX代码可以直接编译，不要包含任何解释文本
-8. 记得在\\begin{{mathbox}}等下一行段首加上\\par,确保首行缩进。
-
-请直接输出完整的LaTeX代码，包含\\documentclass和\\begin{{document}}...\\end{{document}}。
-"""
-        return prompt
+        """生成API提示词：稳定的前缀（规则、样式、示例）在前，当天的日期和输入在后"""
+        prefix = self.prompt_builder.render_prefix(style_content, example_content, self.example_file)
+        return self.prompt_builder.build(prefix, input_text, date_str)
+    
+    def get_prompt_prefix(self):
+        """预渲染的提示词前缀（规则、样式、示例），资源文件未变化时不重复渲染，无法读取时返回None"""
+        style_file = self.latex_config['style_file']
+        key = (self.resources.get_hash(style_file), self.resources.get_hash(self.example_file),
+               self.prompt_builder.style_mode)
+        if None in key:
+            return None
+        
+        prefix = self._prompt_prefixes.get(key)
+        if prefix is None:
+            prefix = self.prompt_builder.render_prefix(self.resources.get(style_file),
+                                                       self.resources.get(self.example_file),
+                                                       self.example_file)
+            self._prompt_prefixes = {key: prefix}
+        return prefix
+    
+    def build_prompt(self, input_text, date_str):
+        """使用预渲染的前缀生成提示词"""
+        prefix = self.get_prompt_prefix()
+        if prefix is None:
+            return None
+        return self.prompt_builder.build(prefix, input_text, date_str)
+    
+    def get_generation_key(self):
+        """生成设置的哈希：提示词前缀（规则、样式、示例）和模型参数，变化时增量快照不再沿用"""
+        prefix = self.get_prompt_prefix()
+        if prefix is None:
+            return None
+        return hash_text(PromptBuilder.SYSTEM_MESSAGE, prefix, self.api_config['model'],
+                         str(self.api_config['temperature']), str(self.api_config['max_tokens']))
+    
+    # 影响编译结果的编译设置，参与编译缓存键的计算
+    COMPILER_SETTINGS = "xelatex -interaction=nonstopmode"
+    
+    def get_compile_format(self, latex_content):
+        """文档导言区为标准导言区时返回预编译格式路径，否则返回None"""
+        if not self.latex_format.matches(latex_content):
+            return None
+        return self.latex_format.ensure_format()
+    
+    def get_compile_key(self, latex_content):
+        """编译缓存键：LaTeX源文件 + 样式文件 + 编译设置"""
+        style_hash = self.resources.get_hash(self.latex_config['style_file'])
+        return self.compile_cache.make_key(latex_content, style_hash, self.COMPILER_SETTINGS)
+    
+    def build_xelatex_command(self, latex_file_path, output_dir, format_base=None):
+        """构建xelatex命令
+        
+        使用预编译格式时编译插入了转储结束标记的副本，-jobname 保持输出文件名不变。
+        """
+        command = ['xelatex', '-interaction=nonstopmode']
+        if format_base:
+            source_path = self.write_format_source(latex_file_path)
+            if source_path:
+                job_name = os.path.splitext(os.path.basename(latex_file_path))[0]
+                command += [f'-fmt={format_base}', f'-jobname={job_name}']
+                latex_file_path = source_path
+        command += ['-output-directory', output_dir, latex_file_path]
+        return command
+    
+    def get_format_source_path(self, latex_file_path):
+        """使用预编译格式编译时的源文件副本路径"""
+        return os.path.splitext(latex_file_path)[0] + '-fmt.tex'
+    
+    def write_format_source(self, latex_file_path):
+        """写入使用预编译格式编译的源文件副本，返回其路径，无法生成时返回None"""
+        with open(latex_file_path, 'r', encoding='utf-8') as f:
+            content = self.latex_format.format_source(f.read())
+        if content is None:
+            return None
+        source_path = self.get_format_source_path(latex_file_path)
+        with open(source_path, 'w', encoding='utf-8') as f:
+            f.write(content)
+        return source_path
+    
+    def run_xelatex(self, latex_file_path, output_dir, format_base=None):
+        """执行一次xelatex编译，返回 subprocess 结果"""
+        command = self.build_xelatex_command(latex_file_path, output_dir, format_base)
+        print(command)
+        
+        # 执行编译命令（超时后终止，避免xelatex卡住整个批次）
+        return subprocess.run(
+            command,
+            capture_output=True,
+            text=True,
+            cwd=output_dir,
+            timeout=self.compile_timeout or None
+        )
+    
+    def get_page_count(self, xelatex_output):
+        """从xelatex输出的 "Output written on ... (N pages)" 中读取页数"""
+        match = re.search(r'Output written on .*?\((\d+)\s+pages?', xelatex_output or '', re.DOTALL)
+        return int(match.group(1)) if match else None
+    
+    def get_compile_settings(self):
+        """当前生效的编译相关设置（含命令行覆盖），传给流水线的编译进程"""
+        return {
+            'cache_read': self.cache_read,
+            'cache_write': self.cache_write,
+            'compile_cache_enabled': self.compile_cache_enabled,
+            'precompiled_format': self.latex_format.enabled,
+            'compile_timeout': self.compile_timeout,
+        }
+    
+    def apply_compile_settings(self, settings):
+        """在编译进程中应用主进程的编译设置（编译进程只从配置文件创建生成器）"""
+        self.cache_read = settings['cache_read']
+        self.cache_write = settings['cache_write']
+        self.compile_cache_enabled = settings['compile_cache_enabled']
+        self.latex_format.enabled = settings['precompiled_format']
+        self.compile_timeout = settings['compile_timeout']
     
     def compile_latex_file(self, latex_file_path):
         """编译LaTeX文件为PDF"""
         try:
-            # 获取当前文件的绝对路径的上一级文件夹
-            absolute_dir = Path(__file__).resolve().parent
-            # 确保输出目录存在
-            output_dir = "/".join([str(absolute_dir),os.path.dirname(latex_file_path)])
-            latex_file_path = "/".join([str(absolute_dir),latex_file_path])
-
-            
-            # 构建xelatex命令
-            command = [
-                'xelatex',
-                '-interaction=nonstopmode',
-                '-output-directory', output_dir,
-                latex_file_path
-            ]
-            print(command)
+            job = self.start_compile(latex_file_path)
+            if job['info']:
+                return True
             
-            print(f"正在编译LaTeX文件: {os.path.basename(latex_file_path)}")
+            result = self.run_xelatex(job['path'], job['output_dir'], job['format_base'])
             
-            # 执行编译命令
-            result = subprocess.run(
-                command,
-                capture_output=True,
-                text=True,
-                cwd=output_dir
-            )
+            if result.returncode != 0 and job['format_base']:
+                print("使用预编译格式编译失败，改用普通编译")
+                result = self.run_xelatex(job['path'], job['output_dir'])
+                if result.returncode == 0:
+                    # 普通编译成功说明格式本身有问题
+                    self.latex_format.mark_failed()
             
-            if result.returncode == 0:
-                print(f"LaTeX编译成功")
-                
-                # 清理编译生成的临时文件
-                self.clean_latex_temp_files(latex_file_path)
-                return True
-            else:
-                print(f"LaTeX编译失败，返回码: {result.returncode}")
-                if result.stderr:
-                    print(f"错误输出: {result.stderr}")
-                return False
+            return self.finish_compile(job, result)
                 
         except FileNotFoundError:
             print("错误: 未找到xelatex命令，请确保LaTeX环境已安装")
             return False
+        except subprocess.TimeoutExpired:
+            print(f"xelatex 超过 {self.compile_timeout} 秒未结束，已终止")
+            return False
         except Exception as e:
             print(f"编译LaTeX文件时出错: {e}")
             return False
     
+    def start_compile(self, latex_file_path):
+        """读取源文件并查询编译缓存，返回编译任务信息
+        
+        缓存命中时 info 已填好（无需运行xelatex），否则 format_base 为可用的预编译格式。
+        """
+        # 相对路径以当前文件所在文件夹为基准
+        absolute_dir = Path(__file__).resolve().parent
+        latex_file_path = os.path.join(str(absolute_dir), latex_file_path)
+        
+        print(f"正在编译LaTeX文件: {os.path.basename(latex_file_path)}")
+        job = {
+            'path': latex_file_path,
+            'output_dir': os.path.dirname(latex_file_path),
+            'pdf_path': os.path.splitext(latex_file_path)[0] + '.pdf',
+            'start_time': time.monotonic(),
+            'format_base': None,
+            'info': None
+        }
+        
+        with open(latex_file_path, 'r', encoding='utf-8') as f:
+            latex_content = f.read()
+        
+        # 上次运行已编译成功、但在移动文件之前中断或移动失败时，直接使用输出目录中的PDF
+        if self.is_compiled_before(latex_file_path, latex_content):
+            job['info'] = self.last_compile_info = {'cache_hit': False, 'resumed': True, 'seconds': 0.0}
+            print("上次运行已完成编译，从移动文件阶段继续")
+            return job
+        
+        # 源文件、样式文件和编译设置都未变化时直接复用已编译的PDF
+        job['key'] = self.get_compile_key(latex_content) if self.compile_cache_enabled else None
+        if job['key'] and self.compile_cache.restore(job['key'], job['pdf_path']):
+            job['info'] = self.last_compile_info = {
+                'cache_hit': True, 'seconds': time.monotonic() - job['start_time']}
+            print(f"内容未变化，复用已编译的PDF（编译缓存命中 {job['key'][:12]}）")
+            return job
+        
+        # 标准导言区使用预编译格式，避免每次重新加载样式文件、宏包和字体
+        job['format_base'] = self.get_compile_format(latex_content)
+        return job
+    
+    def finish_compile(self, job, result):
+        """根据xelatex结果记录编译信息、写入编译缓存并清理临时文件，返回是否成功"""
+        elapsed = time.monotonic() - job['start_time']
+        job['info'] = self.last_compile_info = {
+            'cache_hit': False, 'seconds': elapsed,
+            'stored': bool(result.returncode == 0 and job['key']),
+            'pages': self.get_page_count(result.stdout)
+        }
+        print(f"编译耗时: {elapsed:.2f} 秒")
+        
+        if job['info']['stored']:
+            self.compile_cache.store(job['key'], job['pdf_path'])
+        
+        if result.returncode == 0:
+            print(f"LaTeX编译成功")
+            
+            # 清理编译生成的临时文件
+            self.clean_latex_temp_files(job['path'])
+            return True
+        else:
+            print(f"LaTeX编译失败，返回码: {result.returncode}")
+            if result.stderr:
+                print(f"错误输出: {result.stderr}")
+            return False
+    
     def clean_latex_temp_files(self, latex_file_path):
         """清理LaTeX编译生成的临时文件"""
         try:
             base_name = os.path.splitext(latex_file_path)[0]
-            temp_extensions = ['.aux', '.log', '.out', '.toc']
+            temp_extensions = ['.aux', '.log', '.out', '.toc', '-fmt.tex']
             
             for ext in temp_extensions:
                 temp_file = base_name + ext
@@ -248,40 +615,57 @@ class LatexGenerator:
         except Exception as e:
             print(f"清理临时文件时出错: {e}")
     
+    def is_compiled_before(self, latex_file_path, latex_content):
+        """处理清单显示该LaTeX已编译成功（尚未移动）且PDF仍在输出目录中"""
+        record = self.manifest.get(self.get_date_key(latex_file_path))
+        if not record or record['tex_hash'] != hash_text(latex_content):
+            return False
+        compiled = record['status'] == ProcessingManifest.STATUS_COMPILED or (
+            record['status'] == ProcessingManifest.STATUS_FAILED and
+            record['failed_stage'] == ProcessingManifest.STAGE_MOVE)
+        return compiled and os.path.exists(os.path.splitext(latex_file_path)[0] + '.pdf')
+    
+    def get_target_paths(self, input_file_path):
+        """获取PDF、TEX、TXT文件移动后的目标路径"""
+        filename_base = os.path.basename(input_file_path).replace('.txt', '')
+        return {
+            'pdf': os.path.join(self.target_dir, "2-每日反馈", f"{filename_base}.pdf"),
+            'tex': os.path.join(self.target_dir, "3-每日反馈tex", f"{filename_base}.tex"),
+            'txt': os.path.join(self.target_dir, "2-每日反馈txt", f"{filename_base}.txt"),
+            'html': os.path.join(self.target_dir, "3-每日反馈tex", f"{filename_base}.html")
+        }
+    
     def move_files_to_target_dirs(self, input_file_path, latex_file_path):
         """将生成的文件移动到目标目录"""
         try:
-            # 目标主目录
-            target_base_dir = "/home/song/NutstoreFiles/6-XY/2025年8月幼小衔接"
-            
-            # 目标子目录
-            pdf_target_dir = os.path.join(target_base_dir, "2-每日反馈")
-            tex_target_dir = os.path.join(target_base_dir, "3-每日反馈tex")
-            txt_target_dir = os.path.join(target_base_dir, "2-每日反馈txt")
+            targets = self.get_target_paths(input_file_path)
             
             # 确保目标目录存在
-            os.makedirs(pdf_target_dir, exist_ok=True)
-            os.makedirs(tex_target_dir, exist_ok=True)
-            os.makedirs(txt_target_dir, exist_ok=True)
-            
-            filename_base = os.path.basename(input_file_path).replace('.txt', '')
+            for target_path in targets.values():
+                os.makedirs(os.path.dirname(target_path), exist_ok=True)
             
             # 移动PDF文件
             pdf_source_path = latex_file_path.replace('.tex', '.pdf')
-            pdf_target_path = os.path.join(pdf_target_dir, f"{filename_base}.pdf")
+            pdf_target_path = targets['pdf']
             
             if os.path.exists(pdf_source_path):
                 os.rename(pdf_source_path, pdf_target_path)
                 print(f"PDF文件已移动到: {pdf_target_path}")
             
             # 移动TEX文件
-            tex_target_path = os.path.join(tex_target_dir, f"{filename_base}.tex")
+            tex_target_path = targets['tex']
             if os.path.exists(latex_file_path):
                 os.rename(latex_file_path, tex_target_path)
                 print(f"TEX文件已移动到: {tex_target_path}")
             
+            # 移动HTML预览文件
+            html_source_path = os.path.splitext(latex_file_path)[0] + '.html'
+            if os.path.exists(html_source_path):
+                os.replace(html_source_path, targets['html'])
+                print(f"HTML预览已移动到: {targets['html']}")
+            
             # 移动TXT文件
-            txt_target_path = os.path.join(txt_target_dir, f"{filename_base}.txt")
+            txt_target_path = targets['txt']
             if os.path.exists(input_file_path):
                 os.rename(input_file_path, txt_target_path)
                 print(f"TXT文件已移动到: {txt_target_path}")
@@ -292,8 +676,69 @@ class LatexGenerator:
             print(f"移动文件时出错: {e}")
             return False
     
-    def generate_latex_for_file(self, input_file_path):
-        """为单个文件生成LaTeX"""
+    def prepare_latex_for_file(self, input_file_path):
+        """为单个文件生成并保存LaTeX源文件，成功时返回LaTeX文件路径（同时开始记录该文件的指标）"""
+        date_key = self.get_date_key(input_file_path)
+        self.metrics.begin(date_key)
+        latex_output_path = None
+        try:
+            latex_output_path = self.write_latex_for_file(input_file_path)
+        finally:
+            if not latex_output_path:
+                self.manifest.mark_failed(date_key, ProcessingManifest.STAGE_GENERATE)
+                self.metrics.finish(date_key, 'generate_failed')
+        return latex_output_path
+    
+    def find_resumable_latex(self, input_file_path):
+        """上次运行已生成LaTeX（之后中断，或编译、移动失败）且输入未变化时返回LaTeX文件路径，否则返回None"""
+        if not self.cache_read:
+            return None
+        record = self.manifest.get(self.get_date_key(input_file_path))
+        if not record or not record['tex_hash']:
+            return None
+        if record['status'] not in (ProcessingManifest.STATUS_GENERATED, ProcessingManifest.STATUS_COMPILED) and not (
+                record['status'] == ProcessingManifest.STATUS_FAILED and
+                record['failed_stage'] in (ProcessingManifest.STAGE_COMPILE, ProcessingManifest.STAGE_MOVE)):
+            return None
+        
+        latex_output_path = os.path.join(self.output_dir, os.path.basename(input_file_path).replace('.txt', '.tex'))
+        try:
+            with open(latex_output_path, 'r', encoding='utf-8') as f:
+                latex_content = f.read()
+        except OSError:
+            return None
+        input_text = self.read_input_file(input_file_path)
+        if input_text is None or hash_text(input_text) != record['input_hash'] or \
+                hash_text(latex_content) != record['tex_hash']:
+            return None
+        
+        print(f"\n处理文件: {os.path.basename(input_file_path)}")
+        print("上次运行已生成LaTeX，从编译阶段继续")
+        return latex_output_path
+    
+    def write_latex_for_file(self, input_file_path):
+        """读取输入、生成LaTeX（本地渲染、缓存或API）并保存，成功时返回LaTeX文件路径"""
+        resumed = self.find_resumable_latex(input_file_path)
+        if resumed:
+            return resumed
+        
+        job = self.start_latex_job(input_file_path)
+        if job is None:
+            return None
+        
+        if job['latex'] is None:
+            # 调用API
+            api_response = self.call_deepseek_api(job['prompt'])
+            if not self.accept_api_response(job, api_response):
+                return None
+        
+        return self.save_latex(input_file_path, job)
+    
+    def start_latex_job(self, input_file_path):
+        """读取输入并尝试本地渲染和响应缓存，返回生成任务信息，无法处理时返回None
+        
+        任务中 latex 为None时表示需要调用API（使用任务中的 prompt）。
+        """
         print(f"\n处理文件: {os.path.basename(input_file_path)}")
         
         # 从文件名提取日期
@@ -301,47 +746,231 @@ class LatexGenerator:
         date_str = self.extract_date_from_filename(filename)
         if not date_str:
             print(f"无法从文件名提取日期: {filename}")
-            return False
+            return None
         
         print(f"提取的日期: {date_str}")
         
         # 读取输入文件
-        input_text = self.read_input_file(input_file_path)
+        with self.metrics.stage('read'):
+            input_text = self.read_input_file(input_file_path)
         if not input_text:
             print("无法读取输入文件，跳过处理")
-            return False
+            return None
         
         print(f"成功读取输入文件，内容长度: {len(input_text)} 字符")
+        # 处理清单中记录原始文件的哈希，其余步骤使用整理后的文本
+        job = {'source_text': input_text, 'date_str': date_str, 'prompt': None, 'cache_key': None}
+        with self.metrics.stage('normalize'):
+            input_text = job['input_text'] = self.normalize_input(input_text)
         
-        # 读取资源文件
-        style_content = self.read_resource_file(self.latex_config['style_file'])
-        example_content = self.read_resource_file("20250924.tex")
+        # 结构规整的笔记直接在本地生成LaTeX，跳过API调用
+        with self.metrics.stage('local'):
+            job['latex'] = self.render_locally(input_text, date_str)
+        self.metrics.set(local_render=job['latex'] is not None)
+        if job['latex'] is not None:
+            return job
         
-        if not style_content:
-            print("无法读取样式文件，跳过处理")
-            return False
-            
-        if not example_content:
-            print("无法读取示例文件，跳过处理")
+        # 生成提示词（资源文件在进程内只读取一次）
+        with self.metrics.stage('prompt'):
+            job['prompt'] = self.build_prompt(self.escape_prompt_input(input_text), date_str)
+        if not job['prompt']:
+            print("无法读取样式文件或示例文件，跳过处理")
+            return None
+        
+        # 查询响应缓存，命中时跳过API调用
+        job['cache_key'] = self.response_cache.make_key(self.build_api_request(job['prompt']))
+        cached = self.response_cache.get(job['cache_key']) if self.cache_read else None
+        self.metrics.set(response_cache_hit=bool(cached))
+        
+        if cached:
+            print(f"命中响应缓存 ({job['cache_key'][:12]})，跳过API调用")
+            # 缓存中的内容已经过检查，这里只做本地复核
+            job['latex'] = self.validate_latex(cached['latex'])
+            if job['latex'] is None:
+                return None
+            return job
+        
+        # 只修改了部分学科时只重新生成这些学科
+        job['latex'] = self.regenerate_sections(job, self.get_date_key(input_file_path))
+        # 较长的多学科笔记按学科并行生成
+        if job['latex'] is None and self.should_chunk(input_text):
+            job['latex'] = self.generate_chunked(job)
+        return job
+    
+    def regenerate_sections(self, job, date_key):
+        """与上次的输入按学科比较，只重新生成有修改的学科框和作业参数并替换进上次的LaTeX
+        
+        没有上次的记录、生成设置有变化、学科结构有变化或所有学科都有修改时返回None（整篇重新生成）。
+        """
+        if not self.incremental_enabled or not self.cache_read:
+            return None
+        snapshot = self.section_snapshots.load(date_key)
+        if not snapshot:
+            return None
+        # 样式、示例、提示词或模型参数变化时响应缓存也会失效，上次的LaTeX和其中的学科框都不再沿用
+        if snapshot.get('generation') != self.get_generation_key():
+            print("样式、示例或提示词设置已变化，整篇重新生成")
+            return None
+        changed = diff_sections(snapshot['input'], job['input_text'])
+        sections = dict(split_subjects(job['input_text'])[1])
+        if changed is None or not sections or len(changed) == len(sections):
+            return None
+        if not changed:
+            print("各学科内容均未变化，沿用上次生成的LaTeX")
+            return snapshot['latex']
+        
+        print(f"只有 {'、'.join(changed)} 部分有修改，按学科增量更新")
+        boxes = {}
+        homework = {}
+        for subject in changed:
+            rendered = self.render_section(subject, sections[subject], snapshot['latex'], job['date_str'])
+            if rendered is None:
+                print(f"{subject}部分无法增量更新，整篇重新生成")
+                return None
+            boxes[subject], homework[subject] = rendered
+        
+        latex_content = splice_sections(snapshot['latex'], boxes, homework)
+        if latex_content is None:
+            print("上次生成的LaTeX结构无法识别，整篇重新生成")
+            return None
+        self.metrics.set(incremental=changed)
+        return self.validate_latex(latex_content)
+    
+    def render_section(self, subject, input_text, previous_latex, date_str):
+        """重新生成一个学科框，返回 (学科框LaTeX, 作业参数)，失败时返回None
+        
+        结构规整时在本地渲染，否则只把这一个学科发送给API。
+        """
+        environment = SUBJECT_ENVIRONMENTS[subject]
+        parsed = self.local_renderer.parse_subject(input_text) if self.local_render_enabled else None
+        if parsed is not None:
+            return self.render_local_box(subject, parsed)
+        
+        old_span = find_environment(previous_latex, environment)
+        old_homework = find_command(previous_latex, 'homeworkrecord', len(SUBJECTS))
+        if old_span is None or old_homework is None:
+            return None
+        
+        with self.metrics.stage('prompt'):
+            prompt = self.prompt_builder.render_section(
+                self.resources.get(self.latex_config['style_file']), subject, environment,
+                previous_latex[old_span[0]:old_span[1]], old_homework[2][SUBJECTS.index(subject)],
+                self.escape_prompt_input(input_text), date_str)
+        return self.extract_fragment(self.call_deepseek_api(prompt, full_document=False), environment)
+    
+    def render_local_box(self, subject, parsed):
+        """本地渲染一个已解析的学科框，返回 (学科框LaTeX, 作业参数)"""
+        box = self.local_renderer.render_box(subject, parsed)
+        start, end = find_environment(box, SUBJECT_ENVIRONMENTS[subject])
+        return box[start:end], self.local_renderer.render_homework_argument(parsed)
+    
+    def extract_fragment(self, api_response, environment):
+        """从学科框请求的响应中提取 (学科框LaTeX, 作业参数)，格式不符时返回None"""
+        if not api_response:
+            return None
+        with self.metrics.stage('extract'):
+            span = find_environment(api_response, environment)
+            found = find_command(api_response, 'homework', 1)
+        if span is None or found is None:
+            return None
+        return api_response[span[0]:span[1]], found[2][0].strip()
+    
+    def should_chunk(self, input_text):
+        """输入是否按学科分块生成：学科数和长度达到阈值，且学科标题之前没有需要生成的内容"""
+        if not self.chunking_enabled:
             return False
+        leading, sections = split_subjects(input_text)
+        subjects = [subject for subject, _ in sections]
+        return (len(subjects) >= self.chunking_config.get('min_subjects', 2)
+                and len(set(subjects)) == len(subjects)
+                and len(input_text) >= self.chunking_config.get('min_input_chars', 1500)
+                and all(map(is_preamble_line, leading)))
+    
+    def generate_chunked(self, job):
+        """各学科框并行生成后拼接到同一个 \\dailytitle 下，作业参数合并为一个 \\homeworkrecord
         
-        print("成功读取资源文件")
+        任一学科失败时返回None（整篇重新生成）。
+        """
+        sections = split_subjects(job['input_text'])[1]
+        print(f"输入较长，按 {len(sections)} 个学科分块并行生成")
         
-        # 生成提示词
-        prompt = self.generate_latex_prompt(input_text, style_content, example_content, date_str)
+        # 结构规整的学科先在本地渲染，其余学科并行调用API
+        results = [None] * len(sections)
+        pending = []
+        for index, (subject, text) in enumerate(sections):
+            parsed = self.local_renderer.parse_subject(text) if self.local_render_enabled else None
+            if parsed is not None:
+                results[index] = self.render_local_box(subject, parsed)
+            else:
+                pending.append(index)
         
-        # 调用API
-        api_response = self.call_deepseek_api(prompt)
+        if pending:
+            with ThreadPoolExecutor(max_workers=len(pending)) as executor:
+                # 同一文件的第一个API请求占用一个调度器并发，其余为附加请求；在线程中保留当前文件的指标记录
+                futures = {index: executor.submit(contextvars.copy_context().run, self.render_chunk,
+                                                  *sections[index], job['date_str'], index != pending[0])
+                           for index in pending}
+                for index, future in futures.items():
+                    results[index] = future.result()
+        
+        subjects = [subject for subject, _ in sections]
+        failed = [subject for subject, result in zip(subjects, results) if result is None]
+        if failed:
+            print(f"{'、'.join(failed)}部分分块生成失败，整篇重新生成")
+            return None
+        
+        boxes = [f"% {subject}学习反馈部分\n{box}" for subject, (box, _) in zip(subjects, results)]
+        homework = {subject: argument for subject, (_, argument) in zip(subjects, results)}
+        latex_content = self.local_renderer.render_document(
+            job['date_str'], boxes, self.local_renderer.render_homework_record(homework))
+        self.metrics.set(chunked=len(sections))
+        latex_content = self.validate_latex(latex_content)
+        if latex_content is not None and self.cache_write:
+            self.response_cache.put(job['cache_key'], latex_content, latex_content)
+        return latex_content
+    
+    def render_chunk(self, subject, input_text, date_str, extra=False):
+        """通过API分块生成一个学科框，返回 (学科框LaTeX, 作业参数)，失败时返回None
         
+        以示例文件中的同一学科框作为格式参考；extra 为True时为附加请求（不占用调度器并发）。
+        """
+        environment = SUBJECT_ENVIRONMENTS[subject]
+        with self.metrics.stage('prompt'):
+            example_content = self.resources.get(self.example_file)
+            # 示例文件中没有该学科时参考其中的第一个学科框
+            spans = [find_environment(example_content, name) for name in
+                     [environment] + list(SUBJECT_ENVIRONMENTS.values())] if example_content else []
+            span = next((span for span in spans if span is not None), None)
+            if span is None:
+                print(f"示例文件中没有学科框，无法分块生成{subject}部分")
+                return None
+            prompt = self.prompt_builder.render_chunk(
+                self.resources.get(self.latex_config['style_file']), subject, environment,
+                example_content[span[0]:span[1]], self.escape_prompt_input(input_text), date_str)
+        return self.extract_fragment(self.call_deepseek_api(prompt, full_document=False, extra=extra),
+                                     environment)
+    
+    def accept_api_response(self, job, api_response):
+        """提取并检查API返回的LaTeX，写入响应缓存，返回是否可用"""
         if not api_response:
             print("API调用失败，跳过处理")
             return False
         
         print("API调用成功，处理响应...")
         
-        # 提取LaTeX内容
-        latex_content = self.extract_latex_content(api_response)
+        # 提取LaTeX内容并在编译前检查、修复
+        with self.metrics.stage('extract'):
+            latex_content = self.extract_latex_content(api_response)
+        job['latex'] = self.validate_latex(latex_content)
+        if job['latex'] is None:
+            return False
         
+        if self.cache_write:
+            self.response_cache.put(job['cache_key'], api_response, job['latex'])
+        return True
+    
+    def save_latex(self, input_file_path, job):
+        """保存生成的LaTeX文件并记录到处理清单，返回LaTeX文件路径"""
         # 从文件名提取年份和月份
         filename = os.path.basename(input_file_path)
         output_filename = filename.replace('.txt', '.tex')
@@ -349,38 +978,213 @@ class LatexGenerator:
         # 默认输出目录
         latex_output_path = os.path.join(self.output_dir, output_filename)
         
-        # 保存样式文件到输出目录（如果不存在）
-        style_output_path = os.path.join(self.output_dir, self.latex_config['style_file'])
-        if not os.path.exists(style_output_path):
-            with open(style_output_path, 'w', encoding='utf-8') as f:
-                f.write(style_content)
-            print(f"样式文件已保存: {style_output_path}")
+        # 同步样式文件到输出目录（仅在内容变化时写入）
+        self.resources.sync_file(self.latex_config['style_file'], self.output_dir)
         
         print(f"输出目录: {self.output_dir}")
     
         # 保存生成的LaTeX文件
         with open(latex_output_path, 'w', encoding='utf-8') as f:
-            f.write(latex_content)
+            f.write(job['latex'])
         print(f"LaTeX文件已保存: {latex_output_path}")
         
         # 显示生成的文件大小
         file_size = os.path.getsize(latex_output_path)
         print(f"生成的LaTeX文件大小: {file_size} 字节")
         
-        # 自动编译生成的LaTeX文件
-        if self.compile_latex_file(latex_output_path):
-            print(f"LaTeX文件编译成功: {output_filename.replace('.tex', '.pdf')}")
-            
-            # 移动文件到目标目录
-            if self.move_files_to_target_dirs(input_file_path, latex_output_path):
-                print("文件移动完成")
-            else:
-                print("文件移动失败")
-            
-            return True
+        if self.preview_enabled:
+            with self.metrics.stage('preview'):
+                self.write_preview(latex_output_path, job['latex'])
+        
+        # 记录到处理清单，并保存本次的输入和LaTeX供下次按学科增量更新
+        self.record_generated(input_file_path, job['source_text'], job['prompt'], job['latex'])
+        self.section_snapshots.save(self.get_date_key(input_file_path), job['input_text'], job['latex'],
+                                    self.get_generation_key())
+        return latex_output_path
+    
+    def get_preview_renderer(self):
+        """当前样式文件对应的HTML预览渲染器"""
+        style_hash = self.resources.get_hash(self.latex_config['style_file'])
+        renderer = self._preview_renderers.get(style_hash)
+        if renderer is None:
+            renderer = HtmlPreviewRenderer(self.resources.get(self.latex_config['style_file']))
+            self._preview_renderers = {style_hash: renderer}
+        return renderer
+    
+    def write_preview(self, latex_output_path, latex_content):
+        """在LaTeX文件旁生成同名的HTML预览，返回HTML文件路径（预览失败不影响PDF编译）"""
+        html_path = os.path.splitext(latex_output_path)[0] + '.html'
+        try:
+            content = self.get_preview_renderer().render(latex_content)
+            temp_path = html_path + '.tmp'
+            with open(temp_path, 'w', encoding='utf-8') as f:
+                f.write(content)
+            os.replace(temp_path, html_path)
+        except Exception as e:
+            print(f"生成HTML预览时出错: {e}")
+            return None
+        print(f"HTML预览已保存: {html_path}")
+        return html_path
+    
+    def get_latex_validator(self):
+        """当前样式文件对应的检查器"""
+        style_hash = self.resources.get_hash(self.latex_config['style_file'])
+        validator = self._validators.get(style_hash)
+        if validator is None:
+            validator = LatexValidator(self.resources.get(self.latex_config['style_file']),
+                                       self.validator_config.get('extra_macros') or ())
+            self._validators = {style_hash: validator}
+        return validator
+    
+    def validate_latex(self, latex_content):
+        """编译前检查LaTeX：简单问题本地修复，其余问题发送针对性修复请求
+        
+        仍有会导致编译失败的问题时返回None，避免无效的编译。
+        """
+        if not self.validator_enabled:
+            return latex_content
+        
+        with self.metrics.stage('validate'):
+            validator = self.get_latex_validator()
+            latex_content, fixes = validator.repair(latex_content)
+            issues = validator.check(latex_content)
+        if fixes:
+            print("编译前检查已本地修复: " + "；".join(fixes))
+        
+        repairs = 0
+        max_repairs = self.validator_config.get('max_api_repairs', 1) \
+            if self.validator_config.get('api_repair', True) else 0
+        # 只有会导致编译失败的问题才发送修复请求，警告（如白名单之外的命令）原样编译
+        while validator.has_errors(issues) and repairs < max_repairs:
+            repairs += 1
+            print(f"编译前检查发现 {len(issues)} 个问题，发送修复请求 ({repairs}/{max_repairs}):")
+            for _, message in issues:
+                print(f"  - {message}")
+            api_response = self.call_deepseek_api(self.prompt_builder.render_repair(latex_content, issues))
+            if not api_response:
+                break
+            with self.metrics.stage('validate'):
+                latex_content, _ = validator.repair(self.extract_latex_content(api_response))
+                issues = validator.check(latex_content)
+        
+        if validator.has_errors(issues):
+            print("编译前检查未通过，跳过编译:")
+            for _, message in issues:
+                print(f"  - {message}")
+            return None
+        for _, message in issues:
+            print(f"编译前检查警告: {message}")
+        return latex_content
+    
+    def normalize_input(self, input_text):
+        """在本地整理输入文本（引号、标点、空白），输出修改摘要"""
+        input_text, report = self.input_normalizer.normalize(input_text)
+        summary = format_report(report)
+        if summary:
+            print(f"输入整理: {summary}")
+        self.metrics.set(normalized={field: count for field, count in report.items() if count})
+        return input_text
+    
+    def escape_prompt_input(self, input_text):
+        """发送给API的输入：转义LaTeX特殊字符（本地渲染自行转义，不使用这里的结果）"""
+        input_text, escaped = self.input_normalizer.escape(input_text)
+        if escaped:
+            print(f"输入整理: 转义LaTeX特殊字符 {escaped} 处")
+        return input_text
+    
+    def render_locally(self, input_text, date_str):
+        """本地渲染快速路径：笔记结构规整时直接生成LaTeX，否则返回None"""
+        if not self.local_render_enabled:
+            return None
+        
+        latex_content = self.local_renderer.render(input_text, date_str)
+        with self._stats_lock:
+            self.local_render_attempts += 1
+            if latex_content:
+                self.local_render_hits += 1
+        
+        if latex_content:
+            print("笔记结构规整，已在本地生成LaTeX，跳过API调用")
         else:
+            print("笔记结构无法可靠解析，交给API生成")
+        return latex_content
+    
+    def get_date_key(self, input_file_path):
+        """处理清单中使用的日期键（YYYYMMDD）"""
+        return os.path.splitext(os.path.basename(input_file_path))[0]
+    
+    def record_generated(self, input_file_path, input_text, prompt, latex_content):
+        """在处理清单中记录已生成的LaTeX"""
+        try:
+            stat = os.stat(input_file_path)
+            self.manifest.update(
+                self.get_date_key(input_file_path),
+                input_path=input_file_path,
+                input_mtime_ns=stat.st_mtime_ns,
+                input_size=stat.st_size,
+                input_hash=hash_text(input_text),
+                prompt_hash=hash_text(prompt) if prompt else None,
+                tex_hash=hash_text(latex_content),
+                status=ProcessingManifest.STATUS_GENERATED
+            )
+        except Exception as e:
+            print(f"更新处理清单时出错: {e}")
+    
+    def complete_latex_for_file(self, input_file_path, latex_output_path, compiled, compile_info=None):
+        """处理编译结果：成功时移动文件，并更新处理清单和指标记录"""
+        output_filename = os.path.basename(latex_output_path)
+        date_key = self.get_date_key(input_file_path)
+        
+        record = self.metrics.get(date_key)
+        if compile_info:
+            self.metrics.add_time('compile', compile_info['seconds'], record)
+            self.metrics.set(record, compile_cache_hit=compile_info['cache_hit'],
+                             pages=compile_info.get('pages'))
+        
+        if not compiled:
             print(f"LaTeX文件编译失败: {output_filename}")
+            self.manifest.mark_failed(date_key, ProcessingManifest.STAGE_COMPILE)
+            self.metrics.finish(date_key, ProcessingManifest.STATUS_FAILED)
             return False
+        
+        print(f"LaTeX文件编译成功: {output_filename.replace('.tex', '.pdf')}")
+        self.manifest.update(date_key, status=ProcessingManifest.STATUS_COMPILED)
+        
+        # 移动文件到目标目录
+        with self.metrics.stage('move', record):
+            moved = self.move_files_to_target_dirs(input_file_path, latex_output_path)
+        if moved:
+            print("文件移动完成")
+            self.manifest.update(date_key,
+                                 pdf_path=self.get_target_paths(input_file_path)['pdf'],
+                                 status=ProcessingManifest.STATUS_DONE,
+                                 failed_stage=None, retries=0)
+        else:
+            print("文件移动失败")
+            self.manifest.mark_failed(date_key, ProcessingManifest.STAGE_MOVE)
+        
+        self.metrics.finish(date_key, ProcessingManifest.STATUS_DONE if moved else ProcessingManifest.STATUS_COMPILED)
+        return True
+    
+    def generate_latex_for_file(self, input_file_path):
+        """为单个文件生成LaTeX"""
+        latex_output_path = self.prepare_latex_for_file(input_file_path)
+        if not latex_output_path:
+            return False
+        if self.defer_compile:
+            return self.defer_latex_for_file(input_file_path)
+        
+        # 自动编译生成的LaTeX文件
+        self.last_compile_info = None
+        compiled = self.compile_latex_file(latex_output_path)
+        return self.complete_latex_for_file(input_file_path, latex_output_path, compiled,
+                                            self.last_compile_info)
+    
+    def defer_latex_for_file(self, input_file_path):
+        """已生成LaTeX和预览但不编译：处理清单保持“已生成”状态，之后的批量运行从编译阶段继续"""
+        print(f"已跳过编译: {os.path.basename(input_file_path)}（之后运行 --batch 编译PDF）")
+        self.metrics.finish(self.get_date_key(input_file_path), ProcessingManifest.STATUS_GENERATED)
+        return True
     
     def generate_all_latex_files(self):
         """生成所有文件的LaTeX"""
@@ -393,40 +1197,139 @@ class LatexGenerator:
             print("未找到符合日期规则的文件")
             return False
         
+        # 从处理清单恢复：已完成且未变化的日期跳过，中断或失败的日期从最后完成的阶段继续
+        if self.cache_read:
+            records = self.manifest.get_all()
+            pending = [file_path for file_path in input_files
+                       if self.needs_processing(file_path, records.get(self.get_date_key(file_path)),
+                                                retry_limit=False)]
+            if len(pending) < len(input_files):
+                print(f"{len(input_files) - len(pending)} 个文件已处理完成且未变化，跳过")
+            if not pending:
+                print("所有文件均已处理完成")
+                return True
+            input_files = pending
+        
+        success_count = self.process_files(input_files)
+        
+        print(f"\n处理完成: 成功 {success_count}/{len(input_files)} 个文件")
+        self.print_run_stats()
+        return success_count > 0
+    
+    def process_files(self, input_files, mode='batch'):
+        """处理一组输入文件，返回成功数量；并发数大于1时使用流水线模式
+        
+        mode 记录到指标中，用于区分批量运行和每次监控检查。
+        """
+        self.begin_batch(mode)
+        self.enqueue_files(input_files)
+        if self.api_scheduler.enabled:
+            # 日期越新越先处理
+            input_files = sorted(input_files, key=self.get_date_key, reverse=True)
+        
+        if self.defer_compile:
+            # 不编译时只有API阶段需要并发
+            with ThreadPoolExecutor(max_workers=max(1, self.api_jobs)) as executor:
+                return sum(1 for success in executor.map(self.generate_latex_for_file, input_files) if success)
+        
+        if self.api_jobs > 1 or self.compile_jobs > 1:
+            # 预先生成格式文件，避免多个编译进程同时生成
+            self.latex_format.ensure_format()
+            pipeline = BatchPipeline(self, self.api_jobs, self.compile_jobs)
+            results = pipeline.run(input_files)
+            return sum(1 for status in results.values() if BatchPipeline.is_success(status))
+        
         success_count = 0
         for file_path in input_files:
             if self.generate_latex_for_file(file_path):
                 success_count += 1
+        return success_count
+    
+    def enqueue_files(self, input_files):
+        """在处理清单中把尚无记录或需要重新处理的已完成日期标记为排队中，已有阶段进度的记录保持不变
         
-        print(f"\n处理完成: 成功 {success_count}/{len(input_files)} 个文件")
-        return success_count > 0
+        失败的日期输入有修改时清零失败次数并记录新的mtime和大小，重新计算自动重试次数上限。
+        """
+        records = self.manifest.get_all()
+        for file_path in input_files:
+            record = records.get(self.get_date_key(file_path))
+            try:
+                stat = os.stat(file_path)
+            except OSError:
+                continue
+            if record and record['status'] == ProcessingManifest.STATUS_FAILED:
+                if (stat.st_mtime_ns, stat.st_size) != (record['input_mtime_ns'], record['input_size']):
+                    self.manifest.update(self.get_date_key(file_path), input_path=file_path,
+                                         input_mtime_ns=stat.st_mtime_ns, input_size=stat.st_size, retries=0)
+                continue
+            if record and record['status'] != ProcessingManifest.STATUS_DONE:
+                continue
+            self.manifest.update(self.get_date_key(file_path), input_path=file_path,
+                                 input_mtime_ns=stat.st_mtime_ns, input_size=stat.st_size,
+                                 status=ProcessingManifest.STATUS_QUEUED)
+    
+    def begin_batch(self, mode):
+        """开始一个新批次：记录指标批次，重置本地渲染命中率统计"""
+        self.metrics.start_batch(mode)
+        with self._stats_lock:
+            self.local_render_hits = 0
+            self.local_render_attempts = 0
+    
+    def print_run_stats(self):
+        """输出API请求、重试次数和缓存命中情况"""
+        print(f"API请求 {self.api_client.request_count} 次，其中重试 {self.api_client.retry_count} 次")
+        if self.api_scheduler.enabled and self.api_scheduler.completed:
+            print(self.api_scheduler.status_text())
+        if self.api_hedger.hedged:
+            print(self.api_hedger.stats_text())
+        print(f"响应缓存: {self.response_cache.stats_text()}")
+        print(f"编译缓存: {self.compile_cache.stats_text()}")
+        if self.local_render_attempts:
+            rate = self.local_render_hits / self.local_render_attempts * 100
+            print(f"本地渲染: 本批次 {self.local_render_hits}/{self.local_render_attempts} 个文件跳过API（命中率 {rate:.0f}%）")
     
     def check_files_modification(self):
-        """检查文件是否被修改"""
+        """根据处理清单检查需要处理的文件（新增、内容变化、上次失败或PDF丢失）"""
         input_files = self.find_input_files()
-        modified_files = []
+        records = self.manifest.get_all()
+        return [file_path for file_path in input_files
+                if self.needs_processing(file_path, records.get(self.get_date_key(file_path)))]
+    
+    def needs_processing(self, file_path, record=None, retry_limit=True):
+        """根据处理清单记录判断单个文件是否需要处理
         
-        for file_path in input_files:
-            # 检查对应的输出文件是否存在
-            filename = os.path.basename(file_path)
-            output_filename = filename.replace('.txt', '.tex')
-            
-            # 构建对应的输出路径
-            date_match = re.search(r'(\d{4})(\d{2})(\d{2})', filename)
-            if date_match:
-                year = date_match.group(1)
-                month = date_match.group(2)
-                month_str = f"{year}年{int(month)}月"
-                output_path = os.path.join(self.output_dir, f"{year}年", f"{month_str}幼小衔接", output_filename)
-            else:
-                output_path = os.path.join(self.output_dir, output_filename)
-            
-            # 如果输出文件不存在，或者输入文件比输出文件新，则需要处理
-            if not os.path.exists(output_path) or \
-               os.path.getmtime(file_path) > os.path.getmtime(output_path):
-                modified_files.append(file_path)
+        retry_limit 为True时（监控模式），输入未变化且失败次数达到上限的日期不再自动重试。
+        """
+        if record is None:
+            record = self.manifest.get(self.get_date_key(file_path))
+        
+        if record and record['status'] == ProcessingManifest.STATUS_FAILED and retry_limit and \
+                self.max_retries and (record['retries'] or 0) >= self.max_retries:
+            stat = os.stat(file_path)
+            if stat.st_mtime_ns == record['input_mtime_ns'] and stat.st_size == record['input_size']:
+                print(f"{record['date']} 已失败 {record['retries']} 次，不再自动重试（使用 --retry-failed 重试）")
+                return False
+        
+        if not record or record['status'] != ProcessingManifest.STATUS_DONE:
+            return True
         
-        return modified_files
+        if not record['pdf_path'] or not os.path.exists(record['pdf_path']):
+            return True
+        
+        # mtime和大小未变化时无需读取内容
+        stat = os.stat(file_path)
+        if stat.st_mtime_ns == record['input_mtime_ns'] and stat.st_size == record['input_size']:
+            return False
+        
+        # 仅mtime变化（如同步客户端重写）时比较内容哈希
+        input_text = self.read_input_file(file_path)
+        if input_text is not None and hash_text(input_text) == record['input_hash']:
+            self.manifest.update(self.get_date_key(file_path),
+                                 input_mtime_ns=stat.st_mtime_ns,
+                                 input_size=stat.st_size)
+            return False
+        
+        return True
     
     def scheduled_task(self):
         """定时任务"""
@@ -436,12 +1339,10 @@ class LatexGenerator:
         
         if modified_files:
             print(f"检测到 {len(modified_files)} 个文件需要处理")
-            success_count = 0
-            for file_path in modified_files:
-                if self.generate_latex_for_file(file_path):
-                    success_count += 1
+            success_count = self.process_files(modified_files, mode='monitor')
             
             print(f"处理完成: 成功 {success_count}/{len(modified_files)} 个文件")
+            self.print_run_stats()
         else:
             print("没有文件需要处理")
     
@@ -468,6 +1369,19 @@ class LatexGenerator:
         except KeyboardInterrupt:
             print("\n监控已停止")
     
+    def start_watching(self):
+        """启动事件驱动监控：文件写入稳定后数秒内处理"""
+        watcher = InputWatcher(
+            self,
+            debounce_seconds=self.monitor_config.get('watch_debounce_seconds', 3),
+            poll_seconds=self.monitor_config.get('watch_poll_seconds', 2),
+            backend=self.monitor_config.get('watch_backend', 'auto')
+        )
+        print(f"启动实时监控，文件写入稳定 {watcher.debounce_seconds} 秒后处理...")
+        print(f"输出目录: {self.output_dir}")
+        print("按Ctrl+C停止监控")
+        watcher.run()
+    
     def run_once(self):
         """单次运行所有文件"""
         print("执行批量生成...")
@@ -478,18 +1392,72 @@ class LatexGenerator:
             print("LaTeX文件生成失败!")
         return success
     
-    def run_single(self, date_str):
-        """运行单个日期文件"""
+    def find_input_file(self, date_str):
+        """查找某个日期的输入文件，不存在时返回None"""
         # 构建文件名
         filename = f"{date_str}.txt"
         file_path = os.path.join(self.input_dir, filename)
         
         if not os.path.exists(file_path):
-            print(f"文件不存在: {file_path}")
+            # 输入目录根部没有时在子目录中查找
+            matches = self.input_index.find(date_str, date_str) if parse_date_filename(filename) else []
+            if not matches:
+                print(f"文件不存在: {file_path}")
+                return None
+            file_path = matches[0]
+        return file_path
+    
+    def run_retry_failed(self):
+        """只重新处理失败的日期，从失败的阶段继续（不受自动重试次数限制）"""
+        stage_names = {ProcessingManifest.STAGE_GENERATE: '生成', ProcessingManifest.STAGE_COMPILE: '编译',
+                       ProcessingManifest.STAGE_MOVE: '移动文件'}
+        input_files = []
+        for record in self.manifest.get_failed():
+            if (self.date_from and record['date'] < self.date_from) or (self.date_to and record['date'] > self.date_to):
+                continue
+            print(f"{record['date']}: {stage_names.get(record['failed_stage'], '未知')}阶段失败 {record['retries'] or 0} 次")
+            if record['input_path'] and os.path.exists(record['input_path']):
+                input_files.append(record['input_path'])
+            else:
+                file_path = self.find_input_file(record['date'])
+                if file_path:
+                    input_files.append(file_path)
+        
+        if not input_files:
+            print("没有需要重试的失败任务")
+            return True
+        
+        success_count = self.process_files(input_files, mode='retry')
+        print(f"\n重试完成: 成功 {success_count}/{len(input_files)} 个文件")
+        self.print_run_stats()
+        return success_count == len(input_files)
+    
+    def run_single(self, date_str):
+        """运行单个日期文件"""
+        file_path = self.find_input_file(date_str)
+        if not file_path:
             return False
         
+        self.metrics.start_batch('single')
         return self.generate_latex_for_file(file_path)
     
+    def run_monthly(self, month):
+        """生成或更新某月的汇总PDF（YYYYMM）"""
+        try:
+            compendium = MonthlyCompendium(self, month)
+        except ValueError as e:
+            print(e)
+            return False
+        return compendium.build()
+    
+    def start_daemon(self):
+        """启动常驻进程，在Unix域套接字上接收 daemon.py 客户端提交的任务"""
+        from daemon import GeneratorDaemon, resolve_socket_path
+        try:
+            GeneratorDaemon(self, resolve_socket_path(self.config_manager)).serve()
+        except RuntimeError as e:
+            print(e)
+    
     def show_config(self):
         """显示当前配置"""
         print("当前配置:")
@@ -499,50 +1467,142 @@ class LatexGenerator:
         print(f"  输出目录: {self.output_dir}")
         print(f"  资源目录: {self.resource_path}")
         print(f"  监控间隔: {self.check_interval_minutes} 分钟")
+        print(f"  并发设置: API {self.api_jobs}，编译 {self.compile_jobs}")
+        if self.date_from or self.date_to:
+            print(f"  日期范围: {self.date_from or '不限'} ~ {self.date_to or '不限'}")
+
+def pop_option(args, name, cast=str):
+    """从参数列表中取出带值的选项（如 --jobs 4），不存在时返回None"""
+    if name not in args:
+        return None
+    index = args.index(name)
+    if index + 1 >= len(args):
+        raise ValueError(f"参数 {name} 需要指定值")
+    try:
+        value = cast(args[index + 1])
+    except ValueError:
+        raise ValueError(f"参数 {name} 的值无效: {args[index + 1]}")
+    del args[index:index + 2]
+    return value
+
+def pop_flag(args, name):
+    """从参数列表中取出开关选项（如 --no-cache），返回是否存在"""
+    if name not in args:
+        return False
+    args.remove(name)
+    return True
 
 def main():
     print("=== LaTeX文档生成器 ===")
     
+    # 检查命令行参数
+    import sys
+    args = list(sys.argv)
+    config_file = "config.yaml"
+    
+    # 处理配置和并发相关参数（可出现在任意位置）
+    try:
+        config_file = pop_option(args, "--config") or config_file
+        jobs = pop_option(args, "--jobs", int)
+        api_jobs = pop_option(args, "--api-jobs", int) or jobs
+        compile_jobs = pop_option(args, "--compile-jobs", int) or jobs
+        no_cache = pop_flag(args, "--no-cache")
+        refresh = pop_flag(args, "--refresh")
+        stream = pop_flag(args, "--stream")
+        style_digest = pop_flag(args, "--style-digest")
+        no_local = pop_flag(args, "--no-local")
+        use_async = pop_flag(args, "--async")
+        no_compile = pop_flag(args, "--no-compile")
+        hedge = pop_flag(args, "--hedge")
+        date_from = pop_option(args, "--from", check_date_key)
+        date_to = pop_option(args, "--to", check_date_key)
+    except ValueError as e:
+        print(e)
+        return
+    
+    # 统计报告只读取指标文件，不需要API密钥
+    if len(args) > 1 and args[1] == "--stats":
+        generator = LatexGenerator(config_file)
+        print(f"指标文件: {generator.metrics.path}")
+        print_stats_report(load_metrics(generator.metrics.path))
+        return
+    
     # 检查API密钥
     if not os.getenv('DEEPSEEK_API_KEY'):
         print("错误: 请设置环境变量 DEEPSEEK_API_KEY")
         print("例如: export DEEPSEEK_API_KEY='your_api_key_here'")
         return
     
-    # 检查命令行参数
-    import sys
-    config_file = "config.yaml"
-    
-    # 处理配置相关参数
-    if len(sys.argv) > 1 and sys.argv[1] == "--config":
-        if len(sys.argv) > 2:
-            config_file = sys.argv[2]
-        else:
-            print("请指定配置文件路径")
-            return
-    
-    generator = LatexGenerator(config_file)
+    if use_async:
+        from async_generator import AsyncLatexGenerator
+        generator = AsyncLatexGenerator(config_file)
+    else:
+        generator = LatexGenerator(config_file)
+    if api_jobs:
+        generator.api_jobs = api_jobs
+        generator.api_scheduler.set_max_concurrency(api_jobs)
+    if compile_jobs:
+        generator.compile_jobs = compile_jobs
+    if stream:
+        generator.api_config['stream'] = True
+    if style_digest:
+        generator.prompt_builder.style_mode = 'digest'
+    if no_local:
+        generator.local_render_enabled = False
+    if no_compile:
+        generator.defer_compile = True
+    if hedge:
+        generator.api_hedger.enabled = True
+    generator.date_from = date_from
+    generator.date_to = date_to
+    if no_cache:
+        generator.cache_read = generator.cache_write = False
+        generator.compile_cache_enabled = False
+    elif refresh:
+        generator.cache_read = False
     generator.show_config()
     
-    if len(sys.argv) > 1:
-        if sys.argv[1] == "--monitor":
+    if len(args) > 1:
+        if args[1] == "--monitor":
             # 可以指定监控间隔
-            interval = int(sys.argv[2]) if len(sys.argv) > 2 else None
+            interval = int(args[2]) if len(args) > 2 else None
             generator.start_monitoring(interval)
-        elif sys.argv[1] == "--batch":
+        elif args[1] == "--watch":
+            generator.start_watching()
+        elif args[1] == "--batch":
             generator.run_once()
-        elif sys.argv[1] == "--single" and len(sys.argv) > 2:
-            generator.run_single(sys.argv[2])
-        elif sys.argv[1] == "--config" and len(sys.argv) > 3:
-            # 已经处理过config参数，跳过
-            pass
-        elif sys.argv[1] == "--help" or sys.argv[1] == "-h":
+        elif args[1] == "--retry-failed":
+            generator.run_retry_failed()
+        elif args[1] == "--single" and len(args) > 2:
+            generator.run_single(args[2])
+        elif args[1] == "--monthly" and len(args) > 2:
+            generator.run_monthly(args[2])
+        elif args[1] == "--daemon":
+            generator.start_daemon()
+        elif args[1] == "--help" or args[1] == "-h":
             print("用法:")
             print("  python latex_generator.py --batch           # 批量处理所有日期文件")
             print("  python latex_generator.py --single YYYYMMDD # 处理单个日期文件")
+            print("  python latex_generator.py --retry-failed   # 只重新处理失败的日期，从失败的阶段继续")
+            print("  python latex_generator.py --monthly YYYYMM # 生成月度汇总PDF（带目录，复用已编译的每日PDF）")
             print("  python latex_generator.py --monitor        # 启动定时监控（默认60分钟）")
             print("  python latex_generator.py --monitor 30     # 启动定时监控（30分钟间隔）")
+            print("  python latex_generator.py --daemon         # 启动常驻进程，用 python daemon.py YYYYMMDD 提交任务")
+            print("  python latex_generator.py --watch          # 启动实时监控（文件变更后数秒内处理）")
             print("  python latex_generator.py --config path    # 指定配置文件路径")
+            print("  python latex_generator.py --batch --jobs 4 # 流水线模式，API和编译各4个并发")
+            print("  python latex_generator.py --batch --api-jobs 4 --compile-jobs 2 # 分别指定各阶段并发数")
+            print("  python latex_generator.py --batch --refresh  # 忽略已缓存的API响应并重新缓存")
+            print("  python latex_generator.py --batch --no-cache # 不读取也不写入API响应缓存")
+            print("  python latex_generator.py --batch --stream # 流式调用API，无效输出提前中止")
+            print("  python latex_generator.py --batch --style-digest # 提示词中只发送样式文件的环境和命令摘要")
+            print("  python latex_generator.py --batch --no-local # 不使用本地渲染，所有文件都调用API")
+            print("  python latex_generator.py --single YYYYMMDD --no-compile # 只生成LaTeX和HTML预览，之后用 --batch 编译")
+            print("  python latex_generator.py --batch --from 20250901 --to 20250930 # 只处理日期范围内的文件")
+            print("  python latex_generator.py --batch --hedge  # 对冲请求：慢请求超过最近延迟的分位数时再发一个相同请求")
+            print("  python latex_generator.py --batch --async --jobs 4 # 异步引擎：aiohttp调用API，asyncio子进程编译")
+            print("  python latex_generator.py --monitor --async # 异步监控：新文件不必等待上一批编译完成")
+            print("  python latex_generator.py --stats          # 汇总指标文件：各阶段耗时p50/p95和各批次合计")
             print("  python latex_generator.py --help           # 显示帮助")
         else:
             print("未知参数，使用 --help 查看用法")
@@ -0,0 +1,283 @@
+import re
+
+from prompt_builder import extract_style_definitions
+
+# 问题级别：error 为结构性问题（环境或括号不配对、缺少文档框架），一定会导致编译失败；
+# warning 为可能的问题（如白名单之外的命令），不阻止编译
+ERROR = 'error'
+WARNING = 'warning'
+
+# 标准LaTeX及样式文件所加载宏包（ctex、geometry、tikz、xcolor、enumitem、graphicx、fontspec、twemojis、ulem）中的常用命令
+STANDARD_MACROS = {
+    # 文档结构
+    'documentclass', 'usepackage', 'begin', 'end', 'item', 'par', 'maketitle', 'title', 'author', 'date',
+    'today', 'section', 'subsection', 'subsubsection', 'paragraph', 'label', 'ref', 'caption',
+    'newpage', 'clearpage', 'pagebreak', 'linebreak', 'newline', 'noindent', 'indent', 'centering',
+    'raggedright', 'raggedleft', 'footnote', 'thispagestyle', 'pagestyle', 'input',
+    # 定义命令
+    'newcommand', 'renewcommand', 'providecommand', 'newenvironment', 'renewenvironment', 'def', 'let',
+    'newcounter', 'setcounter', 'stepcounter', 'addtocounter', 'value', 'arabic', 'roman', 'alph',
+    'relax', 'protect', 'ensuremath', 'hbox', 'vbox', 'hskip', 'vskip', 'strut', 'phantom',
+    # 表格
+    'hline', 'cline', 'multicolumn', 'tabularnewline', 'arraystretch', 'tabcolsep',
+    # 字体
+    'textbf', 'textit', 'emph', 'underline', 'texttt', 'textsf', 'textrm', 'textsc', 'textnormal',
+    'textsuperscript', 'textsubscript', 'bfseries', 'itshape', 'ttfamily', 'sffamily', 'rmfamily',
+    'normalfont', 'tiny', 'scriptsize', 'footnotesize', 'small', 'normalsize', 'large', 'Large',
+    'LARGE', 'huge', 'Huge', 'songti', 'heiti', 'kaishu', 'fangsong', 'zihao', 'CJKfamily',
+    'fontsize', 'selectfont', 'setmainfont', 'setCJKmainfont',
+    # 间距
+    'hspace', 'vspace', 'quad', 'qquad', 'hfill', 'vfill', 'hrulefill', 'dotfill', 'smallskip',
+    'medskip', 'bigskip', 'setlength', 'addtolength', 'linespread', 'parindent', 'parskip',
+    'baselineskip', 'textwidth', 'linewidth', 'columnwidth', 'textheight',
+    # 盒子、颜色、图片
+    'mbox', 'fbox', 'makebox', 'framebox', 'parbox', 'raisebox', 'rule', 'color', 'textcolor',
+    'colorbox', 'fcolorbox', 'includegraphics', 'tikz', 'node', 'draw', 'fill', 'path',
+    # ulem、twemojis
+    'uline', 'uuline', 'uwave', 'sout', 'xout', 'dashuline', 'dotuline', 'texttwemoji', 'twemoji',
+    # 特殊字符
+    'textbackslash', 'textasciitilde', 'textasciicircum', 'ldots', 'dots', 'cdots', 'S', 'P',
+    'checkmark', 'textbullet', 'textperiodcentered', 'LaTeX', 'TeX', 'textcircled', 'textendash',
+    'textemdash', 'textquoteleft', 'textquoteright', 'textquotedblleft', 'textquotedblright',
+    'enspace', 'thinspace', 'nobreakspace', 'copyright', 'dag', 'ddag',
+    # 数学
+    'times', 'div', 'pm', 'cdot', 'frac', 'sqrt', 'left', 'right', 'leq', 'geq', 'neq', 'le', 'ge',
+    'approx', 'circ', 'square', 'triangle', 'star', 'bigstar', 'heartsuit', 'rightarrow',
+    'leftarrow', 'Rightarrow', 'to', 'text', 'mathrm', 'mathbf',
+    # enumitem
+    'setlist',
+}
+
+STANDARD_ENVIRONMENTS = {
+    'document', 'itemize', 'enumerate', 'description', 'center', 'flushleft', 'flushright',
+    'quote', 'quotation', 'verse', 'minipage', 'tabular', 'table', 'figure', 'tikzpicture',
+    'array', 'equation', 'equation*',
+}
+
+# 需要按 \begin/\end 配对检查的标记
+_ENVIRONMENT_PATTERN = re.compile(r'\\(begin|end)\{([^{}]*)\}')
+# 控制序列：字母命令或单个符号（如 \\、\{、\%）
+_CONTROL_SEQUENCE_PATTERN = re.compile(r'\\([A-Za-z@]+\*?|.)', re.DOTALL)
+# 文档中自行定义的命令和环境
+_MACRO_DEFINITION_PATTERN = re.compile(
+    r'\\(?:(?:re)?newcommand|providecommand|DeclareRobustCommand)\*?\s*\{?\s*\\([A-Za-z@]+)'
+    r'|\\(?:[gex]?def|let)\s*\\([A-Za-z@]+)')
+_ENVIRONMENT_DEFINITION_PATTERN = re.compile(r'\\(?:re)?newenvironment\*?\s*\{([^{}]+)\}')
+# 行内注释（未转义的%到行尾）
+_COMMENT_PATTERN = re.compile(r'(?<!\\)(?:\\\\)*%.*')
+# Markdown 残留
+_FENCE_PATTERN = re.compile(r'^\s*```.*$\n?', re.MULTILINE)
+_BOLD_PATTERN = re.compile(r'\*\*([^*\n]+?)\*\*')
+_HEADING_PATTERN = re.compile(r'^#{1,6}\s+(.+)$', re.MULTILINE)
+
+
+def mask_comments(latex_content):
+    """把注释替换为等长空格，保持字符位置不变"""
+    def blank(match):
+        text = match.group(0)
+        # 保留注释前成对的反斜杠
+        index = text.index('%')
+        return text[:index] + ' ' * (len(text) - index)
+    return _COMMENT_PATTERN.sub(blank, latex_content)
+
+
+def line_number(text, position):
+    return text.count('\n', 0, position) + 1
+
+
+def extract_document_definitions(masked):
+    """提取文档自身（\\newcommand、\\def、\\newenvironment 等）定义的命令和环境，返回 (环境集合, 命令集合)"""
+    commands = {first or second for first, second in _MACRO_DEFINITION_PATTERN.findall(masked)}
+    return set(_ENVIRONMENT_DEFINITION_PATTERN.findall(masked)), commands
+
+
+class LatexValidator:
+    """编译前的静态检查：环境配对、括号深度、未知命令、Markdown残留和中文引号配对
+
+    只有结构性问题是错误；命令和环境按样式文件、常用宏包和文档自身的定义检查，未知的只作为警告。
+
+    repair 只处理可以确定修复方式的简单问题，其余问题交给调用方（发送针对性修复请求）。
+    """
+
+    def __init__(self, style_content, extra_macros=()):
+        environments, commands = extract_style_definitions(style_content or '')
+        self.known_environments = STANDARD_ENVIRONMENTS | environments
+        self.known_macros = STANDARD_MACROS | commands | set(extra_macros)
+
+    def check(self, latex_content):
+        """检查LaTeX文档，返回 [(级别, 问题描述), ...]"""
+        issues = []
+        masked = mask_comments(latex_content)
+
+        for marker in ('\\documentclass', '\\begin{document}', '\\end{document}'):
+            if marker not in masked:
+                issues.append((ERROR, f"缺少 {marker}"))
+
+        if _FENCE_PATTERN.search(masked):
+            issues.append((ERROR, "包含Markdown代码块标记 ```"))
+        if _BOLD_PATTERN.search(masked):
+            issues.append((WARNING, "包含Markdown加粗标记 **...**"))
+        heading = _HEADING_PATTERN.search(masked)
+        if heading:
+            issues.append((ERROR, f"第 {line_number(masked, heading.start())} 行包含Markdown标题 #"))
+
+        environments, commands = extract_document_definitions(masked)
+        issues.extend(self.check_environments(masked, environments))
+        issues.extend(self.check_braces(masked))
+        issues.extend(self.check_macros(masked, commands))
+        issues.extend(self.check_quotes(masked))
+        return issues
+
+    def check_environments(self, masked, defined=()):
+        """检查 \\begin/\\end 是否配对，以及环境是否已定义（defined 为文档自身定义的环境）"""
+        issues = []
+        stack = []
+        for match in _ENVIRONMENT_PATTERN.finditer(masked):
+            kind, name = match.groups()
+            line = line_number(masked, match.start())
+            if kind == 'begin':
+                if name not in self.known_environments and name not in defined:
+                    issues.append((WARNING, f"第 {line} 行使用了未知的环境 {name}"))
+                stack.append((name, line))
+            elif stack and stack[-1][0] == name:
+                stack.pop()
+            elif any(open_name == name for open_name, _ in stack):
+                while stack[-1][0] != name:
+                    open_name, open_line = stack.pop()
+                    issues.append((ERROR, f"第 {open_line} 行的环境 {open_name} 在第 {line} 行 \\end{{{name}}} 之前未结束"))
+                stack.pop()
+            else:
+                issues.append((ERROR, f"第 {line} 行的 \\end{{{name}}} 没有对应的 \\begin"))
+        for name, line in stack:
+            issues.append((ERROR, f"第 {line} 行的环境 {name} 未结束"))
+        return issues
+
+    def check_braces(self, masked):
+        """检查花括号深度，忽略转义的 \\{ \\}"""
+        depth = 0
+        text = _CONTROL_SEQUENCE_PATTERN.sub(lambda m: ' ' * len(m.group(0)) if len(m.group(1)) == 1 else m.group(0), masked)
+        for position, char in enumerate(text):
+            if char == '{':
+                depth += 1
+            elif char == '}':
+                depth -= 1
+                if depth < 0:
+                    return [(ERROR, f"第 {line_number(text, position)} 行有多余的 }}")]
+        if depth > 0:
+            return [(ERROR, f"有 {depth} 个 {{ 未闭合")]
+        return []
+
+    def check_macros(self, masked, defined=()):
+        """检查命令是否由样式文件、常用宏包或文档自身（defined）定义，白名单不完整，未知命令只作为警告"""
+        unknown = {}
+        for match in _CONTROL_SEQUENCE_PATTERN.finditer(masked):
+            name = match.group(1).rstrip('*')
+            if len(name) == 1 and not name.isalpha():
+                continue
+            if name not in self.known_macros and name not in defined and name not in unknown:
+                unknown[name] = line_number(masked, match.start())
+        return [(WARNING, f"第 {line} 行使用了未知的命令 \\{name}") for name, line in unknown.items()]
+
+    def check_quotes(self, masked):
+        """检查中文引号是否成对（每段内按“”交替出现）"""
+        issues = []
+        offset = 0
+        for paragraph in re.split(r'(\n\s*\n)', masked):
+            quotes = re.sub(r'[^“”]', '', paragraph)
+            expected = ''.join('“”'[i % 2] for i in range(len(quotes)))
+            if quotes != expected:
+                issues.append((WARNING, f"第 {line_number(masked, offset)} 行起的段落中文引号未成对"))
+            offset += len(paragraph)
+        return issues
+
+    def repair(self, latex_content):
+        """本地修复简单问题，返回 (修复后的内容, [修复说明, ...])"""
+        fixes = []
+
+        # 去掉 \documentclass 之前和 \end{document} 之后的说明文字
+        start = latex_content.find('\\documentclass')
+        if start > 0:
+            latex_content = latex_content[start:]
+            fixes.append("删除了\\documentclass之前的内容")
+        end = latex_content.rfind('\\end{document}')
+        if end >= 0 and latex_content[end + len('\\end{document}'):].strip():
+            latex_content = latex_content[:end] + '\\end{document}\n'
+            fixes.append("删除了\\end{document}之后的内容")
+
+        latex_content, count = _FENCE_PATTERN.subn('', latex_content)
+        if count:
+            fixes.append(f"删除了 {count} 行Markdown代码块标记")
+        latex_content, count = _BOLD_PATTERN.subn(r'\\textbf{\1}', latex_content)
+        if count:
+            fixes.append(f"将 {count} 处 **...** 改为 \\textbf")
+        latex_content, count = _HEADING_PATTERN.subn(r'\\textbf{\1}', latex_content)
+        if count:
+            fixes.append(f"将 {count} 处Markdown标题改为 \\textbf")
+
+        latex_content, environment_fixes = self.repair_environments(latex_content)
+        fixes.extend(environment_fixes)
+
+        latex_content, count = self.repair_quotes(latex_content)
+        if count:
+            fixes.append(f"修正了 {count} 个段落的中文引号")
+        return latex_content, fixes
+
+    def repair_environments(self, latex_content):
+        """删除多余的 \\end，补全未结束的环境和 \\end{document}"""
+        fixes = []
+        masked = mask_comments(latex_content)
+        edits = []
+        stack = []
+        for match in _ENVIRONMENT_PATTERN.finditer(masked):
+            kind, name = match.groups()
+            if kind == 'begin':
+                stack.append(name)
+            elif stack and stack[-1] == name:
+                stack.pop()
+            elif name in stack:
+                closing = []
+                while stack[-1] != name:
+                    closing.append(stack.pop())
+                stack.pop()
+                edits.append((match.start(), match.start(), ''.join(f"\\end{{{n}}}\n" for n in closing)))
+                fixes.append(f"补全了 {', '.join(closing)} 环境的 \\end")
+            else:
+                edits.append((match.start(), match.end(), ''))
+                fixes.append(f"删除了多余的 \\end{{{name}}}")
+
+        if stack:
+            closing = ''.join(f"\\end{{{name}}}\n" for name in reversed(stack) if name != 'document')
+            if 'document' in stack:
+                # \end{document} 缺失：补全剩余环境后追加
+                edits.append((len(latex_content), len(latex_content),
+                              '\n' + closing + '\\end{document}\n'))
+                fixes.append("补全了缺失的 \\end{document}")
+            elif closing:
+                edits.append((len(latex_content), len(latex_content), '\n' + closing))
+            if closing:
+                fixes.append("补全了未结束的环境")
+
+        for start, end, text in sorted(edits, reverse=True):
+            latex_content = latex_content[:start] + text + latex_content[end:]
+        return latex_content, fixes
+
+    def repair_quotes(self, latex_content):
+        """段内中文引号按“”交替重新排列，返回 (修复后的内容, 修改的段落数)"""
+        count = 0
+        paragraphs = re.split(r'(\n\s*\n)', latex_content)
+        for index, paragraph in enumerate(paragraphs):
+            quotes = re.sub(r'[^“”]', '', paragraph)
+            # 引号总数为奇数时无法确定缺少哪一个，交给调用方处理
+            if len(quotes) % 2:
+                continue
+            expected = ''.join('“”'[i % 2] for i in range(len(quotes)))
+            if quotes == expected:
+                continue
+            replacements = iter(expected)
+            paragraphs[index] = re.sub(r'[“”]', lambda _: next(replacements), paragraph)
+            count += 1
+        return ''.join(paragraphs), count
+
+    @staticmethod
+    def has_errors(issues):
+        return any(level == ERROR for level, _ in issues)
@@ -0,0 +1,211 @@
+import re
+
+# 学科 -> 样式文件中的环境名（顺序即 \homeworkrecord 的参数顺序）
+SUBJECT_ENVIRONMENTS = {
+    '拼音': 'pinyinbox',
+    '英语': 'englishbox',
+    '识字': 'hanzibox',
+    '数学': 'mathbox',
+}
+SUBJECTS = tuple(SUBJECT_ENVIRONMENTS)
+
+# 学科标题行，如 "拼音"、"【数学】"、"英语学习情况："
+_SUBJECT_PATTERN = re.compile(r'^[【\[]?(拼音|英语|识字|数学)(?:学习情况|学习反馈|学习|课堂|课)?[】\]]?[：:]?$')
+# 小节标题，如 "一、学习内容"、"三、温馨提示：……"
+_SECTION_PATTERN = re.compile(r'^([一二三])[、.．]\s*(学习内容|今日小任务|温馨提示)[：:]?\s*(.*)$')
+# 编号条目，如 "1. xxx"、"2、xxx"、"（3）xxx"
+_ITEM_PATTERN = re.compile(r'^(?:\d+[.、．)）]|[（(]\d+[)）])\s*(.+)$')
+# 子条目，如 "- xxx"、"• xxx"
+_SUBITEM_PATTERN = re.compile(r'^[-•·*]\s*(.+)$')
+# 学科标题之前允许出现的行（日期、总标题）
+_PREAMBLE_PATTERN = re.compile(r'^(?:\d{8}|(?:\d{4}年)?\d{1,2}月\d{1,2}日.*|.*学习反馈.*)$')
+
+_SECTION_KEYS = {'学习内容': 'content', '今日小任务': 'tasks', '温馨提示': 'tips'}
+
+_LATEX_SPECIALS = {
+    '\\': r'\textbackslash{}',
+    '&': r'\&',
+    '%': r'\%',
+    '$': r'\$',
+    '#': r'\#',
+    '_': r'\_',
+    '{': r'\{',
+    '}': r'\}',
+    '~': r'\textasciitilde{}',
+    '^': r'\textasciicircum{}',
+}
+_LATEX_SPECIAL_PATTERN = re.compile('|'.join(re.escape(char) for char in _LATEX_SPECIALS))
+
+
+def escape_latex(text):
+    """转义LaTeX特殊字符"""
+    return _LATEX_SPECIAL_PATTERN.sub(lambda match: _LATEX_SPECIALS[match.group(0)], text)
+
+
+def is_preamble_line(line):
+    """学科标题之前允许出现的行：空行、日期或总标题（不含需要生成的内容）"""
+    return not line.strip() or bool(_PREAMBLE_PATTERN.match(line.strip()))
+
+
+def split_subjects(input_text):
+    """按学科标题行拆分输入内容，返回 (学科标题之前的行, [(学科, 该学科的原始文本), ...])"""
+    leading = []
+    sections = []
+    current = None
+    for line in input_text.splitlines():
+        match = _SUBJECT_PATTERN.match(line.strip())
+        if match:
+            current = (match.group(1), [])
+            sections.append(current)
+        elif current is None:
+            leading.append(line)
+        else:
+            current[1].append(line)
+    return leading, [(subject, '\n'.join(lines).strip()) for subject, lines in sections]
+
+
+class LocalRenderer:
+    """本地解析结构规整的每日笔记并直接生成LaTeX，无法可靠解析时返回None（交给API处理）"""
+
+    def __init__(self, latex_config):
+        self.latex_config = latex_config
+
+    def parse_subject(self, text):
+        """解析单个学科的内容，返回 {'content': [...], 'tasks': [...], 'tips': [...]}，无法解析时返回None
+
+        content/tasks 中每个条目为 (正文, [子条目...], [续行...])。
+        """
+        parsed = {'content': [], 'tasks': [], 'tips': []}
+        section = None
+        for raw_line in text.splitlines():
+            line = raw_line.strip()
+            if not line:
+                continue
+
+            heading = _SECTION_PATTERN.match(line)
+            if heading:
+                section = _SECTION_KEYS[heading.group(2)]
+                inline = heading.group(3).strip()
+                if inline:
+                    # 只有温馨提示允许标题后直接跟正文
+                    if section != 'tips':
+                        return None
+                    parsed['tips'].append(inline)
+                continue
+
+            if section is None:
+                return None
+
+            if section == 'tips':
+                parsed['tips'].append(line)
+                continue
+
+            item = _ITEM_PATTERN.match(line)
+            subitem = _SUBITEM_PATTERN.match(line)
+            if item:
+                parsed[section].append((item.group(1).strip(), [], []))
+            elif subitem and parsed[section]:
+                parsed[section][-1][1].append(subitem.group(1).strip())
+            elif parsed[section] and not parsed[section][-1][1]:
+                # 条目的续行（如儿歌），在条目内换行显示
+                parsed[section][-1][2].append(line)
+            else:
+                return None
+
+        if not parsed['content']:
+            return None
+        return parsed
+
+    def parse(self, input_text):
+        """解析整篇笔记，返回 [(学科, 解析结果), ...]，无法可靠解析时返回None"""
+        leading, sections = split_subjects(input_text)
+        if not all(map(is_preamble_line, leading)):
+            return None
+        if not sections:
+            return None
+
+        seen = set()
+        result = []
+        for subject, text in sections:
+            if subject in seen:
+                return None
+            seen.add(subject)
+            parsed = self.parse_subject(text)
+            if parsed is None:
+                return None
+            result.append((subject, parsed))
+        return result
+
+    def render_item(self, text, subitems, continuation):
+        """渲染一个编号条目，"标签：正文" 形式的标签加粗"""
+        label, sep, rest = text.partition('：')
+        if sep and 0 < len(label) <= 15:
+            line = f"\\item \\textbf{{{escape_latex(label)}：}}{escape_latex(rest)}"
+        else:
+            line = f"\\item {escape_latex(text)}"
+        for extra in continuation:
+            line += f"\\\\\n{escape_latex(extra)}"
+        if subitems:
+            line += "\n\\begin{itemize}\n"
+            line += "\n".join(f"\\item {escape_latex(subitem)}" for subitem in subitems)
+            line += "\n\\end{itemize}"
+        return line
+
+    def render_list(self, items, separator="\n"):
+        body = separator.join(self.render_item(*item) for item in items)
+        return f"\\begin{{enumerate}}\n{body}\n\\end{{enumerate}}"
+
+    def render_box(self, subject, parsed):
+        """渲染一个学科框"""
+        environment = SUBJECT_ENVIRONMENTS[subject]
+        parts = [f"% {subject}学习反馈部分", f"\\begin{{{environment}}}", "\\par",
+                 "\\textbf{一、学习内容}", "", self.render_list(parsed['content'], "\n\n")]
+        if parsed['tasks']:
+            parts += ["", "\\textbf{二、今日小任务}", "", self.render_list(parsed['tasks'])]
+        if parsed['tips']:
+            tips = "\n\n".join(escape_latex(line) for line in parsed['tips'])
+            parts += ["", f"\\textbf{{三、温馨提示：}}{tips}"]
+        parts += ["", f"\\end{{{environment}}}"]
+        return "\n".join(parts)
+
+    def render_homework_argument(self, parsed):
+        """一个学科在 \\homeworkrecord 中的参数：今日小任务逐条换行"""
+        return "；\\\\".join(escape_latex(text) for text, _, _ in parsed['tasks'])
+
+    def render_homework(self, sections):
+        """根据各学科的今日小任务生成 \\homeworkrecord"""
+        return self.render_homework_record(
+            {subject: self.render_homework_argument(parsed) for subject, parsed in sections})
+
+    def render_homework_record(self, homework):
+        """按学科顺序拼接 \\homeworkrecord，homework 为 {学科: 参数}，缺少的学科为空"""
+        arguments = ''.join(f"{{{homework.get(subject, '')}}}" for subject in SUBJECTS)
+        return f"% 作业记录部分\n\\homeworkrecord{arguments}"
+
+    def render_document(self, date_str, boxes, homework):
+        """拼接完整文档"""
+        package = self.latex_config['style_file'].rsplit('.', 1)[0]
+        return "\n".join([
+            f"\\documentclass[a4paper, {self.latex_config['font_size']}]{{{self.latex_config['document_class']}}}",
+            f"\\usepackage{{{package}}}",
+            "",
+            "\\begin{document}",
+            "",
+            "% 标题部分",
+            f"\\dailytitle{{{date_str}}}",
+            "",
+            "\n\n".join(boxes),
+            "",
+            homework,
+            "",
+            "\\end{document}",
+            ""
+        ])
+
+    def render(self, input_text, date_str):
+        """解析并生成完整的LaTeX文档，无法可靠解析时返回None"""
+        sections = self.parse(input_text)
+        if sections is None:
+            return None
+        boxes = [self.render_box(subject, parsed) for subject, parsed in sections]
+        return self.render_document(date_str, boxes, self.render_homework(sections))
@@ -0,0 +1,107 @@
+import os
+import sqlite3
+import threading
+from datetime import datetime
+
+
+class ProcessingManifest:
+    """持久化处理清单（SQLite）：按日期记录输入哈希、提示词哈希、LaTeX哈希、PDF位置和状态
+
+    同时作为可恢复的任务队列：状态按阶段推进 queued → generated → compiled → done（已移动），
+    失败时记录失败的阶段和累计失败次数，下次从最后完成的阶段继续。
+    """
+
+    STATUS_QUEUED = 'queued'
+    STATUS_GENERATED = 'generated'
+    STATUS_COMPILED = 'compiled'
+    STATUS_DONE = 'done'
+    STATUS_FAILED = 'failed'
+
+    # 失败的阶段
+    STAGE_GENERATE = 'generate'
+    STAGE_COMPILE = 'compile'
+    STAGE_MOVE = 'move'
+
+    COLUMNS = ('date', 'input_path', 'input_mtime_ns', 'input_size', 'input_hash',
+               'prompt_hash', 'tex_hash', 'pdf_path', 'status', 'updated_at',
+               'failed_stage', 'retries')
+    # 后来增加的列，旧数据库打开时自动添加
+    _ADDED_COLUMNS = {'failed_stage': 'TEXT', 'retries': 'INTEGER DEFAULT 0'}
+
+    def __init__(self, db_path):
+        self.db_path = db_path
+        db_dir = os.path.dirname(db_path)
+        if db_dir:
+            os.makedirs(db_dir, exist_ok=True)
+
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(db_path, check_same_thread=False)
+        self._conn.row_factory = sqlite3.Row
+        with self._conn:
+            self._conn.execute("""
+                CREATE TABLE IF NOT EXISTS files (
+                    date TEXT PRIMARY KEY,
+                    input_path TEXT,
+                    input_mtime_ns INTEGER,
+                    input_size INTEGER,
+                    input_hash TEXT,
+                    prompt_hash TEXT,
+                    tex_hash TEXT,
+                    pdf_path TEXT,
+                    status TEXT,
+                    updated_at TEXT
+                )
+            """)
+            existing = {row['name'] for row in self._conn.execute("PRAGMA table_info(files)")}
+            for name, column_type in self._ADDED_COLUMNS.items():
+                if name not in existing:
+                    self._conn.execute(f"ALTER TABLE files ADD COLUMN {name} {column_type}")
+
+    def get(self, date):
+        """获取某个日期的记录，不存在时返回None"""
+        with self._lock:
+            row = self._conn.execute("SELECT * FROM files WHERE date = ?", (date,)).fetchone()
+        return dict(row) if row else None
+
+    def get_all(self):
+        """一次性读取全部记录，返回 {日期: 记录} 字典"""
+        with self._lock:
+            rows = self._conn.execute("SELECT * FROM files").fetchall()
+        return {row['date']: dict(row) for row in rows}
+
+    def update(self, date, **fields):
+        """插入或更新某个日期的记录，只修改给出的字段"""
+        unknown = set(fields) - set(self.COLUMNS)
+        if unknown:
+            raise ValueError(f"未知的清单字段: {', '.join(sorted(unknown))}")
+
+        fields['updated_at'] = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+        names = list(fields)
+        placeholders = ', '.join('?' for _ in names)
+        assignments = ', '.join(f"{name} = excluded.{name}" for name in names)
+        sql = (f"INSERT INTO files (date, {', '.join(names)}) VALUES (?, {placeholders}) "
+               f"ON CONFLICT(date) DO UPDATE SET {assignments}")
+        with self._lock, self._conn:
+            self._conn.execute(sql, [date] + [fields[name] for name in names])
+
+    def mark_failed(self, date, stage):
+        """记录某个阶段失败，累计失败次数"""
+        now = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT INTO files (date, status, failed_stage, retries, updated_at) VALUES (?, ?, ?, 1, ?) "
+                "ON CONFLICT(date) DO UPDATE SET status = excluded.status, failed_stage = excluded.failed_stage, "
+                "retries = COALESCE(retries, 0) + 1, updated_at = excluded.updated_at",
+                (date, self.STATUS_FAILED, stage, now))
+
+    def get_failed(self):
+        """所有失败的记录，按日期排序"""
+        with self._lock:
+            rows = self._conn.execute("SELECT * FROM files WHERE status = ? ORDER BY date",
+                                      (self.STATUS_FAILED,)).fetchall()
+        return [dict(row) for row in rows]
+
+    def close(self):
+        """关闭数据库连接"""
+        with self._lock:
+            self._conn.close()
@@ -0,0 +1,209 @@
+import contextvars
+import json
+import math
+import os
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime
+
+# 报告中各阶段的显示顺序
+STAGES = ('read', 'normalize', 'local', 'prompt', 'api', 'extract', 'validate', 'preview', 'compile', 'move')
+STAGE_NAMES = {
+    'read': '读取输入',
+    'normalize': '输入整理',
+    'local': '本地渲染',
+    'prompt': '生成提示词',
+    'api': 'API调用',
+    'extract': '提取LaTeX',
+    'validate': '编译前检查',
+    'preview': 'HTML预览',
+    'compile': '编译',
+    'move': '移动文件',
+}
+# 从API响应 usage 中累计的字段
+TOKEN_FIELDS = ('prompt_tokens', 'completion_tokens', 'prompt_cache_hit_tokens')
+
+
+class MetricsRecorder:
+    """按文件记录各阶段耗时和token用量，处理结束时以JSON行追加写入指标文件
+
+    API阶段在生成线程（或异步任务）内执行，通过上下文变量中的"当前记录"累计耗时和用量；
+    编译和移动阶段在主线程或编译进程中执行，按日期键找到对应记录。
+    """
+
+    def __init__(self, path, enabled=True):
+        self.path = path
+        self.enabled = enabled
+        self._lock = threading.Lock()
+        # 每个线程和每个asyncio任务各自的当前记录
+        self._current = contextvars.ContextVar(f'metrics_record_{id(self)}', default=None)
+        self._records = {}
+        self.batch_id = None
+        self.mode = None
+
+    def start_batch(self, mode):
+        """开始一个批次（批量运行、单个文件或一次监控检查）"""
+        self.mode = mode
+        self.batch_id = f"{datetime.now().strftime('%Y%m%d-%H%M%S')}-{mode}-{os.getpid()}"
+        return self.batch_id
+
+    def begin(self, date_key):
+        """开始记录一个文件，并设为当前线程（或异步任务）的记录"""
+        record = {
+            'batch': self.batch_id,
+            'mode': self.mode,
+            'date': date_key,
+            'started': time.time(),
+            'stages': {},
+            'tokens': {},
+            'api_calls': 0,
+        }
+        with self._lock:
+            self._records[date_key] = record
+        self._current.set(record)
+        return record
+
+    def current(self):
+        """当前线程（或异步任务）正在处理的文件记录，没有时返回None"""
+        return self._current.get()
+
+    def get(self, date_key):
+        with self._lock:
+            return self._records.get(date_key)
+
+    def add_time(self, stage, seconds, record=None):
+        """累计阶段耗时（同一阶段多次执行时相加；分块生成时多个线程写入同一记录）"""
+        record = record or self.current()
+        if record is not None:
+            with self._lock:
+                record['stages'][stage] = record['stages'].get(stage, 0.0) + seconds
+
+    @contextmanager
+    def stage(self, stage, record=None):
+        """计时上下文：with metrics.stage('read'): ..."""
+        start = time.monotonic()
+        try:
+            yield
+        finally:
+            self.add_time(stage, time.monotonic() - start, record)
+
+    def add_usage(self, usage):
+        """累计一次API调用的token用量"""
+        record = self.current()
+        if record is None:
+            return
+        with self._lock:
+            record['api_calls'] += 1
+            for field in TOKEN_FIELDS:
+                if usage and usage.get(field) is not None:
+                    record['tokens'][field] = record['tokens'].get(field, 0) + usage[field]
+
+    def add_hedge(self, info):
+        """累计一次对冲请求的额外token和估计节省的时间（未发出对冲请求时info为None）"""
+        record = self.current()
+        if record is None or not info:
+            return
+        with self._lock:
+            hedge = record.setdefault('hedge', {'requests': 0, 'wins': 0, 'extra_tokens': 0, 'saved_seconds': 0.0})
+            hedge['requests'] += 1
+            hedge['wins'] += int(info['won'])
+            hedge['extra_tokens'] += info['extra_tokens']
+            hedge['saved_seconds'] += info['saved_seconds']
+
+    def set(self, record=None, **fields):
+        """设置记录的附加字段（如页数、是否命中缓存）"""
+        record = record or self.current()
+        if record is not None:
+            record.update(fields)
+
+    def finish(self, date_key, status):
+        """结束记录并写入指标文件"""
+        with self._lock:
+            record = self._records.pop(date_key, None)
+        if record is None:
+            return
+        if self.current() is record:
+            self._current.set(None)
+
+        record['status'] = status
+        record['total'] = time.time() - record['started']
+        if not self.enabled:
+            return
+        try:
+            line = json.dumps(record, ensure_ascii=False) + '\n'
+            with self._lock:
+                os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+                with open(self.path, 'a', encoding='utf-8') as f:
+                    f.write(line)
+        except OSError as e:
+            print(f"写入指标文件时出错: {e}")
+
+
+def load_metrics(path):
+    """读取指标文件中的全部记录，忽略损坏的行"""
+    records = []
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            for line in f:
+                try:
+                    records.append(json.loads(line))
+                except ValueError:
+                    continue
+    except FileNotFoundError:
+        pass
+    return records
+
+
+def percentile(values, fraction):
+    """最近秩法计算分位数"""
+    values = sorted(values)
+    if not values:
+        return None
+    index = min(len(values) - 1, max(0, math.ceil(fraction * len(values)) - 1))
+    return values[index]
+
+
+def print_stats_report(records, batch_count=10):
+    """输出各阶段耗时的p50/p95，以及最近若干批次的汇总"""
+    if not records:
+        print("指标文件中没有记录")
+        return
+
+    print(f"共 {len(records)} 条文件记录\n")
+    print(f"{'阶段':<10}{'次数':>6}{'p50(秒)':>10}{'p95(秒)':>10}{'合计(秒)':>11}")
+    for stage in STAGES:
+        values = [r['stages'][stage] for r in records if stage in r.get('stages', {})]
+        if not values:
+            continue
+        print(f"{STAGE_NAMES[stage]:<10}{len(values):>6}{percentile(values, 0.5):>10.2f}"
+              f"{percentile(values, 0.95):>10.2f}{sum(values):>11.1f}")
+    totals = [r['total'] for r in records if 'total' in r]
+    if totals:
+        print(f"{'单文件总计':<10}{len(totals):>6}{percentile(totals, 0.5):>10.2f}"
+              f"{percentile(totals, 0.95):>10.2f}{sum(totals):>11.1f}")
+
+    batches = {}
+    for record in records:
+        batches.setdefault(record.get('batch'), []).append(record)
+    recent = sorted(batches.items(), key=lambda item: min(r['started'] for r in item[1]))[-batch_count:]
+
+    print(f"\n最近 {len(recent)} 个批次:")
+    for batch_id, items in recent:
+        wall = max(r['started'] + r.get('total', 0) for r in items) - min(r['started'] for r in items)
+        api_time = sum(r['stages'].get('api', 0) for r in items)
+        compile_time = sum(r['stages'].get('compile', 0) for r in items)
+        succeeded = sum(1 for r in items if r.get('status') in ('done', 'compiled'))
+        tokens = sum(sum(r.get('tokens', {}).get(field, 0) for field in ('prompt_tokens', 'completion_tokens'))
+                     for r in items)
+        pages = sum(r.get('pages') or 0 for r in items)
+        bottleneck = 'API' if api_time >= compile_time else '编译'
+        line = (f"  {batch_id}: {succeeded}/{len(items)} 个文件成功，耗时 {wall:.1f} 秒，"
+                f"API {api_time:.1f} 秒（{sum(r.get('api_calls', 0) for r in items)} 次，{tokens} tokens），"
+                f"编译 {compile_time:.1f} 秒（{pages} 页），主要耗时: {bottleneck}")
+        hedges = [r['hedge'] for r in items if r.get('hedge')]
+        if hedges:
+            line += (f"，对冲 {sum(h['requests'] for h in hedges)} 次（胜出 {sum(h['wins'] for h in hedges)} 次，"
+                     f"额外约 {sum(h['extra_tokens'] for h in hedges)} tokens，"
+                     f"估计节省 {sum(h['saved_seconds'] for h in hedges):.1f} 秒）")
+        print(line)
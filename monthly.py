@@ -0,0 +1,185 @@
+import json
+import os
+import re
+import shutil
+import subprocess
+
+from cache_store import hash_text
+from manifest import ProcessingManifest
+
+# 汇总文档：目录 + 按日期依次插入每天的PDF
+COMPENDIUM_TEMPLATE = r"""\documentclass[a4paper]{article}
+\usepackage[UTF8]{ctex}
+\usepackage{pdfpages}
+\usepackage[hidelinks]{hyperref}
+
+\title{%(title)s}
+\date{}
+
+\begin{document}
+
+\maketitle
+\tableofcontents
+\clearpage
+
+%(pages)s
+
+\end{document}
+"""
+
+
+def file_hash(path):
+    """文件内容的SHA-256摘要"""
+    with open(path, 'rb') as f:
+        return hash_text(f.read())
+
+
+class MonthlyCompendium:
+    """按月汇总每日PDF：目录 + pdfpages 插入已编译的每日PDF
+
+    每日PDF按内容哈希复制到汇总的构建目录，只有新增或变化的日期才重新复制；
+    汇总源文件和所有每日PDF都未变化时不再运行xelatex。
+    """
+
+    def __init__(self, generator, month):
+        if not re.fullmatch(r'\d{6}', month or '') or not 1 <= int(month[4:]) <= 12:
+            raise ValueError(f"月份格式应为YYYYMM: {month}")
+        self.generator = generator
+        self.month = month
+        self.year_num = int(month[:4])
+        self.month_num = int(month[4:])
+        self.title = f"{self.year_num}年{self.month_num}月幼小衔接"
+        self.build_dir = os.path.join(generator.cache_dir, 'monthly', month)
+        self.state_path = os.path.join(generator.state_dir, 'monthly', f"{month}.json")
+
+    @property
+    def output_path(self):
+        """汇总PDF的目标路径"""
+        return os.path.join(self.generator.target_dir, "4-月度汇总", f"{self.title}.pdf")
+
+    def process_pending_inputs(self):
+        """先处理本月尚未处理或有变化的输入文件"""
+        records = self.generator.manifest.get_all()
+        pending = [path for path in self.generator.find_input_files(f"{self.month}01", f"{self.month}31")
+                   if self.generator.needs_processing(path, records.get(self.generator.get_date_key(path)))]
+        if pending:
+            print(f"本月有 {len(pending)} 个输入文件需要先生成每日PDF")
+            self.generator.process_files(pending, mode='monthly')
+
+    def collect_days(self):
+        """从处理清单中收集本月已完成的日期，返回 [(日期, PDF路径), ...]"""
+        days = []
+        for date, record in sorted(self.generator.manifest.get_all().items()):
+            if not date.startswith(self.month) or record['status'] != ProcessingManifest.STATUS_DONE:
+                continue
+            pdf_path = record['pdf_path']
+            if pdf_path and os.path.exists(pdf_path):
+                days.append((date, pdf_path))
+            else:
+                print(f"警告: {date} 的PDF不存在，未加入汇总: {pdf_path}")
+        return days
+
+    def load_state(self):
+        try:
+            with open(self.state_path, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def save_state(self, state):
+        os.makedirs(os.path.dirname(self.state_path), exist_ok=True)
+        with open(self.state_path, 'w', encoding='utf-8') as f:
+            json.dump(state, f, ensure_ascii=False, indent=2)
+
+    def sync_pdfs(self, days, previous_hashes):
+        """把每日PDF复制到构建目录，只复制新增或内容变化的日期，返回 {日期: 哈希}"""
+        os.makedirs(self.build_dir, exist_ok=True)
+        hashes = {}
+        changed = []
+        for date, pdf_path in days:
+            digest = file_hash(pdf_path)
+            hashes[date] = digest
+            local_path = os.path.join(self.build_dir, f"{date}.pdf")
+            if previous_hashes.get(date) != digest or not os.path.exists(local_path):
+                shutil.copyfile(pdf_path, local_path)
+                changed.append(date)
+
+        # 删除已不在本月汇总中的日期
+        for date in set(previous_hashes) - set(hashes):
+            local_path = os.path.join(self.build_dir, f"{date}.pdf")
+            if os.path.exists(local_path):
+                os.remove(local_path)
+
+        print(f"本月共 {len(hashes)} 天，新增或变化 {len(changed)} 天"
+              + (f": {', '.join(changed)}" if changed else ""))
+        return hashes
+
+    def render(self, days):
+        """生成汇总文档的LaTeX源文件"""
+        pages = []
+        for date, _ in days:
+            title = self.generator.extract_date_from_filename(date)
+            pages.append(f"\\includepdf[pages=-,addtotoc={{1,section,1,{{{title}}},day{date}}}]{{{date}.pdf}}")
+        return COMPENDIUM_TEMPLATE % {'title': self.title, 'pages': "\n".join(pages)}
+
+    def read_toc(self):
+        toc_path = os.path.join(self.build_dir, f"{self.month}.toc")
+        try:
+            with open(toc_path, 'r', encoding='utf-8') as f:
+                return f.read()
+        except OSError:
+            return None
+
+    def compile(self, tex_path):
+        """编译汇总文档：目录内容变化时再编译一次，返回是否成功"""
+        for attempt in range(2):
+            toc_before = self.read_toc()
+            result = self.generator.run_xelatex(tex_path, self.build_dir)
+            if result.returncode != 0:
+                print(f"月度汇总编译失败，返回码: {result.returncode}")
+                if result.stderr:
+                    print(f"错误输出: {result.stderr}")
+                return False
+            if self.read_toc() == toc_before:
+                break
+        return True
+
+    def build(self):
+        """生成或更新月度汇总PDF，返回是否成功"""
+        print(f"生成月度汇总: {self.title}")
+        self.process_pending_inputs()
+
+        days = self.collect_days()
+        if not days:
+            print(f"{self.title}: 没有已完成的每日PDF")
+            return False
+
+        state = self.load_state()
+        hashes = self.sync_pdfs(days, state.get('days', {}))
+        latex_content = self.render(days)
+        merge_key = hash_text(latex_content, json.dumps(hashes, sort_keys=True))
+
+        if state.get('key') == merge_key and os.path.exists(self.output_path):
+            print(f"月度汇总未变化，跳过编译: {self.output_path}")
+            return True
+
+        tex_path = os.path.abspath(os.path.join(self.build_dir, f"{self.month}.tex"))
+        with open(tex_path, 'w', encoding='utf-8') as f:
+            f.write(latex_content)
+
+        try:
+            compiled = self.compile(tex_path)
+        except FileNotFoundError:
+            print("错误: 未找到xelatex命令，请确保LaTeX环境已安装")
+            return False
+        except subprocess.TimeoutExpired:
+            print(f"xelatex 超过 {self.generator.compile_timeout} 秒未结束，已终止")
+            return False
+        if not compiled:
+            return False
+
+        os.makedirs(os.path.dirname(self.output_path), exist_ok=True)
+        shutil.copyfile(os.path.join(self.build_dir, f"{self.month}.pdf"), self.output_path)
+        self.save_state({'days': hashes, 'key': merge_key})
+        print(f"月度汇总已生成: {self.output_path}")
+        return True
@@ -0,0 +1,121 @@
+import multiprocessing
+import os
+import queue
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+
+from manifest import ProcessingManifest
+
+# 编译进程内复用的生成器实例
+_worker_generator = None
+
+
+def _init_compile_worker(config_file, compile_settings):
+    """初始化编译进程，每个进程只加载一次配置，并应用主进程的命令行覆盖（如 --no-cache）"""
+    global _worker_generator
+    from latex_generator import LatexGenerator
+    _worker_generator = LatexGenerator(config_file)
+    _worker_generator.apply_compile_settings(compile_settings)
+
+
+def _compile_in_worker(latex_file_path):
+    """在编译进程中运行xelatex，返回 (是否成功, 编译信息)"""
+    compiled = _worker_generator.compile_latex_file(latex_file_path)
+    return compiled, _worker_generator.last_compile_info
+
+
+class BatchPipeline:
+    """分阶段处理流水线：API调用线程池 → 队列 → xelatex编译进程池 → 文件移动"""
+
+    # 每个文件的最终状态
+    STATUS_SUCCESS = "成功"
+    STATUS_GENERATE_FAILED = "生成失败"
+    STATUS_COMPILE_FAILED = "编译失败"
+    STATUS_MOVE_FAILED = "成功（文件移动失败）"
+
+    def __init__(self, generator, api_jobs=1, compile_jobs=1):
+        self.generator = generator
+        self.api_jobs = max(1, int(api_jobs))
+        self.compile_jobs = max(1, int(compile_jobs))
+
+    def _generate(self, input_file_path, events):
+        """API阶段：生成LaTeX源文件，并把结果放入事件队列"""
+        try:
+            latex_file_path = self.generator.prepare_latex_for_file(input_file_path)
+        except Exception as e:
+            print(f"生成LaTeX时出错 ({os.path.basename(input_file_path)}): {e}")
+            latex_file_path = None
+        events.put(('generated', input_file_path, latex_file_path))
+
+    def run(self, input_files):
+        """运行流水线，返回 {输入文件: 状态} 字典"""
+        print(f"启用流水线模式: API并发 {self.api_jobs}，编译并发 {self.compile_jobs}")
+
+        results = {}
+        events = queue.Queue()
+
+        with ThreadPoolExecutor(max_workers=self.api_jobs) as api_pool, \
+             ProcessPoolExecutor(max_workers=self.compile_jobs,
+                                 # 主进程此时已有API线程和打开的SQLite连接，fork出的子进程会继承其锁状态
+                                 mp_context=multiprocessing.get_context('spawn'),
+                                 initializer=_init_compile_worker,
+                                 initargs=(self.generator.config_manager.config_file,
+                                           self.generator.get_compile_settings())) as compile_pool:
+
+            for input_file_path in input_files:
+                api_pool.submit(self._generate, input_file_path, events)
+
+            # 主线程消费事件：生成完成后提交编译，编译完成后移动文件
+            while len(results) < len(input_files):
+                event = events.get()
+
+                if event[0] == 'generated':
+                    _, input_file_path, latex_file_path = event
+                    if not latex_file_path:
+                        results[input_file_path] = self.STATUS_GENERATE_FAILED
+                        continue
+
+                    future = compile_pool.submit(_compile_in_worker, latex_file_path)
+                    future.add_done_callback(
+                        lambda f, i=input_file_path, l=latex_file_path: events.put(('compiled', i, l, f))
+                    )
+
+                elif event[0] == 'compiled':
+                    _, input_file_path, latex_file_path, future = event
+                    compile_info = None
+                    try:
+                        compiled, compile_info = future.result()
+                        # 编译缓存统计发生在子进程中，在主进程中汇总
+                        if compile_info and not compile_info.get('resumed'):
+                            self.generator.compile_cache.count(compile_info['cache_hit'])
+                            if compile_info.get('stored'):
+                                self.generator.compile_cache.count_store()
+                    except Exception as e:
+                        print(f"编译进程出错 ({os.path.basename(latex_file_path)}): {e}")
+                        compiled = False
+
+                    if not self.generator.complete_latex_for_file(input_file_path, latex_file_path,
+                                                                  compiled, compile_info):
+                        results[input_file_path] = self.STATUS_COMPILE_FAILED
+                    elif self.is_moved(input_file_path):
+                        results[input_file_path] = self.STATUS_SUCCESS
+                    else:
+                        results[input_file_path] = self.STATUS_MOVE_FAILED
+
+        self.print_summary(results)
+        return results
+
+    def is_moved(self, input_file_path):
+        """根据处理清单判断文件是否已移动到目标目录"""
+        record = self.generator.manifest.get(self.generator.get_date_key(input_file_path))
+        return bool(record) and record['status'] == ProcessingManifest.STATUS_DONE
+
+    def print_summary(self, results):
+        """按文件名顺序输出处理结果汇总"""
+        print("\n流水线处理结果:")
+        for input_file_path in sorted(results):
+            print(f"  {os.path.basename(input_file_path)}: {results[input_file_path]}")
+
+    @classmethod
+    def is_success(cls, status):
+        """编译成功即视为处理成功（与逐个处理模式一致）"""
+        return status in (cls.STATUS_SUCCESS, cls.STATUS_MOVE_FAILED)
@@ -0,0 +1,180 @@
+import re
+
+# 样式文件中的定义
+_PACKAGE_PATTERN = re.compile(r'\\RequirePackage(?:\[[^\]]*\])?\{([^}]+)\}')
+_DEFINITION_PATTERN = re.compile(r'\\new(environment|command)\{\\?(\w+)\}(?:\[(\d)\])?')
+# 环境标题，如 \color{pinyintitle}拼音学习情况\\
+_TITLE_PATTERN = re.compile(r'\\color\{\w+\}([^\\\s{}]+)\\\\')
+# 命令参数说明，如 \textbf{拼音作业：}\uline{#1}
+_ARGUMENT_LABEL_PATTERN = re.compile(r'\\textbf\{([^{}：]+)：\}\s*(?:\\uline\{)?#(\d)')
+
+
+def extract_style_definitions(style_content):
+    """提取样式文件中定义的环境名和命令名，返回 (环境集合, 命令集合)"""
+    environments = set()
+    commands = set()
+    for kind, name, _ in _DEFINITION_PATTERN.findall(style_content):
+        (environments if kind == 'environment' else commands).add(name)
+    return environments, commands
+
+
+def extract_style_digest(style_content, style_file='xydailystudy.sty'):
+    """从样式文件中提取环境和命令的精简摘要，用于代替完整样式文件发送给模型"""
+    packages = []
+    for match in _PACKAGE_PATTERN.finditer(style_content):
+        packages.extend(name.strip() for name in match.group(1).split(','))
+
+    definitions = list(_DEFINITION_PATTERN.finditer(style_content))
+    environments = []
+    commands = []
+    for index, match in enumerate(definitions):
+        kind, name, arg_count = match.groups()
+        end = definitions[index + 1].start() if index + 1 < len(definitions) else len(style_content)
+        body = style_content[match.end():end]
+
+        if kind == 'environment':
+            title = _TITLE_PATTERN.search(body)
+            line = f"\\begin{{{name}}} ... \\end{{{name}}}"
+            if title:
+                line += f"  % {title.group(1)}框"
+            environments.append(line)
+        else:
+            count = int(arg_count or 0)
+            line = f"\\{name}" + ''.join(f"{{#{i}}}" for i in range(1, count + 1))
+            labels = {int(number): label for label, number in _ARGUMENT_LABEL_PATTERN.findall(body)}
+            notes = [f"#{number} {label}" for number, label in sorted(labels.items())]
+            if '\\detokenize{#' in body:
+                notes.append("空参数的项目不显示")
+            if notes:
+                line += "  % " + "，".join(notes)
+            commands.append(line)
+
+    lines = [f"% {style_file} 摘要（文档中使用 \\usepackage{{{style_file.rsplit('.', 1)[0]}}} 加载）"]
+    if packages:
+        lines.append("% 已加载的宏包: " + ", ".join(packages))
+    lines.append("% 环境:")
+    lines.extend(environments)
+    lines.append("% 命令:")
+    lines.extend(commands)
+    return "\n".join(lines)
+
+
+class PromptBuilder:
+    """生成前缀稳定的提示词：系统消息、规则、样式、示例在前，当天的日期和输入内容在后
+
+    前缀只依赖样式文件、示例文件和配置，逐字节不变，便于API服务端的前缀（上下文）缓存命中。
+    """
+
+    SYSTEM_MESSAGE = "你是一个专业的LaTeX文档生成助手，擅长将学习反馈内容转换为结构化的LaTeX文档。请确保生成的LaTeX代码可以直接编译。"
+
+    def __init__(self, latex_config, prompt_config=None, normalizer=None):
+        self.latex_config = latex_config
+        self.prompt_config = prompt_config or {}
+        # full: 发送完整样式文件；digest: 只发送环境和命令摘要
+        self.style_mode = self.prompt_config.get('style_mode', 'full')
+        # 输入已在本地整理（InputNormalizer）时，不再要求模型处理引号和标点
+        self.normalizer = normalizer
+
+    def render_input_rule(self):
+        """关于整理输入内容的要求"""
+        if self.normalizer is None or not self.normalizer.enabled:
+            return "对输入内容整理，确保通顺、没有错别字，并注意区分汉字和英文引号格式，并确保是引号一对，而不是””(全部左引号) 或““（全部右引号）"
+        if self.normalizer.escape_enabled:
+            return "输入内容的引号、标点已整理，LaTeX特殊字符已转义（如\\%），请原样使用，只修正明显的错别字"
+        return "输入内容的引号、标点已整理，请原样使用，只修正明显的错别字"
+
+    def render_style_section(self, style_content):
+        """样式部分：完整样式文件或摘要"""
+        style_file = self.latex_config['style_file']
+        if self.style_mode == 'digest':
+            return f"样式文件摘要 ({style_file})：\n{extract_style_digest(style_content, style_file)}"
+        return f"样式文件内容 ({style_file})：\n{style_content}"
+
+    def render_prefix(self, style_content, example_content, example_file):
+        """渲染与当天输入无关的提示词前缀"""
+        return f"""请基于本消息末尾给出的日期和输入内容生成一个完整的LaTeX文档。
+
+要求：
+0. {self.render_input_rule()}
+1. 根据整理后的内容生成完整的LaTeX文档，使用{self.latex_config['document_class']}文档类
+2. 使用提供的样式文件格式和命令
+3. 将"今日小任务"等课后作业要求内容复制一份，放到作业记录部分
+4. 保持与示例相同的结构和格式
+5. 日期使用末尾给出的日期，写在\\dailytitle中
+6. 只显示有内容的作业项目，使用\\homeworkrecord命令
+7. 确保生成的LaTeX代码可以直接编译，不要包含任何解释文本
+8. 记得在\\begin{{mathbox}}等下一行段首加上\\par,确保首行缩进。
+
+请直接输出完整的LaTeX代码，包含\\documentclass和\\begin{{document}}...\\end{{document}}。
+
+{self.render_style_section(style_content)}
+
+示例文件内容 ({example_file})：
+{example_content}
+"""
+
+    def render_day(self, input_text, date_str):
+        """渲染当天的可变部分"""
+        return f"""
+========== 今日内容 ==========
+日期：{date_str}
+
+输入内容：
+{input_text}
+"""
+
+    def build(self, prefix, input_text, date_str):
+        """拼接完整的用户提示词"""
+        return prefix + self.render_day(input_text, date_str)
+
+    def render_repair(self, latex_content, issues):
+        """针对静态检查发现的问题生成修复请求，只附带文档本身，不重复发送样式和示例"""
+        problems = "\n".join(f"- {message}" for _, message in issues)
+        return f"""下面的LaTeX文档（使用{self.latex_config['style_file']}样式文件）在编译前检查中发现以下问题：
+{problems}
+
+请只修正这些问题，不要改动其他内容，直接输出修正后的完整LaTeX代码，不要包含任何解释文本。
+
+{latex_content}
+"""
+
+    def render_fragment_rules(self, environment, reference):
+        """学科框片段请求的要求：只输出一个环境和作业参数"""
+        return f"""要求：
+1. {self.render_input_rule()}
+2. 只输出 \\begin{{{environment}}} ... \\end{{{environment}}} 这一个环境，{reference}，\\begin{{{environment}}}下一行段首加上\\par
+3. 最后单独一行输出 \\homework{{...}}，内容为该学科"今日小任务"等课后作业（多条之间用"；\\\\"分隔），没有作业时输出 \\homework{{}}
+4. 不要输出文档的其他部分，不要包含任何解释文本"""
+
+    def render_section(self, style_content, subject, environment, old_box, old_homework, input_text, date_str):
+        """只重新生成一个学科框的请求：附带该学科上次生成的LaTeX作为格式参考，样式只发送摘要"""
+        style_file = self.latex_config['style_file']
+        return f"""{date_str}的学习反馈中，只有"{subject}"部分的输入内容有修改。请根据修改后的输入内容重新生成该学科的LaTeX框。
+
+{self.render_fragment_rules(environment, "保持与上次生成内容相同的结构和格式")}
+
+{extract_style_digest(style_content, style_file)}
+
+上次生成的{subject}部分：
+{old_box}
+\\homework{{{old_homework}}}
+
+修改后的{subject}输入内容：
+{input_text}
+"""
+
+    def render_chunk(self, style_content, subject, environment, example_box, input_text, date_str):
+        """分块生成中一个学科框的请求：以示例文件中的学科框作为格式参考，样式只发送摘要"""
+        style_file = self.latex_config['style_file']
+        return f"""请根据{date_str}学习反馈中"{subject}"部分的输入内容生成该学科的LaTeX框（其他学科另行生成，之后拼接成完整文档）。
+
+{self.render_fragment_rules(environment, "结构和格式参考下面的示例")}
+
+{extract_style_digest(style_content, style_file)}
+
+格式示例：
+{example_box}
+
+{subject}输入内容：
+{input_text}
+"""
@@ -0,0 +1,85 @@
+import os
+import threading
+
+from cache_store import hash_text
+
+
+class ResourceManager:
+    """资源文件缓存：每个进程只读取一次，文件修改（mtime/大小变化）后自动重新加载"""
+
+    def __init__(self, resource_path):
+        self.resource_path = resource_path
+        self._lock = threading.Lock()
+        # 文件名 -> (mtime_ns, size, 内容, 哈希)
+        self._entries = {}
+        # 目标文件路径 -> 已同步内容的哈希
+        self._synced = {}
+
+    def _load(self, filename):
+        """读取资源文件，未变化时直接返回缓存条目"""
+        file_path = os.path.join(self.resource_path, filename)
+        try:
+            stat = os.stat(file_path)
+        except FileNotFoundError:
+            print(f"资源文件未找到: {file_path}")
+            return None
+
+        with self._lock:
+            entry = self._entries.get(filename)
+            if entry and entry[0] == stat.st_mtime_ns and entry[1] == stat.st_size:
+                return entry
+
+        try:
+            with open(file_path, 'r', encoding='utf-8') as f:
+                content = f.read()
+        except Exception as e:
+            print(f"读取资源文件时出错: {e}")
+            return None
+
+        entry = (stat.st_mtime_ns, stat.st_size, content, hash_text(content))
+        with self._lock:
+            old_entry = self._entries.get(filename)
+            self._entries[filename] = entry
+        if old_entry and old_entry[3] != entry[3]:
+            print(f"资源文件已更新，重新加载: {filename}")
+        return entry
+
+    def get(self, filename):
+        """获取资源文件内容"""
+        entry = self._load(filename)
+        return entry[2] if entry else None
+
+    def get_hash(self, filename):
+        """获取资源文件内容的哈希"""
+        entry = self._load(filename)
+        return entry[3] if entry else None
+
+    def sync_file(self, filename, target_dir):
+        """将资源文件复制到目标目录，仅在内容哈希变化时写入"""
+        entry = self._load(filename)
+        if not entry:
+            return False
+
+        target_path = os.path.join(target_dir, filename)
+        with self._lock:
+            if self._synced.get(target_path) == entry[3] and os.path.exists(target_path):
+                return True
+
+        # 首次同步时比较目标文件已有内容，相同则不写入
+        existing_hash = None
+        if os.path.exists(target_path):
+            try:
+                with open(target_path, 'r', encoding='utf-8') as f:
+                    existing_hash = hash_text(f.read())
+            except Exception:
+                existing_hash = None
+
+        if existing_hash != entry[3]:
+            os.makedirs(target_dir, exist_ok=True)
+            with open(target_path, 'w', encoding='utf-8') as f:
+                f.write(entry[2])
+            print(f"样式文件已保存: {target_path}")
+
+        with self._lock:
+            self._synced[target_path] = entry[3]
+        return True
@@ -0,0 +1,23 @@
+import os
+
+from input_index import InputIndex
+
+
+def touch(root, relative_path):
+    path = os.path.join(root, relative_path)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    open(path, 'w').close()
+    return path
+
+
+def test_duplicate_dates_resolve_to_one_path(tmp_path, capsys):
+    root = str(tmp_path)
+    top = touch(root, '20250925.txt')
+    nested = touch(root, 'b/20250925.txt')
+    first = touch(root, 'a/20250926.txt')
+    second = touch(root, 'b/20250926.txt')
+    index = InputIndex(root)
+
+    assert index.find() == [top, first]
+    assert "20250925" in capsys.readouterr().out
+    assert index.accepts(first) and not index.accepts(second) and not index.accepts(nested)
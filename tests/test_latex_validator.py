@@ -0,0 +1,49 @@
+from latex_validator import ERROR, WARNING, LatexValidator
+
+STYLE = r"""
+\newenvironment{pinyinbox}{}{}
+\newcommand{\dailytitle}[1]{#1}
+"""
+
+
+def make_document(body):
+    return "\\documentclass{article}\n\\usepackage{xydailystudy}\n" + body
+
+
+def test_table_and_document_definitions_are_known():
+    validator = LatexValidator(STYLE)
+    latex_content = make_document(r"""\newcommand{\score}[1]{\textbf{#1}}
+\def\goodmark{$\bigstar$}
+\newenvironment{note}{\par}{\par}
+
+\begin{document}
+\dailytitle{2025年9月24日}
+\begin{tabular}{|c|c|}
+\hline
+拼音 & \score{优} \\
+\hline
+\textcircled{1} & \goodmark \\
+\hline
+\end{tabular}
+\begin{note}
+认真听讲
+\end{note}
+\end{document}
+""")
+    assert validator.check(latex_content) == []
+
+
+def test_unknown_macro_is_warning_only():
+    validator = LatexValidator(STYLE)
+    issues = validator.check(make_document("\\begin{document}\n\\unknownmacro{x}\n\\end{document}\n"))
+    assert [level for level, _ in issues] == [WARNING]
+    assert not validator.has_errors(issues)
+
+
+def test_structural_faults_are_errors():
+    validator = LatexValidator(STYLE)
+    issues = validator.check(make_document("\\begin{pinyinbox}\n\\textbf{a\n\\end{document}\n"))
+    assert validator.has_errors(issues)
+    messages = [message for level, message in issues if level == ERROR]
+    assert any("\\begin{document}" in message for message in messages)
+    assert any("未闭合" in message for message in messages)
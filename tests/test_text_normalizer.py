@@ -0,0 +1,20 @@
+from text_normalizer import InputNormalizer
+
+
+def test_space_separated_character_list_is_kept():
+    text, report = InputNormalizer().normalize("认读生字：大 小 多 少 上 下\n")
+    assert text == "认读生字：大 小 多 少 上 下\n"
+    assert report['whitespace'] == 0
+
+
+def test_spaces_next_to_full_width_punctuation_are_removed():
+    text, _ = InputNormalizer().normalize("今天 ， 认读了 大 小 。\n")
+    assert text == "今天，认读了 大 小。\n"
+
+
+def test_normalize_is_idempotent():
+    normalizer = InputNormalizer()
+    text, _ = normalizer.normalize("识字\n一、学习内容\n1. 生字：日 月 水 火 ,  会认读 ...\n")
+    again, report = normalizer.normalize(text)
+    assert again == text
+    assert not any(report[field] for field in ('quotes', 'punctuation', 'width', 'whitespace'))
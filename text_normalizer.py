@@ -0,0 +1,172 @@
+import re
+
+from local_renderer import escape_latex
+
+# 汉字，以及可以与汉字直接相邻的全角标点
+_CJK = '\u3400-\u4dbf\u4e00-\u9fff'
+_CJK_PUNCTUATION = '，。；：？！、（）“”‘’《》【】…—'
+_CJK_PATTERN = re.compile(f'[{_CJK}]')
+
+# 行首的编号（"一. 学习内容"、"1. xxx"），其中的半角标点不转换
+_MARKER_PATTERN = re.compile(r'^\s*(?:[一二三四五六七八九十]+|\d+)[.、．]')
+# 汉字之后的半角标点（连续的逐个转换，重复的逗号、分号之后再合并）
+_HALF_PUNCTUATION = {',': '，', ';': '；', ':': '：', '?': '？', '!': '！'}
+_HALF_PUNCTUATION_PATTERN = re.compile(f'(?<=[{_CJK}”’）]) *([,;:?!]+)')
+# 汉字之后、行尾或汉字之前的句点
+_PERIOD_PATTERN = re.compile(f'(?<=[{_CJK}”’）])\\.(?!\\.)(?=$|\\s|[{_CJK}])')
+# 汉字之后的省略号：... / 。。。 / 单个…
+_ELLIPSIS_PATTERN = re.compile(f'(?<=[{_CJK}])(?:\\.{{3,}}|。{{3,}}|…(?!…)|……)')
+# 内容含汉字的半角括号
+_PARENTHESES_PATTERN = re.compile(f'\\(([^()\\n]*[{_CJK}][^()\\n]*)\\)')
+# 重复的逗号、句号、分号、顿号
+_REPEATED_PATTERN = re.compile(r'([，。；、])\1+')
+
+# 全角标点前后的空格（汉字之间的空格保留：识字笔记中的生字表常用空格分隔，如"大 小 多 少"）
+_PUNCTUATION_SPACE_PATTERN = re.compile(f' +(?=[{_CJK_PUNCTUATION}])|(?<=[{_CJK_PUNCTUATION}]) +')
+_REPEATED_SPACE_PATTERN = re.compile(r'(?<=\S)[ \t]{2,}|(?<=\S)\t')
+_SPACE_CHAR_PATTERN = re.compile('[\u3000\u00a0]')
+# 需要转义的LaTeX特殊字符
+_LATEX_SPECIAL_PATTERN = re.compile(r'[\\&%$#_{}~^]')
+# 全角字母数字 -> 半角
+_FULL_WIDTH_PATTERN = re.compile('[０-９Ａ-Ｚａ-ｚ]')
+
+_DOUBLE_QUOTES = '"“”＂'
+_SINGLE_QUOTES = '‘’'
+
+# 报告中各项的显示顺序和名称
+REPORT_FIELDS = (('quotes', '引号'), ('punctuation', '标点'), ('width', '全角字符'), ('whitespace', '空白'))
+
+
+def pair_quotes(line, quote_chars, open_quote, close_quote, keep_ascii=False):
+    """按出现顺序两两配对行内的引号，返回 (新的行, 修改的字符数)；引号数为奇数时不修改并返回None
+
+    keep_ascii 时两侧和内容都不含汉字的半角引号（英文句子中的引号）保持不变。
+    """
+    positions = [index for index, char in enumerate(line) if char in quote_chars]
+    if len(positions) % 2:
+        return line, None
+    chars = list(line)
+    changed = 0
+    for start, end in zip(positions[::2], positions[1::2]):
+        if keep_ascii and line[start] == line[end] == '"' and \
+                not _CJK_PATTERN.search(line[max(start - 1, 0):end + 2]):
+            continue
+        for index, quote in ((start, open_quote), (end, close_quote)):
+            if chars[index] != quote:
+                chars[index] = quote
+                changed += 1
+    return ''.join(chars), changed
+
+
+def count_substitutions(pattern, replacement, text):
+    """re.subn，只统计实际改变了文字的替换"""
+    changed = 0
+
+    def substitute(match):
+        nonlocal changed
+        result = match.expand(replacement) if isinstance(replacement, str) else replacement(match)
+        if result != match.group(0):
+            changed += 1
+        return result
+    return pattern.sub(substitute, text), changed
+
+
+class InputNormalizer:
+    """生成提示词前在本地整理输入文本：引号配对、全角/半角标点和空白规范化，提示词中的LaTeX特殊字符转义
+
+    整理结果是确定的，同样的笔记总是得到同样的提示词，模型也不必再处理这些格式问题。
+    """
+
+    def __init__(self, config=None):
+        config = config or {}
+        self.enabled = config.get('enabled', True)
+        self.escape_enabled = config.get('escape_latex', True)
+
+    def normalize(self, text):
+        """整理输入文本，返回 (整理后的文本, 报告)
+
+        报告为 {'quotes': n, 'punctuation': n, 'width': n, 'whitespace': n, 'unpaired': [行号...]}。
+        """
+        report = {field: 0 for field, _ in REPORT_FIELDS}
+        report['unpaired'] = []
+        if not self.enabled:
+            return text, report
+
+        source = text.replace('\r\n', '\n').replace('\r', '\n')
+        if source != text:
+            report['whitespace'] += 1
+
+        lines = []
+        for number, line in enumerate(source.split('\n'), 1):
+            lines.append(self.normalize_line(line, number, report))
+
+        text = '\n'.join(lines)
+        text, changed = count_substitutions(re.compile(r'\n{3,}'), '\n\n', text)
+        report['whitespace'] += changed
+        if text.startswith('\n') or text.endswith('\n\n'):
+            report['whitespace'] += 1
+        return text.strip('\n') + '\n', report
+
+    def normalize_line(self, line, number, report):
+        """整理一行文字，修改次数累计到报告中"""
+        # 全角空格、不换行空格、行内连续空白和行尾空白（保留行首缩进）
+        line, whitespace = count_substitutions(_SPACE_CHAR_PATTERN, ' ', line)
+        if line.rstrip() != line:
+            line = line.rstrip()
+            whitespace += 1
+        indent = line[:len(line) - len(line.lstrip())]
+        body, changed = count_substitutions(_REPEATED_SPACE_PATTERN, ' ', line[len(indent):])
+        report['whitespace'] += whitespace + changed
+
+        body, changed = count_substitutions(_FULL_WIDTH_PATTERN, lambda match: chr(ord(match.group(0)) - 0xFEE0), body)
+        report['width'] += changed
+
+        # 行首编号保持原样，其余部分转换标点
+        marker = _MARKER_PATTERN.match(body)
+        prefix, rest = (body[:marker.end()], body[marker.end():]) if marker else ('', body)
+        punctuation = 0
+        for pattern, replacement in (
+                (_ELLIPSIS_PATTERN, '……'),
+                (_HALF_PUNCTUATION_PATTERN, lambda match: ''.join(_HALF_PUNCTUATION[char] for char in match.group(1))),
+                (_PERIOD_PATTERN, '。'),
+                (_PARENTHESES_PATTERN, r'（\1）'),
+                (_REPEATED_PATTERN, r'\1')):
+            rest, changed = count_substitutions(pattern, replacement, rest)
+            punctuation += changed
+        report['punctuation'] += punctuation
+        body = prefix + rest
+
+        unpaired = False
+        body, changed = pair_quotes(body, _DOUBLE_QUOTES, '“', '”', keep_ascii=True)
+        if changed is None:
+            unpaired = True
+        else:
+            report['quotes'] += changed
+        body, changed = pair_quotes(body, _SINGLE_QUOTES, '‘', '’')
+        if changed is None:
+            unpaired = True
+        else:
+            report['quotes'] += changed
+        if unpaired:
+            report['unpaired'].append(number)
+
+        # 全角标点两侧的空格（在标点转换之后处理）
+        body, changed = count_substitutions(_PUNCTUATION_SPACE_PATTERN, '', body)
+        report['whitespace'] += changed
+        return indent + body
+
+    def escape(self, text):
+        """转义发送给API的输入中的LaTeX特殊字符，返回 (转义后的文本, 转义的字符数)"""
+        if not (self.enabled and self.escape_enabled):
+            return text, 0
+        return escape_latex(text), len(_LATEX_SPECIAL_PATTERN.findall(text))
+
+
+def format_report(report):
+    """报告的单行文字说明，没有修改时返回空字符串"""
+    parts = [f"{name} {report[field]} 处" for field, name in REPORT_FIELDS if report.get(field)]
+    text = "，".join(parts)
+    if report.get('unpaired'):
+        lines = "、".join(str(number) for number in report['unpaired'])
+        text += ("；" if text else "") + f"第 {lines} 行引号不成对，未修改"
+    return text